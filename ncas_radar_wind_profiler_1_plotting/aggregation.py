@@ -0,0 +1,297 @@
+"""
+Aggregate ncas-radar-wind-profiler-1 data into time/altitude bins
+
+Wind is averaged as u and v components, so each profile counts in
+proportion to its wind speed, and directions either side of north average
+to north rather than south. For each bin the partial aggregate holds the
+sums of u, v and wind speed and the number of valid values. Partial
+aggregates of different chunks or files are merged by adding them, so long
+windows are built in a single pass over day files read a chunk at a time,
+without holding the data in memory. Direction, vector and scalar mean
+wind speed, and steadiness (vector mean over scalar mean wind speed, 1 when
+the wind direction never changes) are worked out from the sums at the end.
+
+"""
+
+
+from netCDF4 import Dataset
+import os
+
+import numpy as np
+
+from qc import default_qc_rules, qc_variables, compute_qc_mask
+
+
+#################################
+# Options to potentially change #
+#################################
+
+# records read from a file at a time when streaming
+chunk_records = 96
+
+#################################
+
+
+
+def sample_numbers(x_time, sampling_interval):
+    """
+    Returns number of the nearest sample time since 1970-01-01 00:00:00 UTC for each time.
+
+    Args:
+        x_time (array): Timestamps, seconds since 1970-01-01 00:00:00 UTC.
+        sampling_interval (int): Number of minutes between samples.
+
+    Returns:
+        array: Sample numbers, time divided by sampling interval and rounded.
+
+    """
+    seconds = sampling_interval * 60
+    return (2 * np.asarray(x_time).astype(np.int64) + seconds) // (2 * seconds)
+
+
+
+def cell_index(samples, sampling_interval, grid_interval):
+    """
+    Returns the grid sample whose cell contains each sample time, cells being centred on grid times.
+
+    Args:
+        samples (array): Sample numbers, from sample_numbers.
+        sampling_interval (int): Number of minutes between samples.
+        grid_interval (int): Number of minutes between grid times.
+
+    Returns:
+        array: Grid sample numbers.
+
+    """
+    # sample time t lies in the cell of grid time k if k - 1/2 <= t / grid_interval < k + 1/2
+    return (2 * samples * sampling_interval + grid_interval) // (2 * grid_interval)
+
+
+
+def valid_values(data):
+    """
+    Returns data as a plain array with a boolean array of valid (unmasked, finite) values.
+
+    Args:
+        data (masked array): Data read from netCDF file.
+
+    Returns:
+        array: Data with invalid values set to 0.
+        array: True where data is valid.
+
+    """
+    values = np.ma.getdata(data).astype(float)
+    valid = ~np.ma.getmaskarray(data) & np.isfinite(values)
+    return np.where(valid, values, 0.0), valid
+
+
+
+def bin_totals(index, values, n_bins):
+    """
+    Adds up rows of values that fall in the same bin, separately for each gate.
+
+    Args:
+        index (array): Bin of each row, 0 to n_bins - 1.
+        values (array): Values with shape (time, altitude).
+        n_bins (int): Number of bins.
+
+    Returns:
+        array: Totals with shape (n_bins, altitude).
+
+    """
+    n_alt = values.shape[1]
+    # one bincount bin for each bin and gate
+    bins = (np.asarray(index)[:, None] * n_alt + np.arange(n_alt)).ravel()
+    return np.bincount(bins, weights=values.ravel(), minlength=n_bins * n_alt).reshape(n_bins, n_alt)
+
+
+
+def empty_wind_partial(shape):
+    """
+    Creates wind partial aggregate with nothing in it.
+
+    Args:
+        shape (tuple): (bins, gates).
+
+    Returns:
+        dict: Partial aggregate arrays, 'u_sum', 'v_sum', 'speed_sum' and 'count'.
+
+    """
+    return {
+        'u_sum': np.zeros(shape),
+        'v_sum': np.zeros(shape),
+        'speed_sum': np.zeros(shape),
+        'count': np.zeros(shape, dtype=np.int64),
+    }
+
+
+
+def accumulate_wind(partial, index, wind_speed, wind_from_direction):
+    """
+    Adds wind data to a partial aggregate. Values only count where speed and direction are both valid.
+
+    Args:
+        partial (dict): Partial aggregate from empty_wind_partial, updated in place.
+        index (array): Bin of each row of data.
+        wind_speed (array): Wind speed with shape (time, altitude), masked or not. None to
+            average directions as unit vectors.
+        wind_from_direction (array): Wind from direction in degrees, same shape.
+
+    """
+    direction, valid = valid_values(wind_from_direction)
+    if wind_speed is None:
+        speed = np.ones(direction.shape)
+    else:
+        speed, speed_valid = valid_values(wind_speed)
+        valid &= speed_valid
+    speed = np.where(valid, speed, 0.0)
+    radians = np.deg2rad(direction)
+    n_bins = partial['count'].shape[0]
+    partial['u_sum'] += bin_totals(index, -speed * np.sin(radians), n_bins)
+    partial['v_sum'] += bin_totals(index, -speed * np.cos(radians), n_bins)
+    partial['speed_sum'] += bin_totals(index, speed, n_bins)
+    partial['count'] += bin_totals(index, valid.astype(float), n_bins).astype(np.int64)
+
+
+
+def merge_wind_partials(a, b):
+    """
+    Merges two wind partial aggregates.
+
+    Args:
+        a (dict): Partial aggregate.
+        b (dict): Partial aggregate.
+
+    Returns:
+        dict: Partial aggregate of both.
+
+    """
+    if a['count'].shape != b['count'].shape:
+        raise ValueError('Cannot merge wind partial aggregates with different bins or gates')
+    return {key: a[key] + b[key] for key in a}
+
+
+
+def finalise_wind(partial, min_count=1):
+    """
+    Converts a wind partial aggregate into averages.
+
+    Args:
+        partial (dict): Partial aggregate.
+        min_count (int): Optional. Fewest valid values for a bin to have averages.
+
+    Returns:
+        dict: 'wind_from_direction' (degrees), 'wind_speed' (scalar mean), 'vector_wind_speed'
+            (speed of mean u and v), 'steadiness' (0 to 1), 'u', 'v' and 'count'. Averages are
+            NaN in bins with fewer than min_count values, direction is NaN where the winds cancel
+            out, as for opposing winds of the same speed, and steadiness is NaN when every wind speed is 0.
+
+    """
+    count = partial['count']
+    empty = count < max(min_count, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        u = partial['u_sum'] / count
+        v = partial['v_sum'] / count
+        speed = partial['speed_sum'] / count
+        steadiness = np.hypot(partial['u_sum'], partial['v_sum']) / partial['speed_sum']
+    # u and v are towards the direction the wind blows, direction is where it comes from
+    direction = np.rad2deg(np.arctan2(-partial['u_sum'], -partial['v_sum'])) % 360
+    # tiny negative angles round up to 360
+    direction[direction >= 360] = 0.0
+    # no mean wind, so no direction; opposing winds only cancel to within rounding, relative to the
+    # speeds added up, which are the number of values when averaging unit vectors
+    direction[np.hypot(partial['u_sum'], partial['v_sum']) <= 1e-9 * partial['speed_sum']] = np.nan
+
+    result = {
+        'wind_from_direction': direction,
+        'wind_speed': speed,
+        'vector_wind_speed': np.hypot(u, v),
+        'steadiness': steadiness,
+        'u': u,
+        'v': v,
+    }
+    for values in result.values():
+        values[empty] = np.nan
+    result['count'] = count
+    return result
+
+
+
+def aggregate_wind_files(ncfiles, grid_time, grid_interval, chunk_records=chunk_records, qc_rules=None):
+    """
+    Averages wind from day files into bins centred on grid times, reading chunk_records
+    records at a time. Grid interval should be at least the sampling interval of the files.
+    Files with different gates to the newest file are skipped, as in load_window.
+    With QC rules, gates failing QC are left out before averaging. Each chunk is read with
+    enough records either side to count neighbours as for the whole file, but neighbours
+    are not counted across files, so QC may differ from load_window at midnight and at
+    the ends of the window.
+
+    Args:
+        ncfiles (list): File paths and names of netCDF files, oldest first. Files that do not exist are skipped.
+        grid_time (array): Timestamps of bin centres, grid_interval minutes apart.
+        grid_interval (int): Number of minutes between grid times.
+        chunk_records (int): Optional. Records read at a time.
+        qc_rules (dict): Optional. QC rules, see qc.default_qc_rules, None for no QC.
+
+    Returns:
+        array: Altitude of each gate, None if no file exists.
+        dict: Wind partial aggregate with shape (grid time, altitude), None if no file exists.
+        dict: Units of wind_speed and wind_from_direction.
+
+    """
+    grid_start = sample_numbers(grid_time[:1], grid_interval)[0]
+    n_grid = len(grid_time)
+    altitude = None
+    partial = None
+    units = {}
+    variables = ['wind_speed', 'wind_from_direction']
+    if qc_rules is not None:
+        rules = {**default_qc_rules, **qc_rules}
+        variables += [variable for variable in qc_variables(qc_rules) if variable not in variables]
+        # records either side of a chunk needed to count neighbours of its first and last records
+        halo = rules['neighbour_window'] // 2 if rules['min_neighbours'] > 0 else 0
+
+    # newest first, so its gates are kept after a change of gates
+    for ncfile in reversed(ncfiles):
+        if not os.path.exists(ncfile):
+            continue
+        nc = Dataset(ncfile)
+        file_altitude = np.ma.getdata(nc['altitude'][:]).astype(float)
+        if altitude is None:
+            altitude = file_altitude
+            partial = empty_wind_partial((n_grid, len(altitude)))
+            units = {variable: nc[variable].units for variable in ['wind_speed', 'wind_from_direction']}
+        elif not np.array_equal(file_altitude, altitude):
+            nc.close()
+            continue
+
+        # sampling_interval attribute in file should be something like '15 mintues'
+        sampling_interval = int(nc.sampling_interval.split(' ')[0])
+        records = len(nc['time'])
+        for first in range(0, records, chunk_records):
+            last = min(first + chunk_records, records)
+            samples = sample_numbers(nc['time'][first:last], sampling_interval)
+            index = cell_index(samples, sampling_interval, grid_interval) - grid_start
+            inside = (index >= 0) & (index < n_grid)
+            if not inside.any():
+                continue
+            if qc_rules is None:
+                data = {variable: nc[variable][first:last] for variable in variables}
+            else:
+                low = max(first - halo, 0)
+                high = min(last + halo, records)
+                # QC on a regular time axis, as load_window has, so gaps are not counted as neighbours
+                rows = sample_numbers(nc['time'][low:high], sampling_interval)
+                rows -= rows.min()
+                chunk = {'time': np.arange(rows.max() + 1), 'altitude': altitude, 'data': {}}
+                for variable in variables:
+                    chunk['data'][variable] = np.ma.masked_all((len(chunk['time']), len(altitude)))
+                    chunk['data'][variable][rows] = nc[variable][low:high]
+                failed = compute_qc_mask(chunk, qc_rules)[rows[first - low:last - low]]
+                data = {variable: np.ma.masked_where(failed, chunk['data'][variable][rows[first - low:last - low]])
+                        for variable in variables}
+            accumulate_wind(partial, index[inside], data['wind_speed'][inside], data['wind_from_direction'][inside])
+        nc.close()
+
+    return altitude, partial, units
@@ -0,0 +1,328 @@
+"""
+Create animation of a day of ncas-radar-wind-profiler-1 profiles
+
+Each frame shows the profiles of wind speed, wind direction and upward air
+velocity at one time, above a time/altitude plot of wind speed for the day
+with a line marking the time of the frame. Axes, labels and the day plot
+are drawn once; each frame only draws the profiles, marker line and time
+over a saved copy of them (blitting). Frames go straight to the encoder,
+Pillow for GIF and animated PNG or ffmpeg through a pipe for MP4, without
+writing a PNG for each frame.
+
+Usage: python animation.py --date 20230731 --mode 5 --format gif
+
+"""
+
+
+from PIL import Image
+import argparse
+import datetime as dt
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+import wind_profiler_plots_day
+from wind_profiler_plots import add_text, new_figure, day_time_axis, read_day_file, time_axis_numbers, time_height_mesh, format_time_axis
+
+
+#################################
+# Options to potentially change #
+#################################
+
+nc_file_path = wind_profiler_plots_day.nc_file_path
+plots_path = wind_profiler_plots_day.plots_path
+# sampling interval of day files, '5' or '15'
+mode = '5'
+
+# frames per second, and size of frames in inches and dots per inch
+fps = 12
+figsize = (12, 7)
+dpi = 80
+
+# 'gif', 'png' (animated PNG) or 'mp4' (needs ffmpeg)
+animation_format = 'gif'
+
+#################################
+
+
+animation_variables = ['wind_speed', 'wind_from_direction', 'upward_air_velocity']
+
+
+
+def day_grid(ncfile, date, variables):
+    """
+    Reads a day file onto a regular time axis covering the whole day.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        date (datetime): Day of data.
+        variables (list): Names of variables in netCDF file.
+
+    Returns:
+        dict: 'time' (timestamps), 'altitude', and 'data' (masked arrays with shape (time, altitude))
+            and 'units' for each variable. Times with no profile are masked.
+
+    """
+    record = read_day_file(ncfile, variables)
+    x_time = day_time_axis(date, record['sampling_interval'])
+    y_altitude = np.ma.getdata(record['altitude']).astype(float)
+    index = np.clip(np.searchsorted(x_time, record['time']), 0, len(x_time) - 1)
+    match = x_time[index] == record['time']
+    data = {}
+    for variable in variables:
+        # zeros under the mask, colour mapping still does arithmetic on masked values
+        data[variable] = np.ma.masked_array(np.zeros((len(x_time), len(y_altitude))), mask=True)
+        data[variable][index[match]] = record['data'][variable][match]
+    return {'time': x_time, 'altitude': y_altitude, 'data': data, 'units': record['units']}
+
+
+
+def make_frame_figure(grid, figsize=figsize, dpi=dpi):
+    """
+    Draws everything that does not change between frames, and creates the artists that do.
+
+    Args:
+        grid (dict): Day of data from day_grid.
+        figsize (tuple): Optional. Size of frames in inches.
+        dpi (int): Optional. Dots per inch of frames.
+
+    Returns:
+        dict: 'fig', 'background' (saved copy of the static figure), 'artists' to draw each frame,
+            and the 'lines', 'cursor' and 'time_text' among them.
+
+    """
+    fig = new_figure(figsize)
+    fig.set_dpi(dpi)
+    altitude = grid['altitude']
+    data = grid['data']
+    units = grid['units']
+
+    ax_speed = fig.add_subplot(2, 3, 1)
+    ax_direction = fig.add_subplot(2, 3, 2, sharey=ax_speed)
+    ax_vertical = fig.add_subplot(2, 3, 3, sharey=ax_speed)
+    ax_day = fig.add_subplot(2, 1, 2)
+
+    # fixed limits from the whole day so axes do not move between frames
+    speed_max = np.nanpercentile(data['wind_speed'].compressed(), 99) if data['wind_speed'].count() else 25
+    vertical_max = np.nanpercentile(np.abs(data['upward_air_velocity'].compressed()), 99) if data['upward_air_velocity'].count() else 2
+    ax_speed.set_xlim(0, speed_max)
+    ax_direction.set_xlim(0, 360)
+    ax_direction.set_xticks(range(0, 361, 90))
+    ax_vertical.set_xlim(-vertical_max, vertical_max)
+    ax_speed.set_ylim(altitude.min(), altitude.max())
+
+    lines = {
+        'wind_speed': ax_speed.plot([], [], color='black', linewidth=2, animated=True)[0],
+        'wind_from_direction': ax_direction.plot([], [], color='black', marker='.', linestyle='none', animated=True)[0],
+        'upward_air_velocity': ax_vertical.plot([], [], color='black', linewidth=2, animated=True)[0],
+    }
+    for ax, variable in [(ax_speed, 'wind_speed'), (ax_direction, 'wind_from_direction'), (ax_vertical, 'upward_air_velocity')]:
+        ax.set_xlabel(f'{variable} ({units[variable]})', fontsize=12)
+        ax.grid(which='both')
+    ax_vertical.axvline(0, color='grey', linewidth=1)
+    ax_speed.set_ylabel('Altitude (m)', fontsize=12)
+    add_text(ax_speed, 'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK', fontsize=10, ypos=1.04)
+
+    pc = time_height_mesh(ax_day, grid['time'], altitude, data['wind_speed'], vmin=0, vmax=speed_max)
+    format_time_axis(ax_day)
+    ax_day.set_ylabel('Altitude (m)', fontsize=12)
+    ax_day.set_xlabel('Time (UTC)', fontsize=12)
+    ax_day.tick_params(axis='both', which='both', labelsize=10)
+    cbar = fig.colorbar(pc, ax=ax_day)
+    cbar.ax.set_ylabel('Wind speed (m/s)', fontsize=12)
+    x_day = time_axis_numbers(grid['time'])
+    cursor = ax_day.axvline(x_day[0], color='red', linewidth=2, animated=True)
+    time_text = fig.text(0.98, 0.97, '', ha='right', va='top', fontsize=14, animated=True)
+
+    fig.tight_layout(rect=(0, 0, 1, 0.95))
+    # draws everything except animated artists
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(fig.bbox)
+    return {
+        'fig': fig,
+        'background': background,
+        'lines': lines,
+        'cursor': cursor,
+        'time_text': time_text,
+        'x_day': x_day,
+        'artists': [*lines.values(), cursor, time_text],
+    }
+
+
+
+def draw_frame(frame, grid, n):
+    """
+    Draws one frame over the static background.
+
+    Args:
+        frame (dict): Figure from make_frame_figure.
+        grid (dict): Day of data from day_grid.
+        n (int): Index of the time to draw.
+
+    Returns:
+        memoryview: RGBA pixels of the frame, valid until the next frame is drawn.
+
+    """
+    fig = frame['fig']
+    fig.canvas.restore_region(frame['background'])
+    for variable, line in frame['lines'].items():
+        line.set_data(grid['data'][variable][n].filled(np.nan), grid['altitude'])
+    frame['cursor'].set_xdata([frame['x_day'][n], frame['x_day'][n]])
+    frame['time_text'].set_text(dt.datetime.fromtimestamp(int(grid['time'][n]), dt.timezone.utc).strftime('%Y/%m/%d %H:%M UTC'))
+    for artist in frame['artists']:
+        fig.draw_artist(artist)
+    return fig.canvas.buffer_rgba()
+
+
+
+def write_frames_pillow(frames, size, animation_file, fps=fps):
+    """
+    Writes frames to a GIF or animated PNG with Pillow. Frames are converted to the
+    palette of the first frame as they are drawn, so one byte for each pixel is kept.
+
+    Args:
+        frames (iterator): RGBA pixels of each frame.
+        size (tuple): Width and height of frames in pixels.
+        animation_file (str): File path and name, ending '.gif' or '.png'.
+        fps (float): Optional. Frames per second.
+
+    Returns:
+        int: Number of frames written.
+
+    """
+    images = []
+    for pixels in frames:
+        image = Image.frombuffer('RGBA', size, pixels, 'raw', 'RGBA', 0, 1).convert('RGB')
+        if not images:
+            palette = image.quantize(colors=256, dither=Image.Dither.NONE)
+        images.append(image.quantize(palette=palette, dither=Image.Dither.NONE))
+    if not images:
+        return 0
+    images[0].save(f'{animation_file}.tmp', format='GIF' if animation_file.endswith('.gif') else 'PNG', save_all=True,
+                   append_images=images[1:], duration=1000 / fps, loop=0)
+    os.replace(f'{animation_file}.tmp', animation_file)
+    return len(images)
+
+
+
+def write_frames_ffmpeg(frames, size, animation_file, fps=fps):
+    """
+    Writes frames to an MP4 by piping raw pixels to ffmpeg.
+
+    Args:
+        frames (iterator): RGBA pixels of each frame.
+        size (tuple): Width and height of frames in pixels.
+        animation_file (str): File path and name, ending '.mp4'.
+        fps (float): Optional. Frames per second.
+
+    Returns:
+        int: Number of frames written.
+
+    Raises:
+        RuntimeError: If ffmpeg is not installed or fails, when no file is left behind.
+
+    """
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError('ffmpeg is needed to write mp4 animations, use gif or png instead')
+    command = ['ffmpeg', '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{size[0]}x{size[1]}',
+               '-r', str(fps), '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+               '-f', 'mp4', f'{animation_file}.tmp']
+    count = 0
+    # unbuffered, so nothing is left to flush into a closed pipe if ffmpeg exits early
+    with subprocess.Popen(command, stdin=subprocess.PIPE, bufsize=0) as encoder:
+        try:
+            for pixels in frames:
+                encoder.stdin.write(pixels)
+                count += 1
+            encoder.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg exited early, its error has already been printed
+            pass
+    if encoder.returncode != 0:
+        if os.path.exists(f'{animation_file}.tmp'):
+            os.remove(f'{animation_file}.tmp')
+        raise RuntimeError(f'ffmpeg failed writing {animation_file}')
+    os.replace(f'{animation_file}.tmp', animation_file)
+    return count
+
+
+
+def animation_file_name(save_loc, date, mode, animation_format):
+    """
+    Returns file path and name of a day animation.
+
+    Args:
+        save_loc (str): File path to save animation to.
+        date (datetime): Day of data.
+        mode (str): Sampling interval of data in minutes, e.g. '5' or '15'.
+        animation_format (str): 'gif', 'png' or 'mp4'.
+
+    Returns:
+        str: File path and name of animation.
+
+    """
+    return f'{save_loc}/ncas-wind-profiler-1_{date:%Y%m%d}_{mode}min_profiles.{animation_format}'
+
+
+
+def main(nc_file_path=nc_file_path, plots_path=plots_path, date=None, mode=mode, animation_format=animation_format,
+         fps=fps, figsize=figsize, dpi=dpi):
+    """
+    Make animation of one day of profiles.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        plots_path (str): Location to save animation.
+        date (datetime): Optional. Day of data. Default is today.
+        mode (str): Optional. Sampling interval of data in minutes, e.g. '5' or '15'.
+        animation_format (str): Optional. 'gif', 'png' (animated PNG) or 'mp4' (needs ffmpeg).
+        fps (float): Optional. Frames per second.
+        figsize (tuple): Optional. Size of frames in inches.
+        dpi (int): Optional. Dots per inch of frames.
+
+    Returns:
+        dict: 'file' written (None if there is no file for the day), 'frames', 'seconds' spent
+            drawing and encoding, and 'fps' drawn and encoded.
+
+    """
+    date = date if date is not None else dt.datetime.now()
+    ncfile = wind_profiler_plots_day.nc_file_name(nc_file_path, date, mode)
+    if not os.path.exists(ncfile):
+        return {'file': None, 'frames': 0, 'seconds': 0.0, 'fps': 0.0}
+    if not os.path.exists(plots_path):
+        os.makedirs(plots_path)
+
+    grid = day_grid(ncfile, date, animation_variables)
+    start = time.perf_counter()
+    frame = make_frame_figure(grid, figsize=figsize, dpi=dpi)
+    size = tuple(int(pixels) for pixels in frame['fig'].canvas.get_width_height())
+    frames = (draw_frame(frame, grid, n) for n in range(len(grid['time'])))
+
+    animation_file = animation_file_name(plots_path, date, mode, animation_format)
+    if animation_format == 'mp4':
+        count = write_frames_ffmpeg(frames, size, animation_file, fps=fps)
+    else:
+        count = write_frames_pillow(frames, size, animation_file, fps=fps)
+    seconds = time.perf_counter() - start
+    return {'file': animation_file, 'frames': count, 'seconds': seconds, 'fps': count / seconds}
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create animation of a day of ncas-radar-wind-profiler-1 profiles.')
+    parser.add_argument('--date', default=None, help='day, YYYYmmdd, default is today')
+    parser.add_argument('--mode', default=mode, choices=['5', '15'], help='sampling interval of day files in minutes')
+    parser.add_argument('--format', default=animation_format, choices=['gif', 'png', 'mp4'], help='animation format')
+    parser.add_argument('--fps', type=float, default=fps, help='frames per second')
+    parser.add_argument('--dpi', type=int, default=dpi, help='dots per inch of frames')
+    args = parser.parse_args()
+
+    date = dt.datetime.strptime(args.date, '%Y%m%d') if args.date is not None else None
+    report = main(date=date, mode=args.mode, animation_format=args.format, fps=args.fps, dpi=args.dpi)
+    if report['file'] is None:
+        print('No file for the day')
+    else:
+        print(f'Wrote {report["frames"]} frames to {report["file"]} in {report["seconds"]:.1f} s ({report["fps"]:.1f} frames/s)')
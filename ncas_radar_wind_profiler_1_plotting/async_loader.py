@@ -0,0 +1,272 @@
+"""
+Make plots for last 24/48 hours from ncas-radar-wind-profiler-1 with deadlines on file access
+
+When the shared filesystem stalls, a single file check or read could hang the
+whole run. Here file checks and reads run in daemon threads under asyncio,
+with a deadline for each operation and for the whole run. Files that do not
+arrive in time are plotted as missing, so products with data are still made
+and the rest get the usual empty plot. A lock file keeps a new run from
+starting while another is still going.
+
+Usage: python async_loader.py
+
+"""
+
+
+import asyncio
+import datetime as dt
+import fcntl
+import os
+import sys
+import threading
+import time
+
+import wind_profiler_plots
+
+
+#################################
+# Options to potentially change #
+#################################
+
+# seconds allowed for each file check or read, and for all file access in a run
+operation_timeout = 30
+run_timeout = 120
+
+# lock file should be on a local disk, not the shared filesystem
+lock_file = '/tmp/ncas-radar-wind-profiler-1_plots.lock'
+
+#################################
+
+
+# netCDF/HDF5 is not thread safe, so reads take turns; file checks do not need the lock
+# a read stuck on a hung file holds up the reads behind it until their deadlines
+netcdf_lock = threading.Lock()
+
+# open lock files of locks held by this process
+held_locks = {}
+
+
+
+def acquire_lock(lock_file=lock_file):
+    """
+    Takes an exclusive lock on the lock file, without waiting. The lock belongs to the
+    open file, so it goes when the process ends, however it ends, and a lock left by a
+    run that no longer exists never has to be cleared.
+
+    Args:
+        lock_file (str): Optional. File path and name of lock file.
+
+    Returns:
+        bool: True if lock was acquired, False if another run holds it.
+
+    """
+    fd = os.open(lock_file, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    # pid and start time are only for people looking at the file
+    os.ftruncate(fd, 0)
+    os.write(fd, f'{os.getpid()} {time.time()}\n'.encode())
+    held_locks[lock_file] = fd
+    return True
+
+
+
+def release_lock(lock_file=lock_file):
+    """
+    Releases lock taken by acquire_lock in this process. The file is left in place,
+    as removing it could let two runs lock different files of the same name.
+
+    Args:
+        lock_file (str): Optional. File path and name of lock file.
+
+    """
+    fd = held_locks.pop(lock_file, None)
+    if fd is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+
+def in_daemon_thread(func, *args):
+    """
+    Runs a blocking function in a daemon thread, so a call that never returns
+    cannot stop the process from exiting.
+
+    Args:
+        func (function): Function to run.
+        *args: Arguments for func.
+
+    Returns:
+        Future: asyncio future with the result of func.
+
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result, error):
+        if future.done():
+            # timed out and cancelled already
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run():
+        try:
+            result, error = func(*args), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(set_result, result, error)
+        except RuntimeError:
+            # event loop finished while this call was stuck
+            pass
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+
+def read_day_file_locked(ncfile, variables):
+    """
+    Reads variables from one netCDF file, one file at a time.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        variables (list): Names of variables in netCDF file.
+
+    Returns:
+        dict: Data from wind_profiler_plots.read_day_file.
+
+    """
+    with netcdf_lock:
+        return wind_profiler_plots.read_day_file(ncfile, variables)
+
+
+
+async def fetch_record(ncfile, variables, operation_timeout, deadline):
+    """
+    Checks for and reads one file, giving up at the operation timeout or run deadline.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        variables (list): Names of variables in netCDF file.
+        operation_timeout (float): Seconds allowed for the file check and for the read.
+        deadline (float): Event loop time by which all file access must finish.
+
+    Returns:
+        tuple: (ncfile, data from read_day_file or None, status), status is 'read', 'missing', 'timeout' or an error message.
+
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        exists = await asyncio.wait_for(in_daemon_thread(os.path.exists, ncfile),
+                                        timeout=min(operation_timeout, deadline - loop.time()))
+        if not exists:
+            return ncfile, None, 'missing'
+        record = await asyncio.wait_for(in_daemon_thread(read_day_file_locked, ncfile, variables),
+                                        timeout=min(operation_timeout, deadline - loop.time()))
+        return ncfile, record, 'read'
+    except asyncio.TimeoutError:
+        return ncfile, None, 'timeout'
+    except Exception as error:
+        return ncfile, None, f'error: {error}'
+
+
+
+async def fetch_records(ncfiles, variables, operation_timeout=operation_timeout, run_timeout=run_timeout):
+    """
+    Checks for and reads files concurrently, within a deadline for the whole run.
+
+    Args:
+        ncfiles (list): File paths and names of netCDF files.
+        variables (list): Names of variables in netCDF files.
+        operation_timeout (float): Optional. Seconds allowed for each file check or read.
+        run_timeout (float): Optional. Seconds allowed for all file access.
+
+    Returns:
+        dict: Data from read_day_file for each file, None if missing or not read in time.
+        dict: Status of each file, see fetch_record.
+
+    """
+    deadline = asyncio.get_running_loop().time() + run_timeout
+    results = await asyncio.gather(*(fetch_record(ncfile, variables, operation_timeout, deadline) for ncfile in ncfiles))
+    records = {ncfile: record for ncfile, record, _ in results}
+    statuses = {ncfile: status for ncfile, _, status in results}
+    return records, statuses
+
+
+
+def main(nc_file_path=wind_profiler_plots.nc_file_path, plots_path=wind_profiler_plots.plots_path, mode=wind_profiler_plots.mode,
+         operation_timeout=operation_timeout, run_timeout=run_timeout, **plot_options):
+    """
+    Make plots for last 24/48 hours of wind profiler data, with deadlines on file access.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        plots_path (str): Location to save plots.
+        mode (str): Operation mode of wind profiler (high or low).
+        operation_timeout (float): Optional. Seconds allowed for each file check or read.
+        run_timeout (float): Optional. Seconds allowed for all file access.
+        **plot_options: Optional. qc_rules, windows, products, colours, multipanel_variables
+            and render, see wind_profiler_plots.main. wind_windows plots are not made, as
+            their files are streamed and cannot be read within the deadlines.
+
+    Returns:
+        dict: Time in seconds spent fetching files, then timings from wind_profiler_plots.main.
+
+    """
+    windows = plot_options.get('windows', wind_profiler_plots.windows)
+    variables = wind_profiler_plots.product_variables(plot_options.get('products', wind_profiler_plots.products),
+                                                      plot_options.get('multipanel_variables', wind_profiler_plots.multipanel_variables),
+                                                      plot_options.get('qc_rules', wind_profiler_plots.qc_rules))
+    # the same day is used to plot, so a run crossing midnight finds the files it read
+    date = dt.datetime.now()
+    ncfiles = wind_profiler_plots.window_nc_files(nc_file_path, date, mode, max(windows))
+
+    start = time.perf_counter()
+    records, statuses = asyncio.run(fetch_records(ncfiles, variables, operation_timeout, run_timeout))
+    fetch = time.perf_counter() - start
+
+    for ncfile, status in statuses.items():
+        if status not in ['read', 'missing']:
+            print(f'{ncfile}: {status}, plotting as missing')
+
+    timings = wind_profiler_plots.main(nc_file_path, plots_path, mode, records=records, date=date, **plot_options)
+    return {'fetch': fetch, **timings}
+
+
+
+def run(modes=['low', 'high'], lock_file=lock_file, **options):
+    """
+    Make plots for each mode while holding the lock file.
+
+    Args:
+        modes (list): Optional. Operation modes of wind profiler.
+        lock_file (str): Optional. File path and name of lock file.
+        **options: Optional. Arguments for main.
+
+    Returns:
+        dict: Timings for each mode, None if another run holds the lock.
+
+    """
+    if not acquire_lock(lock_file):
+        print(f'Another run holds {lock_file}, not starting')
+        return None
+    try:
+        return {run_mode: main(mode=run_mode, **options) for run_mode in modes}
+    finally:
+        release_lock(lock_file)
+
+
+
+if __name__ == "__main__":
+    results = run()
+    if results is None:
+        sys.exit(1)
+    for run_mode, timings in results.items():
+        print(f'{run_mode}-mode: ' + ', '.join(f'{stage} {seconds:.2f} s' for stage, seconds in timings.items()))
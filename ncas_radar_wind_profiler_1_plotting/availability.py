@@ -0,0 +1,327 @@
+"""
+Summarise data availability over a deployment from ncas-radar-wind-profiler-1
+
+Completeness for each day, hour and mode is worked out from the times in
+each day file, without reading any data. Optionally the fraction of records
+with valid data at each gate is worked out from one variable, compared
+against its fill value without building masked arrays. Results for each
+file are kept in a JSON summary and only worked out again for files that
+are new or have changed, so updating a long deployment takes seconds.
+
+Usage: python availability.py
+
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor
+from netCDF4 import Dataset
+import datetime as dt
+import json
+import os
+
+import numpy as np
+
+from wind_profiler_plots import nc_file_name, add_text, new_figure
+
+
+#################################
+# Options to potentially change #
+#################################
+
+deployment='20230710_woest'
+nc_file_path = f'/gws/pw/j07/ncas_obs_vol1/amf/processing/ncas-radar-wind-profiler-1/{deployment}'
+plots_path = '/home/users/ncasit/nrwp1_plot_test/availability'
+start_date = '20230710'
+# None for today
+end_date = None
+modes = ['low', 'high']
+processes = 4
+
+# variable used for valid fraction at each gate, None to only use file times
+gate_variable = 'wind_speed'
+
+#################################
+
+
+
+def day_availability(ncfile, date, gate_variable=gate_variable):
+    """
+    Works out availability for one day file.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        date (datetime): Day of data.
+        gate_variable (str): Optional. Variable for valid counts at each gate, None to skip.
+
+    Returns:
+        dict: 'sampling_interval' (minutes), 'hour_counts' (records in each hour),
+            'expected_per_hour', and if gate_variable is set 'altitude' and 'gate_counts'
+            (records with valid data at each gate). 'mtime' and 'size' of the file are
+            included so unchanged files can be skipped next time.
+
+    """
+    stat = os.stat(ncfile)
+    nc = Dataset(ncfile)
+    # sampling_interval attribute in file should be something like '15 mintues'
+    sampling_interval = int(nc.sampling_interval.split(' ')[0])
+    day_start = dt.datetime(date.year, date.month, date.day, tzinfo=dt.timezone.utc).timestamp()
+    # records repeated in the file are counted once, from their first row
+    x_time, rows = np.unique(np.asarray(nc['time'][:]).astype(int), return_index=True)
+    in_day = (x_time >= day_start) & (x_time < day_start + 86400)
+    rows = rows[in_day]
+    hour = ((x_time[in_day] - day_start) // 3600).astype(int)
+
+    result = {
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'sampling_interval': sampling_interval,
+        # fractional for intervals over an hour
+        'expected_per_hour': 60 / sampling_interval,
+        'hour_counts': np.bincount(hour, minlength=24).tolist(),
+    }
+
+    if gate_variable is not None and gate_variable in nc.variables:
+        var = nc[gate_variable]
+        var.set_auto_maskandscale(False)
+        # only the rows holding the day are read
+        first = rows.min() if len(rows) else 0
+        raw = var[first:rows.max() + 1 if len(rows) else 0][rows - first]
+        valid = np.ones(raw.shape, dtype=bool)
+        if '_FillValue' in var.ncattrs():
+            valid &= raw != var.getncattr('_FillValue')
+        if raw.dtype.kind == 'f':
+            valid &= np.isfinite(raw)
+        result['altitude'] = np.ma.getdata(nc['altitude'][:]).astype(float).tolist()
+        result['gate_counts'] = valid.sum(axis=0).tolist()
+
+    nc.close()
+    return result
+
+
+
+def day_availability_job(job):
+    """
+    Works out availability for one day file from a job tuple, for use in a process pool.
+
+    Args:
+        job (tuple): (mode, day, ncfile, date, gate_variable).
+
+    Returns:
+        tuple: (mode, day, result of day_availability).
+
+    """
+    mode, day, ncfile, date, gate_variable = job
+    return mode, day, day_availability(ncfile, date, gate_variable)
+
+
+
+def read_summary(summary_file):
+    """
+    Reads a previous summary, or returns an empty one.
+
+    Args:
+        summary_file (str): File path and name of JSON summary.
+
+    Returns:
+        dict: Summary with 'days' for each mode.
+
+    """
+    if os.path.exists(summary_file):
+        with open(summary_file) as f:
+            return json.load(f)
+    return {'days': {}}
+
+
+
+def update_summary(summary, nc_file_path, dates, modes=modes, gate_variable=gate_variable, processes=processes):
+    """
+    Works out availability for files that are new or have changed since the summary was made.
+
+    Args:
+        summary (dict): Summary from read_summary, updated in place.
+        nc_file_path (str): Location of netCDF files.
+        dates (list): Days to include.
+        modes (list): Optional. Operation modes of wind profiler.
+        gate_variable (str): Optional. Variable for valid counts at each gate, None to skip.
+        processes (int): Optional. Number of worker processes.
+
+    Returns:
+        int: Number of files read.
+
+    """
+    jobs = []
+    for mode in modes:
+        mode_days = summary['days'].setdefault(mode, {})
+        for date in dates:
+            day = date.strftime('%Y%m%d')
+            ncfile = nc_file_name(nc_file_path, date, mode)
+            if not os.path.exists(ncfile):
+                mode_days[day] = None
+                continue
+            stat = os.stat(ncfile)
+            previous = mode_days.get(day)
+            if (previous is not None and previous['mtime'] == stat.st_mtime and previous['size'] == stat.st_size
+                    and ('gate_counts' in previous) == (gate_variable is not None)):
+                continue
+            jobs.append((mode, day, ncfile, date, gate_variable))
+
+    if jobs:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for mode, day, result in executor.map(day_availability_job, jobs):
+                summary['days'][mode][day] = result
+    return len(jobs)
+
+
+
+def completeness(summary, mode, days):
+    """
+    Returns completeness for each day and hour of a mode.
+
+    Args:
+        summary (dict): Summary from update_summary.
+        mode (str): Operation mode of wind profiler (high or low).
+        days (list): Days to include, YYYYmmdd.
+
+    Returns:
+        array: Fraction of expected records present, with shape (day, hour).
+
+    """
+    matrix = np.zeros((len(days), 24))
+    for i, day in enumerate(days):
+        result = summary['days'].get(mode, {}).get(day)
+        if result is not None:
+            matrix[i] = np.minimum(np.array(result['hour_counts']) / result['expected_per_hour'], 1)
+    return matrix
+
+
+
+def gate_fractions(summary, mode, days):
+    """
+    Returns fraction of expected records with valid data at each gate, over all days.
+    Days with no file count as having no valid data. Days with different gates to the
+    latest day are left out, of both the valid and the expected records.
+
+    Args:
+        summary (dict): Summary from update_summary.
+        mode (str): Operation mode of wind profiler (high or low).
+        days (list): Days to include, YYYYmmdd.
+
+    Returns:
+        array: Altitude of each gate, None if there are no gate counts.
+        array: Fraction for each gate.
+
+    """
+    results = [summary['days'].get(mode, {}).get(day) for day in days]
+    # counted before leaving out days with other gates, which do not count at all
+    no_file_days = sum(result is None for result in results)
+    results = [result for result in results if result is not None and 'gate_counts' in result]
+    if not results:
+        return None, None
+    altitude = results[-1]['altitude']
+    results = [result for result in results if result['altitude'] == altitude]
+    counts = np.sum([result['gate_counts'] for result in results], axis=0)
+    # days with no file count towards expected records too
+    expected = sum(result['expected_per_hour'] * 24 for result in results)
+    expected += no_file_days * results[-1]['expected_per_hour'] * 24
+    return np.array(altitude), counts / expected
+
+
+
+def plot_availability(summary, days, modes, save_loc, title):
+    """
+    Creates a heatmap of completeness by day and hour, and valid fraction by gate, for each mode.
+
+    Args:
+        summary (dict): Summary from update_summary.
+        days (list): Days to include, YYYYmmdd.
+        modes (list): Operation modes of wind profiler.
+        save_loc (str): File path to save plot to.
+        title (str): Period covered, used in plot title and file name.
+
+    """
+    fig = new_figure((16, 4 + 0.12 * len(days) * len(modes)))
+    dates = [dt.datetime.strptime(day, '%Y%m%d') for day in days]
+    for n, mode in enumerate(modes):
+        ax = fig.add_subplot(len(modes), 2, 2 * n + 1)
+        pc = ax.imshow(completeness(summary, mode, days), aspect='auto', interpolation='nearest', origin='upper',
+                       cmap='viridis', vmin=0, vmax=1, extent=(0, 24, len(days), 0))
+        ax.set_xticks(range(0, 25, 3))
+        tick_step = max(1, len(days) // 15)
+        ax.set_yticks(np.arange(0, len(days), tick_step) + 0.5)
+        ax.set_yticklabels([date.strftime('%Y/%m/%d') for date in dates[::tick_step]])
+        ax.set_xlabel('Hour of day (UTC)', fontsize=14)
+        ax.set_title(f'{mode} mode completeness', fontsize=15)
+        cbar = fig.colorbar(pc, ax = ax)
+        cbar.ax.set_ylabel('Fraction of expected records', fontsize=12)
+        if n == 0:
+            add_text(ax,f'NCAS Radar Wind Profiler 1\n{title}',ypos=1.06)
+
+        ax2 = fig.add_subplot(len(modes), 2, 2 * n + 2)
+        altitude, fractions = gate_fractions(summary, mode, days)
+        if altitude is not None:
+            ax2.plot(fractions * 100, altitude, color='black')
+        ax2.set_xlim(0, 100)
+        ax2.set_xlabel('Valid data (%)', fontsize=14)
+        ax2.set_ylabel('Altitude (m)', fontsize=14)
+        ax2.set_title(f'{mode} mode valid data by gate', fontsize=15)
+        ax2.grid(which='both')
+
+    fig.tight_layout()
+    fig.savefig(f'{save_loc}/ncas-wind-profiler-1_availability_{title}.png')
+
+
+
+def main(nc_file_path=nc_file_path, plots_path=plots_path, start_date=start_date, end_date=end_date, modes=modes,
+         gate_variable=gate_variable, processes=processes):
+    """
+    Update availability summary and heatmap for a deployment.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        plots_path (str): Location to save summary and plot.
+        start_date (str): First day of data, YYYYmmdd.
+        end_date (str): Last day of data, YYYYmmdd, None for today.
+        modes (list): Operation modes of wind profiler.
+        gate_variable (str): Variable for valid fraction at each gate, None to only use file times.
+        processes (int): Number of worker processes.
+
+    Returns:
+        dict: Summary, with 'completeness' for each mode and day, and 'gate_fraction' for each mode.
+
+    """
+    start = dt.datetime.strptime(start_date, '%Y%m%d')
+    end = dt.datetime.strptime(end_date, '%Y%m%d') if end_date is not None else dt.datetime.now()
+    dates = [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+    days = [date.strftime('%Y%m%d') for date in dates]
+
+    if not os.path.exists(plots_path):
+        os.makedirs(plots_path)
+    summary_file = f'{plots_path}/ncas-wind-profiler-1_availability.json'
+    summary = read_summary(summary_file)
+    read = update_summary(summary, nc_file_path, dates, modes=modes, gate_variable=gate_variable, processes=processes)
+
+    summary['start_date'] = start_date
+    summary['end_date'] = days[-1]
+    summary['completeness'] = {}
+    summary['gate_fraction'] = {}
+    for mode in modes:
+        matrix = completeness(summary, mode, days)
+        summary['completeness'][mode] = {'total': float(matrix.mean()) if len(days) else 0.0,
+                                         'days': {day: float(value) for day, value in zip(days, matrix.mean(axis=1))}}
+        altitude, fractions = gate_fractions(summary, mode, days)
+        if altitude is not None:
+            summary['gate_fraction'][mode] = {'altitude': altitude.tolist(), 'fraction': fractions.tolist()}
+
+    with open(f'{summary_file}.tmp', 'w') as f:
+        json.dump(summary, f)
+    os.replace(f'{summary_file}.tmp', summary_file)
+
+    plot_availability(summary, days, modes, plots_path, f'{start_date}-{days[-1]}')
+    totals = [f'{mode} mode {100 * summary["completeness"][mode]["total"]:.1f}% complete' for mode in modes]
+    print(f'Read {read} files, ' + ', '.join(totals))
+    return summary
+
+
+
+if __name__ == "__main__":
+    main()
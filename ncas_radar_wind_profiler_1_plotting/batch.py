@@ -0,0 +1,231 @@
+"""
+Make plots for several ncas-radar-wind-profiler-1 deployments in one process from a config file
+
+Usage: python batch.py batch_config.toml
+
+Config files can be TOML or YAML, see batch_config_example.toml. Jobs for
+every deployment and mode run on one shared worker pool, and each job reads
+a file once for all of its windows and products.
+
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from netCDF4 import Dataset
+import argparse
+import datetime as dt
+import inspect
+import os
+import sys
+import time
+
+import wind_profiler_plots
+
+
+# settings a deployment can give: its name, modes, and any argument of wind_profiler_plots.main except mode, records and date
+plot_settings = [name for name in inspect.signature(wind_profiler_plots.main).parameters if name not in ['mode', 'records', 'date']]
+deployment_settings = ['name', 'modes'] + plot_settings
+
+
+
+def read_config(config_file):
+    """
+    Reads TOML or YAML config file.
+
+    Args:
+        config_file (str): File path and name of config file, ending .toml, .yaml or .yml
+
+    Returns:
+        dict: Config.
+
+    """
+    extension = os.path.splitext(config_file)[1].lower()
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            # python < 3.11
+            import tomli as tomllib
+        with open(config_file, 'rb') as f:
+            return tomllib.load(f)
+    elif extension in ['.yaml', '.yml']:
+        import yaml
+        with open(config_file) as f:
+            return yaml.safe_load(f)
+    else:
+        raise ValueError(f'Unknown config file type {extension}, expected .toml, .yaml or .yml')
+
+
+
+def config_jobs(config):
+    """
+    Creates one job for each deployment and mode in config.
+    Settings not given for a deployment are taken from the 'defaults' table,
+    then from the options in wind_profiler_plots.py.
+
+    Args:
+        config (dict): Config from read_config.
+
+    Returns:
+        list: Jobs, each a dict of arguments for wind_profiler_plots.main plus 'deployment'.
+
+    Raises:
+        ValueError: If the config has settings that are not known, or a deployment has no name or paths.
+
+    """
+    unknown = [key for key in config if key not in ['processes', 'defaults', 'deployments']]
+    if unknown:
+        raise ValueError(f'Unknown config settings: {", ".join(unknown)}')
+    defaults = config.get('defaults', {})
+    jobs = []
+    for deployment in config['deployments']:
+        settings = {**defaults, **deployment}
+        unknown = [key for key in settings if key not in deployment_settings]
+        if unknown:
+            raise ValueError(f'Unknown settings for deployment {settings.get("name")}: {", ".join(unknown)}, '
+                             f'expected any of {", ".join(deployment_settings)}')
+        for key in ['name', 'nc_file_path', 'plots_path']:
+            if key not in settings:
+                raise ValueError(f'Deployment has no {key}: {deployment}')
+
+        options = {key: settings[key] for key in plot_settings if key in settings}
+        for key in ['nc_file_path', 'plots_path', 'freshness_path']:
+            if options.get(key) is not None:
+                options[key] = options[key].format(deployment=settings['name'])
+        options['colours'] = {**wind_profiler_plots.colours, **settings.get('colours', {})}
+        if 'wind_windows' in options:
+            # TOML table keys are always strings
+            options['wind_windows'] = {int(days): minutes for days, minutes in options['wind_windows'].items()}
+        for mode in settings.get('modes', ['low', 'high']):
+            jobs.append({'deployment': settings['name'], 'mode': mode, **options})
+    return jobs
+
+
+
+def check_job(job, date):
+    """
+    Checks a job has day files to plot and that its variables are in them.
+
+    Args:
+        job (dict): Job from config_jobs.
+        date (datetime): Latest day plotted.
+
+    Raises:
+        FileNotFoundError: If there are no day files in any window of the job.
+        ValueError: If products or QC need variables that are not in the newest day file.
+
+    """
+    days = max(list(job.get('windows', wind_profiler_plots.windows)) + list(job.get('wind_windows', wind_profiler_plots.wind_windows)))
+    ncfiles = [ncfile for ncfile in wind_profiler_plots.window_nc_files(job['nc_file_path'], date, job['mode'], days)
+               if os.path.exists(ncfile)]
+    if not ncfiles:
+        raise FileNotFoundError(f'No {job["mode"]}-mode day files for the last {days} days in {job["nc_file_path"]}')
+    variables = wind_profiler_plots.product_variables(job.get('products', wind_profiler_plots.products),
+                                                      job.get('multipanel_variables', wind_profiler_plots.multipanel_variables),
+                                                      job.get('qc_rules', wind_profiler_plots.qc_rules))
+    if job.get('wind_windows', wind_profiler_plots.wind_windows):
+        variables += [variable for variable in ['wind_speed', 'wind_from_direction'] if variable not in variables]
+    nc = Dataset(ncfiles[-1])
+    missing = [variable for variable in variables if variable not in nc.variables]
+    nc.close()
+    if missing:
+        raise ValueError(f'Unknown products or variables not in {ncfiles[-1]}: {", ".join(missing)}')
+
+
+
+def run_job(job):
+    """
+    Makes plots for one deployment and mode, after checking there is something to plot.
+
+    Args:
+        job (dict): Job from config_jobs.
+
+    Returns:
+        dict: The job, with 'timings' from wind_profiler_plots.main and 'wall' time in seconds.
+
+    """
+    start = time.perf_counter()
+    arguments = {key: value for key, value in job.items() if key != 'deployment'}
+    check_job(job, dt.datetime.now())
+    if not os.path.exists(job['plots_path']):
+        os.makedirs(job['plots_path'])
+    timings = wind_profiler_plots.main(**arguments)
+    return {**job, 'timings': timings, 'wall': time.perf_counter() - start}
+
+
+
+def summarise(results, wall):
+    """
+    Returns run summary with timings for each deployment.
+
+    Args:
+        results (list): Finished jobs from run_job, and failed jobs with 'error'.
+        wall (float): Time in seconds for the whole run.
+
+    Returns:
+        str: Summary table, followed by the error of each failed job.
+
+    """
+    lines = [f'{"deployment":<30} {"jobs":>4} {"failed":>6} {"load":>8} {"qc":>8} {"render":>8} {"job time":>9}']
+    deployments = []
+    for result in results:
+        if result['deployment'] not in deployments:
+            deployments.append(result['deployment'])
+    for deployment in deployments:
+        done = [result for result in results if result['deployment'] == deployment and 'error' not in result]
+        failed = [result for result in results if result['deployment'] == deployment and 'error' in result]
+        totals = {stage: sum(result['timings'][stage] for result in done) for stage in ['load', 'qc', 'render']}
+        job_time = sum(result['wall'] for result in done)
+        lines.append(f'{deployment:<30} {len(done) + len(failed):>4} {len(failed):>6} {totals["load"]:>7.2f}s {totals["qc"]:>7.2f}s '
+                     f'{totals["render"]:>7.2f}s {job_time:>8.2f}s')
+    lines.append(f'Total run time {wall:.2f} s')
+    for result in results:
+        if 'error' in result:
+            lines.append(f'FAILED {result["deployment"]} {result["mode"]}-mode: {result["error"]}')
+    return '\n'.join(lines)
+
+
+
+def main(config_file, processes=None):
+    """
+    Make plots for all deployments in a config file.
+
+    Args:
+        config_file (str): File path and name of config file.
+        processes (int): Optional. Number of worker processes, overrides 'processes' in config.
+            Default is the number of CPUs.
+
+    Returns:
+        list: Finished jobs from run_job. Jobs that raised an exception are kept with 'error'
+            instead of timings, and the other jobs carry on.
+
+    """
+    start = time.perf_counter()
+    config = read_config(config_file)
+    jobs = config_jobs(config)
+    if processes is None:
+        processes = config.get('processes')
+
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                # one broken deployment should not stop the others
+                results.append({**futures[future], 'error': f'{type(error).__name__}: {error}'})
+
+    print(summarise(results, time.perf_counter() - start))
+    return results
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Make plots for several ncas-radar-wind-profiler-1 deployments from a config file.')
+    parser.add_argument('config_file', help='TOML or YAML config file')
+    parser.add_argument('-p', '--processes', type=int, default=None, help='number of worker processes')
+    args = parser.parse_args()
+    results = main(args.config_file, processes=args.processes)
+    if any('error' in result for result in results):
+        sys.exit(1)
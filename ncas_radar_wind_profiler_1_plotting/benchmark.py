@@ -0,0 +1,319 @@
+"""
+Benchmarks for ncas-radar-wind-profiler-1 plotting
+
+Usage: python benchmark.py render
+       python benchmark.py threads
+       python benchmark.py shared-memory
+       python benchmark.py bulk-read
+       python benchmark.py resample
+
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import datetime as dt
+import filecmp
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import shared_window
+import synthetic_deployment
+import wind_profiler_plots
+
+
+# (sampling interval in minutes, number of gates, days) for each benchmark case
+render_cases = [(15, 40, 1), (15, 40, 2), (5, 80, 1), (5, 80, 2), (1, 200, 2)]
+
+
+
+def synthetic_window(sampling_interval, gates, days=1, seed=0):
+    """
+    Creates a window of random data, as load_window would return.
+
+    Args:
+        sampling_interval (int): Number of minutes between samples.
+        gates (int): Number of altitude gates.
+        days (int): Optional. Number of days for x axis. Default is 1.
+        seed (int): Optional. Random number generator seed. Default is 0.
+
+    Returns:
+        dict: Window with wind and plotted variables.
+
+    """
+    rng = np.random.default_rng(seed)
+    x_time = wind_profiler_plots.create_time_xaxis(sampling_interval, days=days)
+    y_altitude = np.linspace(100, 8000, gates)
+    shape = (len(x_time), gates)
+    missing = rng.random(shape) < 0.1
+    data = {
+        'wind_speed': np.ma.masked_array(rng.uniform(0, 25, shape), mask=missing),
+        'wind_from_direction': np.ma.masked_array(rng.uniform(0, 360, shape), mask=missing),
+        'upward_air_velocity': np.ma.masked_array(rng.normal(0, 0.5, shape), mask=missing),
+        'signal_to_noise_ratio_minimum': np.ma.masked_array(rng.uniform(-20, 45, shape), mask=missing),
+        'spectral_width_of_beam_3': np.ma.masked_array(rng.uniform(0, 3, shape), mask=missing),
+    }
+    return {
+        'exists': True,
+        'mode': 'low',
+        'days': days,
+        'time': x_time,
+        'altitude': y_altitude,
+        'data': data,
+        'units': {'wind_speed': 'm s-1', 'wind_from_direction': 'degree', 'upward_air_velocity': 'm s-1',
+                  'signal_to_noise_ratio_minimum': 'dB', 'spectral_width_of_beam_3': 'm s-1'},
+    }
+
+
+
+def benchmark_render(cases=render_cases, repeats=3):
+    """
+    Times plotting with pcolormesh against the regular grid image path.
+
+    Args:
+        cases (list): Optional. (sampling interval, gates, days) for each case.
+        repeats (int): Optional. Number of times to plot each case, the fastest is reported. Default is 3.
+
+    Returns:
+        list: (case, seconds with 'mesh', seconds with 'auto') for each case.
+
+    """
+    results = []
+    print(f'{"interval":>8} {"gates":>6} {"hours":>6} {"mesh":>8} {"image":>8} {"speedup":>8}')
+    with tempfile.TemporaryDirectory() as save_loc:
+        for sampling_interval, gates, days in cases:
+            window = synthetic_window(sampling_interval, gates, days)
+            seconds = {}
+            for render in ['mesh', 'auto']:
+                best = np.inf
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    wind_profiler_plots.simple_2d_plot(window, 'upward_air_velocity', save_loc, cmap='RdBu_r', zero_centre_cbar=True, render=render)
+                    wind_profiler_plots.wind_speed_direction_plot(window, save_loc, render=render)
+                    best = min(best, time.perf_counter() - start)
+                seconds[render] = best
+            print(f'{sampling_interval:>7}m {gates:>6} {days * 24:>6} {seconds["mesh"]:>7.2f}s {seconds["auto"]:>7.2f}s {seconds["mesh"] / seconds["auto"]:>7.1f}x')
+            results.append(((sampling_interval, gates, days), seconds['mesh'], seconds['auto']))
+    return results
+
+
+
+def benchmark_threads(sampling_interval=5, gates=80, days=2, threads=[1, 2, 4]):
+    """
+    Times drawing all products of one window serially and on thread pools,
+    and checks the PNGs drawn in threads match the serial ones.
+
+    Args:
+        sampling_interval (int): Optional. Number of minutes between samples. Default is 5.
+        gates (int): Optional. Number of altitude gates. Default is 80.
+        days (int): Optional. Number of days for x axis. Default is 2.
+        threads (list): Optional. Numbers of threads to try, the first is the reference.
+
+    Returns:
+        list: (threads, seconds, True if PNGs match the reference) for each number of threads.
+
+    """
+    window = synthetic_window(sampling_interval, gates, days)
+    results = []
+    print(f'{"threads":>7} {"seconds":>8} {"speedup":>8} {"match":>6}')
+    with tempfile.TemporaryDirectory() as save_loc:
+        for n in threads:
+            plots_dir = f'{save_loc}/{n}'
+            os.makedirs(plots_dir)
+            start = time.perf_counter()
+            wind_profiler_plots.plot_window(window, plots_dir, threads=n)
+            seconds = time.perf_counter() - start
+            pngs = sorted(name for name in os.listdir(plots_dir) if name.endswith('.png'))
+            match = all(filecmp.cmp(f'{save_loc}/{threads[0]}/{name}', f'{plots_dir}/{name}', shallow=False) for name in pngs)
+            reference = results[0][1] if results else seconds
+            print(f'{n:>7} {seconds:>7.2f}s {reference / seconds:>7.1f}x {str(match):>6}')
+            results.append((n, seconds, match))
+    return results
+
+
+
+def private_memory():
+    """
+    Returns memory used only by this process, in bytes, from /proc/self/smaps_rollup (Linux only).
+    Pages mapped from shared memory are not included.
+    """
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+
+worker_baseline = 0
+
+def record_worker_baseline():
+    """
+    Records private memory of an idle worker, as a process pool initializer.
+    """
+    global worker_baseline
+    worker_baseline = private_memory()
+
+
+
+def read_window(window):
+    """
+    Reads every value of a window, as plotting would, and returns private memory growth of this worker in bytes.
+    """
+    for data in window['data'].values():
+        np.ma.getdata(data).sum()
+        np.ma.getmaskarray(data).sum()
+    return private_memory() - worker_baseline
+
+
+
+def shared_worker(descriptor):
+    """
+    Maps a shared window and reads it, for use in a process pool.
+    """
+    window, segment = shared_window.attach_window(descriptor)
+    growth = read_window(window)
+    del window
+    segment.close()
+    return growth
+
+
+
+def benchmark_shared_memory(cases=render_cases, processes=2):
+    """
+    Compares private memory growth of workers sent a copy of a window against workers
+    mapping it from shared memory, for windows of increasing size.
+
+    Args:
+        cases (list): Optional. (sampling interval, gates, days) for each case.
+        processes (int): Optional. Number of worker processes. Default is 2.
+
+    Returns:
+        list: (case, MB of window data, MB growth per worker with copies, MB growth per worker with shared memory) for each case.
+
+    """
+    results = []
+    print(f'{"interval":>8} {"gates":>6} {"hours":>6} {"data":>9} {"copied":>9} {"shared":>9}')
+    for sampling_interval, gates, days in cases:
+        window = synthetic_window(sampling_interval, gates, days)
+        size = sum(data.nbytes + np.ma.getmaskarray(data).nbytes for data in window['data'].values()) / 1e6
+        with ProcessPoolExecutor(max_workers=processes, initializer=record_worker_baseline) as executor:
+            copied = max(executor.map(read_window, [window] * processes)) / 1e6
+        descriptor, segment = shared_window.share_window(window)
+        try:
+            with ProcessPoolExecutor(max_workers=processes, initializer=record_worker_baseline) as executor:
+                shared = max(executor.map(shared_worker, [descriptor] * processes)) / 1e6
+        finally:
+            shared_window.release_segment(segment)
+        print(f'{sampling_interval:>7}m {gates:>6} {days * 24:>6} {size:>7.1f}MB {copied:>7.1f}MB {shared:>7.1f}MB')
+        results.append(((sampling_interval, gates, days), size, copied, shared))
+    return results
+
+
+
+def benchmark_bulk_read(cases=render_cases, repeats=5, compress=True):
+    """
+    Times loading windows from generated day files opened normally and read into memory in one go.
+
+    Args:
+        cases (list): Optional. (sampling interval, gates, days) for each case.
+        repeats (int): Optional. Number of times to load each case, the fastest is reported. Default is 5.
+        compress (bool): Optional. Compress generated files with zlib, as processed files are. Default is True.
+
+    Returns:
+        list: (case, seconds opening normally, seconds reading into memory) for each case.
+
+    """
+    results = []
+    today = dt.datetime.now()
+    variables = wind_profiler_plots.product_variables()
+    print(f'{"interval":>8} {"gates":>6} {"hours":>6} {"files":>9} {"normal":>8} {"memory":>8} {"speedup":>8}')
+    with tempfile.TemporaryDirectory() as nc_file_path:
+        for sampling_interval, gates, days in cases:
+            case_path = f'{nc_file_path}/{sampling_interval}_{gates}'
+            size = synthetic_deployment.main(case_path, today - dt.timedelta(days=days), days=days + 1, modes=['low'],
+                                             sampling_interval=sampling_interval, gates=gates, processes=1, compress=compress)
+            ncfiles = wind_profiler_plots.window_nc_files(case_path, today, 'low', days)
+            seconds = {}
+            for name, bulk_read_limit in [('normal', 0), ('memory', wind_profiler_plots.bulk_read_limit)]:
+                best = np.inf
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    wind_profiler_plots.load_window(ncfiles, variables, days=days, cache={}, bulk_read_limit=bulk_read_limit)
+                    best = min(best, time.perf_counter() - start)
+                seconds[name] = best
+            print(f'{sampling_interval:>7}m {gates:>6} {days * 24:>6} {size / 1e6:>7.1f}MB {seconds["normal"]:>7.3f}s {seconds["memory"]:>7.3f}s {seconds["normal"] / seconds["memory"]:>7.1f}x')
+            results.append(((sampling_interval, gates, days), seconds['normal'], seconds['memory']))
+    print('Files are read from the page cache after the first repeat; the difference is larger on a parallel filesystem.')
+    return results
+
+
+
+def benchmark_resample(cases=[(5, 15), (15, 5), (1, 15)], gates=80, days=2):
+    """
+    Loads windows of generated day files where the newest file has a different sampling interval
+    to older ones, and counts times with data when records must match window times exactly and when resampled.
+
+    Args:
+        cases (list): Optional. (sampling interval of older files, sampling interval of newest file) for each case.
+        gates (int): Optional. Number of altitude gates. Default is 80.
+        days (int): Optional. Number of days for x axis. Default is 2.
+
+    Returns:
+        list: (case, window times, times with data matching exactly, times with data resampled, seconds to load) for each case.
+
+    """
+    results = []
+    today = dt.datetime.now()
+    variables = wind_profiler_plots.product_variables()
+    print(f'{"older":>6} {"newest":>7} {"times":>6} {"exact":>6} {"resampled":>10} {"load":>7}')
+    with tempfile.TemporaryDirectory() as nc_file_path:
+        for older_interval, newest_interval in cases:
+            case_path = f'{nc_file_path}/{older_interval}_{newest_interval}'
+            synthetic_deployment.main(case_path, today - dt.timedelta(days=days), days=days, modes=['low'],
+                                      sampling_interval=older_interval, gates=gates, processes=1)
+            synthetic_deployment.main(case_path, today, days=1, modes=['low'], sampling_interval=newest_interval, gates=gates, processes=1)
+            ncfiles = wind_profiler_plots.window_nc_files(case_path, today, 'low', days)
+
+            start = time.perf_counter()
+            window = wind_profiler_plots.load_window(ncfiles, variables, days=days)
+            seconds = time.perf_counter() - start
+            resampled = int((~np.ma.getmaskarray(window['data']['wind_speed'])).any(axis=1).sum())
+            # times that would be filled if records had to fall exactly on window times
+            record_times = np.concatenate([wind_profiler_plots.read_day_file(ncfile, ['wind_speed'])['time'] for ncfile in ncfiles])
+            exact = int(np.isin(window['time'], record_times).sum())
+            print(f'{older_interval:>5}m {newest_interval:>6}m {len(window["time"]):>6} {exact:>6} {resampled:>10} {seconds:>6.3f}s')
+            results.append(((older_interval, newest_interval), len(window['time']), exact, resampled, seconds))
+    return results
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks for ncas-radar-wind-profiler-1 plotting.')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    render_parser = subparsers.add_parser('render', help='compare pcolormesh and regular grid image plotting')
+    render_parser.add_argument('--repeats', type=int, default=3, help='number of times to plot each case')
+    threads_parser = subparsers.add_parser('threads', help='compare drawing products one at a time and in threads')
+    threads_parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4], help='numbers of threads to try, the first is the reference')
+    shared_parser = subparsers.add_parser('shared-memory', help='compare worker memory with copied and shared windows')
+    shared_parser.add_argument('--processes', type=int, default=2, help='number of worker processes')
+    bulk_parser = subparsers.add_parser('bulk-read', help='compare opening day files normally and from memory')
+    bulk_parser.add_argument('--repeats', type=int, default=5, help='number of times to load each case')
+    bulk_parser.add_argument('--uncompressed', action='store_true', help='generate uncompressed day files')
+    subparsers.add_parser('resample', help='compare windows of mixed sampling intervals matched exactly and resampled')
+    args = parser.parse_args()
+
+    if args.benchmark == 'render':
+        benchmark_render(repeats=args.repeats)
+    elif args.benchmark == 'threads':
+        benchmark_threads(threads=args.threads)
+    elif args.benchmark == 'shared-memory':
+        benchmark_shared_memory(processes=args.processes)
+    elif args.benchmark == 'bulk-read':
+        benchmark_bulk_read(repeats=args.repeats, compress=not args.uncompressed)
+    elif args.benchmark == 'resample':
+        benchmark_resample()
@@ -0,0 +1,337 @@
+"""
+Create climatology plots over a whole deployment from ncas-radar-wind-profiler-1
+
+Day files are reduced one at a time in a process pool to small partial
+aggregates (sums, counts and histograms per gate), which are merged into
+the climatology. Memory use is bounded by one day of data per worker,
+however long the deployment. Wind direction is averaged as u and v
+weighted by wind speed, see aggregation.py.
+
+"""
+
+
+from netCDF4 import Dataset
+import numpy as np
+import datetime as dt
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from aggregation import valid_values, empty_wind_partial, accumulate_wind, merge_wind_partials, finalise_wind
+from wind_profiler_plots import nc_file_name, add_text, new_figure
+
+
+#################################
+# Options to potentially change #
+#################################
+
+deployment='20230710_woest'
+nc_file_path = f'/gws/pw/j07/ncas_obs_vol1/amf/processing/ncas-radar-wind-profiler-1/{deployment}'
+plots_path = '/home/users/ncasit/nrwp1_plot_test/climatology'
+start_date = '20230710'
+end_date = '20230930'
+mode = 'low'
+processes = 4
+wind_speed_bins = np.arange(0, 60.5, 0.5)
+percentiles = [10, 25, 50, 75, 90]
+
+#################################
+
+
+
+def empty_partial(altitude, bins=wind_speed_bins):
+    """
+    Creates partial aggregate with nothing in it.
+
+    Args:
+        altitude (array): Altitude of each gate.
+        bins (array): Optional. Bin edges for wind speed histograms.
+
+    Returns:
+        dict: Partial aggregate arrays.
+
+    """
+    n_gates = len(altitude)
+    return {
+        'altitude': np.asarray(altitude, dtype=float),
+        'bins': np.asarray(bins, dtype=float),
+        'records': 0,
+        'hour_records': np.zeros(24, dtype=np.int64),
+        'ws_sum': np.zeros(n_gates),
+        'ws_count': np.zeros(n_gates, dtype=np.int64),
+        'ws_hist': np.zeros((n_gates, len(bins) - 1), dtype=np.int64),
+        'wind': empty_wind_partial((1, n_gates)),
+        'w_sum': np.zeros((24, n_gates)),
+        'w_count': np.zeros((24, n_gates), dtype=np.int64),
+        'snr_count': np.zeros((24, n_gates), dtype=np.int64),
+    }
+
+
+
+def reduce_day_file(ncfile, bins=wind_speed_bins):
+    """
+    Reduces one day file to a partial aggregate.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        bins (array): Optional. Bin edges for wind speed histograms.
+
+    Returns:
+        dict: Partial aggregate arrays.
+
+    """
+    nc = Dataset(ncfile)
+    time = np.asarray(nc['time'][:], dtype=np.int64)
+    partial = empty_partial(nc['altitude'][:], bins=bins)
+    n_gates = len(partial['altitude'])
+    hours = (time // 3600) % 24
+
+    partial['records'] = len(time)
+    partial['hour_records'] += np.bincount(hours, minlength=24)
+
+    # wind speed sums and histograms per gate
+    ws, ws_valid = valid_values(nc['wind_speed'][:])
+    partial['ws_sum'] += ws.sum(axis=0)
+    partial['ws_count'] += ws_valid.sum(axis=0)
+    n_bins = len(bins) - 1
+    bin_index = np.clip(np.digitize(ws, bins) - 1, 0, n_bins - 1)
+    flat_index = (np.arange(n_gates) * n_bins + bin_index)[ws_valid]
+    partial['ws_hist'] += np.bincount(flat_index, minlength=n_gates * n_bins).reshape(n_gates, n_bins)
+
+    # wind direction from u and v, all records in one bin
+    accumulate_wind(partial['wind'], np.zeros(len(time), dtype=int), nc['wind_speed'][:], nc['wind_from_direction'][:])
+
+    # diurnal composite of vertical velocity
+    w, w_valid = valid_values(nc['upward_air_velocity'][:])
+    np.add.at(partial['w_sum'], hours, w)
+    np.add.at(partial['w_count'], hours, w_valid)
+
+    # SNR availability
+    _, snr_valid = valid_values(nc['signal_to_noise_ratio_minimum'][:])
+    np.add.at(partial['snr_count'], hours, snr_valid)
+
+    nc.close()
+    return partial
+
+
+
+def merge_partials(a, b):
+    """
+    Merges two partial aggregates.
+
+    Args:
+        a (dict): Partial aggregate.
+        b (dict): Partial aggregate.
+
+    Returns:
+        dict: Partial aggregate of both.
+
+    """
+    if len(a['altitude']) != len(b['altitude']) or not np.allclose(a['altitude'], b['altitude']):
+        raise ValueError('Cannot merge partial aggregates with different altitude gates')
+    if not np.array_equal(a['bins'], b['bins']):
+        raise ValueError('Cannot merge partial aggregates with different wind speed bins')
+
+    merged = {'altitude': a['altitude'], 'bins': a['bins'], 'wind': merge_wind_partials(a['wind'], b['wind'])}
+    for key in a:
+        if key not in merged:
+            merged[key] = a[key] + b[key]
+    return merged
+
+
+
+def histogram_percentiles(hist, bins, percentiles=percentiles):
+    """
+    Estimates percentiles per gate from wind speed histograms.
+
+    Args:
+        hist (array): Histogram counts, shape (gates, bins).
+        bins (array): Bin edges.
+        percentiles (list): Percentiles to estimate.
+
+    Returns:
+        array: Percentile values, shape (percentiles, gates). NaN where there is no data.
+
+    """
+    total = hist.sum(axis=1)
+    cdf = np.cumsum(hist, axis=1) / np.where(total == 0, 1, total)[:, None]
+    centres = (bins[:-1] + bins[1:]) / 2
+    result = np.empty((len(percentiles), hist.shape[0]))
+    for i, p in enumerate(percentiles):
+        result[i] = centres[np.argmax(cdf >= p / 100, axis=1)]
+    result[:, total == 0] = np.nan
+    return result
+
+
+
+def finalise_climatology(partial, percentiles=percentiles):
+    """
+    Converts a partial aggregate into climatology arrays.
+
+    Args:
+        partial (dict): Merged partial aggregate.
+        percentiles (list): Optional. Percentiles of wind speed to estimate.
+
+    Returns:
+        dict: Climatology arrays.
+
+    """
+    wind = finalise_wind(partial['wind'])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_ws = partial['ws_sum'] / partial['ws_count']
+        diurnal_w = partial['w_sum'] / partial['w_count']
+        snr_availability = partial['snr_count'].sum(axis=0) / partial['records']
+        diurnal_snr_availability = partial['snr_count'] / partial['hour_records'][:, None]
+
+    return {
+        'altitude': partial['altitude'],
+        'records': partial['records'],
+        'percentiles': np.asarray(percentiles),
+        'wind_speed_mean': mean_ws,
+        'wind_speed_percentiles': histogram_percentiles(partial['ws_hist'], partial['bins'], percentiles),
+        'wind_from_direction_mean': wind['wind_from_direction'][0],
+        'wind_from_direction_steadiness': wind['steadiness'][0],
+        'vector_wind_speed_mean': wind['vector_wind_speed'][0],
+        'upward_air_velocity_diurnal_mean': diurnal_w,
+        'snr_availability': snr_availability,
+        'snr_availability_diurnal': diurnal_snr_availability,
+    }
+
+
+
+def reduce_deployment(ncfiles, processes=processes, bins=wind_speed_bins):
+    """
+    Reduces day files to one partial aggregate in a process pool.
+
+    Args:
+        ncfiles (list): File paths and names of netCDF files.
+        processes (int): Optional. Number of worker processes.
+        bins (array): Optional. Bin edges for wind speed histograms.
+
+    Returns:
+        dict: Merged partial aggregate, or None if there are no files.
+
+    """
+    total = None
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(reduce_day_file, ncfile, bins) for ncfile in ncfiles]
+        for future in as_completed(futures):
+            partial = future.result()
+            total = partial if total is None else merge_partials(total, partial)
+    return total
+
+
+
+def plot_climatology(clim, save_loc, mode, title):
+    """
+    Creates wind profile, vertical velocity diurnal composite and SNR availability plots.
+
+    Args:
+        clim (dict): Climatology arrays from finalise_climatology.
+        save_loc (str): File path to save plots to.
+        mode (str): Operation mode of wind profiler (high or low).
+        title (str): Period covered, used in plot titles and file names.
+
+    """
+    altitude = clim['altitude']
+
+    # mean and percentile wind profiles
+    fig = new_figure((14,10))
+    ax = fig.add_subplot(121)
+    pct = clim['wind_speed_percentiles']
+    ax.fill_betweenx(altitude, pct[0], pct[-1], color='tab:blue', alpha=0.2, label=f'{clim["percentiles"][0]}-{clim["percentiles"][-1]} percentile')
+    ax.plot(pct[len(pct)//2], altitude, color='tab:blue', linestyle='--', label=f'{clim["percentiles"][len(pct)//2]} percentile')
+    ax.plot(clim['wind_speed_mean'], altitude, color='black', label='Mean')
+    ax.set_xlabel('Wind speed (m/s)', fontsize=17)
+    ax.set_ylabel('Altitude (m)', fontsize=17)
+    ax.tick_params(axis='both', which='both', labelsize=14)
+    ax.legend(fontsize=12)
+    ax.grid(which='both')
+    add_text(ax,f'NCAS Radar Wind Profiler 1\n{title}')
+
+    ax2 = fig.add_subplot(122, sharey=ax)
+    ax2.scatter(clim['wind_from_direction_mean'], altitude, c=clim['wind_from_direction_steadiness'], vmin=0, vmax=1, cmap='viridis')
+    ax2.set_xlim(0,360)
+    ax2.set_xticks(range(0,361,90))
+    ax2.set_xlabel('Mean wind from direction (degree)', fontsize=17)
+    ax2.tick_params(axis='both', which='both', labelsize=14)
+    ax2.grid(which='both')
+
+    fig.tight_layout()
+    fig.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_wind-profile-climatology_{title}.png')
+
+    # diurnal composite of vertical velocity
+    hours = np.arange(25)
+    w = np.ma.masked_invalid(clim['upward_air_velocity_diurnal_mean'])
+    vmax = np.nanpercentile(np.abs(w.compressed()),98) if w.count() else None
+    vmin = -vmax if vmax is not None else None
+    edges = np.concatenate([altitude[:1], (altitude[:-1] + altitude[1:]) / 2, altitude[-1:]])
+
+    fig = new_figure((20,8))
+    ax = fig.add_subplot(111)
+    pc = ax.pcolormesh(hours, edges, w.T, cmap='RdBu_r', vmin=vmin, vmax=vmax)
+    ax.set_xticks(range(0,25,2))
+    ax.set_ylabel('Altitude (m)', fontsize=17)
+    ax.set_xlabel('Hour of day (UTC)', fontsize=17)
+    ax.set_title(f'Diurnal composite - {title}', fontsize=19)
+    ax.tick_params(axis='both', which='both', labelsize=14)
+    ax.grid(which='both')
+    cbar = fig.colorbar(pc, ax = ax)
+    cbar.ax.set_ylabel('upward_air_velocity (m s-1)', fontsize=17)
+    cbar.ax.tick_params(axis='both', which='both', labelsize=12)
+    add_text(ax,'NCAS Radar Wind Profiler 1')
+    fig.tight_layout()
+    fig.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_upward-air-velocity-diurnal_{title}.png')
+
+    # SNR availability by height
+    fig = new_figure((8,10))
+    ax = fig.add_subplot(111)
+    ax.plot(clim['snr_availability'] * 100, altitude, color='black')
+    ax.set_xlim(0,100)
+    ax.set_xlabel('signal_to_noise_ratio_minimum availability (%)', fontsize=15)
+    ax.set_ylabel('Altitude (m)', fontsize=17)
+    ax.tick_params(axis='both', which='both', labelsize=14)
+    ax.grid(which='both')
+    add_text(ax,f'NCAS Radar Wind Profiler 1\n{title}')
+    fig.tight_layout()
+    fig.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_snr-availability_{title}.png')
+
+
+
+def main(nc_file_path=nc_file_path, plots_path=plots_path, mode=mode, start_date=start_date, end_date=end_date, processes=processes):
+    """
+    Make climatology arrays and plots for a deployment.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        plots_path (str): Location to save plots.
+        mode (str): Operation mode of wind profiler (high or low).
+        start_date (str): First day of data, YYYYmmdd.
+        end_date (str): Last day of data, YYYYmmdd.
+        processes (int): Number of worker processes.
+
+    Returns:
+        dict: Climatology arrays, or None if there are no files.
+
+    """
+    start = dt.datetime.strptime(start_date, '%Y%m%d')
+    end = dt.datetime.strptime(end_date, '%Y%m%d')
+    ncfiles = [nc_file_name(nc_file_path, start + dt.timedelta(days=i), mode) for i in range((end - start).days + 1)]
+    ncfiles = [ncfile for ncfile in ncfiles if os.path.exists(ncfile)]
+
+    partial = reduce_deployment(ncfiles, processes=processes)
+    if partial is None:
+        return None
+    clim = finalise_climatology(partial)
+
+    if not os.path.exists(plots_path):
+        os.makedirs(plots_path)
+    title = f'{start_date}-{end_date}'
+    np.savez(f'{plots_path}/ncas-wind-profiler-1_{mode}-mode_climatology_{title}.npz', **clim)
+    plot_climatology(clim, plots_path, mode, title)
+    return clim
+
+
+
+if __name__ == "__main__":
+    main(mode="low")
+    main(mode="high")
@@ -0,0 +1,197 @@
+"""
+Track how fresh ncas-radar-wind-profiler-1 plots are
+
+For each plot made, records the time of the newest profile with data, the
+modification time of the newest file, when the plot was saved, and the lags
+between them. Records are kept in a rolling JSONL history, and a summary
+with percentiles is written in Prometheus textfile format, for node_exporter's
+textfile collector to pick up.
+
+"""
+
+
+import json
+import os
+import time
+
+import numpy as np
+
+
+#################################
+# Options to potentially change #
+#################################
+
+# days of history to keep
+history_days = 7
+
+# hours of history the percentiles cover
+summary_hours = 24
+
+quantiles = [0.5, 0.9, 0.99]
+
+#################################
+
+
+history_file_name = 'ncas-radar-wind-profiler-1_freshness.jsonl'
+textfile_name = 'ncas_radar_wind_profiler_1_freshness.prom'
+
+
+
+def newest_data_time(window, variables):
+    """
+    Returns the time of the newest profile with any data in variables.
+
+    Args:
+        window (dict): Window from wind_profiler_plots.load_window.
+        variables (list): Names of variables in window.
+
+    Returns:
+        int: Timestamp, seconds since 1970-01-01 00:00:00 UTC, None if there is no data.
+
+    """
+    has_data = np.zeros(len(window['time']), dtype=bool)
+    for variable in variables:
+        has_data |= ~np.ma.getmaskarray(window['data'][variable]).all(axis=1)
+    if not has_data.any():
+        return None
+    return int(np.asarray(window['time'])[has_data].max())
+
+
+
+def product_freshness(window, product, variables, rendered):
+    """
+    Works out freshness of one plot.
+
+    Args:
+        window (dict): Window the plot was made from.
+        product (str): Product plotted.
+        variables (list): Names of variables in the product.
+        rendered (float): Time the plot was saved, seconds since 1970-01-01 00:00:00 UTC.
+
+    Returns:
+        dict: 'mode', 'product', 'hours', 'newest_data', 'file_mtime', 'rendered', 'lag' (plot saved
+            after newest data) and 'file_lag' (plot saved after newest file changed). Times not
+            known are None.
+
+    """
+    newest_data = newest_data_time(window, variables)
+    file_mtime = window.get('file_mtime')
+    return {
+        'mode': window['mode'],
+        'product': product,
+        'hours': window['days'] * 24,
+        'newest_data': newest_data,
+        'file_mtime': file_mtime,
+        'rendered': rendered,
+        'lag': rendered - newest_data if newest_data is not None else None,
+        'file_lag': rendered - file_mtime if file_mtime is not None else None,
+    }
+
+
+
+def read_history(history_file, since):
+    """
+    Reads records newer than a time from the history.
+
+    Args:
+        history_file (str): File path and name of JSONL history.
+        since (float): Oldest time, seconds since 1970-01-01 00:00:00 UTC, to keep.
+
+    Returns:
+        list: Records.
+
+    """
+    records = []
+    if not os.path.exists(history_file):
+        return records
+    with open(history_file) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # skip anything that is not a whole record
+                continue
+            if record['rendered'] >= since:
+                records.append(record)
+    return records
+
+
+
+def prometheus_summary(records, quantiles=quantiles):
+    """
+    Makes Prometheus textfile lines summarising plot lags.
+
+    Args:
+        records (list): Freshness records.
+        quantiles (list): Optional. Quantiles of lag to report.
+
+    Returns:
+        str: Metrics in Prometheus text format.
+
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault((record['mode'], record['product'], record['hours']), []).append(record)
+
+    lines = [
+        '# HELP ncas_radar_wind_profiler_1_plot_lag_seconds Time from newest profile with data to plot saved.',
+        '# TYPE ncas_radar_wind_profiler_1_plot_lag_seconds summary',
+    ]
+    latest_lines = []
+    for (mode, product, hours), group in sorted(groups.items()):
+        labels = f'mode="{mode}",product="{product}",hours="{hours}"'
+        lags = np.array([record['lag'] for record in group if record['lag'] is not None])
+        if len(lags):
+            for quantile, value in zip(quantiles, np.quantile(lags, quantiles)):
+                lines.append(f'ncas_radar_wind_profiler_1_plot_lag_seconds{{{labels},quantile="{quantile}"}} {value:.3f}')
+        lines.append(f'ncas_radar_wind_profiler_1_plot_lag_seconds_sum{{{labels}}} {lags.sum():.3f}')
+        lines.append(f'ncas_radar_wind_profiler_1_plot_lag_seconds_count{{{labels}}} {len(lags)}')
+
+        latest = max(group, key=lambda record: record['rendered'])
+        for name, value in [('last_lag_seconds', latest['lag']), ('last_file_lag_seconds', latest['file_lag']),
+                            ('newest_data_timestamp_seconds', latest['newest_data']), ('last_render_timestamp_seconds', latest['rendered'])]:
+            if value is not None:
+                latest_lines.append((name, f'ncas_radar_wind_profiler_1_plot_{name}{{{labels}}} {value:.3f}'))
+
+    for name, help_text in [('last_lag_seconds', 'Lag of the latest plot, from newest profile with data to plot saved.'),
+                            ('last_file_lag_seconds', 'Lag of the latest plot, from newest file changing to plot saved.'),
+                            ('newest_data_timestamp_seconds', 'Time of newest profile with data in the latest plot.'),
+                            ('last_render_timestamp_seconds', 'Time the latest plot was saved.')]:
+        lines.append(f'# HELP ncas_radar_wind_profiler_1_plot_{name} {help_text}')
+        lines.append(f'# TYPE ncas_radar_wind_profiler_1_plot_{name} gauge')
+        lines += [line for metric, line in latest_lines if metric == name]
+    return '\n'.join(lines) + '\n'
+
+
+
+def record_run(freshness_path, records, history_days=history_days, summary_hours=summary_hours):
+    """
+    Adds records to the history, drops records older than history_days, and rewrites the Prometheus textfile.
+
+    Args:
+        freshness_path (str): Location of history and textfile.
+        records (list): Freshness records from product_freshness.
+        history_days (float): Optional. Days of history to keep.
+        summary_hours (float): Optional. Hours of history the percentiles cover.
+
+    Returns:
+        str: Metrics written to the textfile.
+
+    """
+    os.makedirs(freshness_path, exist_ok=True)
+    history_file = f'{freshness_path}/{history_file_name}'
+    now = time.time()
+    history = read_history(history_file, now - history_days * 86400) + records
+
+    # rewrite rather than append, to drop old records
+    with open(f'{history_file}.tmp', 'w') as f:
+        for record in history:
+            f.write(json.dumps(record) + '\n')
+    os.replace(f'{history_file}.tmp', history_file)
+
+    metrics = prometheus_summary([record for record in history if record['rendered'] >= now - summary_hours * 3600])
+    # node_exporter must never see a half written file
+    with open(f'{freshness_path}/{textfile_name}.tmp', 'w') as f:
+        f.write(metrics)
+    os.replace(f'{freshness_path}/{textfile_name}.tmp', f'{freshness_path}/{textfile_name}')
+    return metrics
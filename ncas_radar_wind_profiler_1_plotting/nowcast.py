@@ -0,0 +1,301 @@
+"""
+Create plot of the latest profiles from ncas-radar-wind-profiler-1
+
+Draws the last few profiles of wind speed, wind direction, upward air
+velocity and signal to noise ratio against altitude. Only the trailing
+records of today's file are read (topped up from yesterday's file just
+after midnight), and the figure is built once and reused, only the line
+data being changed for each new plot, so a plot takes a fraction of a
+second and can be remade whenever the file changes.
+
+Usage: python nowcast.py
+       python nowcast.py --watch
+
+"""
+
+
+from netCDF4 import Dataset
+import argparse
+import datetime as dt
+import os
+import time
+
+import numpy as np
+
+import wind_profiler_plots
+from wind_profiler_plots import add_text, new_figure
+
+
+#################################
+# Options to potentially change #
+#################################
+
+nc_file_path = wind_profiler_plots.nc_file_path
+plots_path = wind_profiler_plots.plots_path
+mode = wind_profiler_plots.mode
+
+# number of latest profiles to draw
+n_profiles = 6
+
+# panels, left to right, and x axis limits of each, None to scale to the data
+panels = ['wind_speed', 'wind_from_direction', 'upward_air_velocity', 'signal_to_noise_ratio_minimum']
+panel_limits = {'wind_from_direction': (0, 360)}
+
+# seconds between checks for a changed file when watching
+watch_interval = 10
+
+#################################
+
+
+
+def read_latest_profiles(ncfiles, variables, n_profiles=n_profiles):
+    """
+    Reads the last n profiles from the newest files, without reading the rest of each file.
+
+    Args:
+        ncfiles (list): File paths and names of netCDF files, newest first.
+            Older files are only opened if newer ones have fewer than n_profiles records.
+        variables (list): Names of variables in netCDF files.
+        n_profiles (int): Optional. Number of profiles to read.
+
+    Returns:
+        dict: 'time' (timestamps, oldest first), 'altitude', 'data' (masked arrays with shape (time, altitude))
+            and 'units' for each variable. None if no file exists.
+
+    """
+    parts = []
+    altitude = None
+    units = {}
+    wanted = n_profiles
+    for ncfile in ncfiles:
+        if wanted <= 0 or not os.path.exists(ncfile):
+            continue
+        nc = Dataset(ncfile)
+        file_altitude = np.ma.getdata(nc['altitude'][:]).astype(float)
+        if altitude is not None and not np.array_equal(file_altitude, altitude):
+            # gates changed, older profiles cannot be drawn on the same axes
+            nc.close()
+            break
+        altitude = file_altitude
+        records = len(nc['time'])
+        first = max(0, records - wanted)
+        part = {'time': np.asarray(nc['time'][first:records]).astype(int)}
+        for variable in variables:
+            part[variable] = np.ma.masked_array(nc[variable][first:records], dtype=float)
+            units.setdefault(variable, nc[variable].units)
+        nc.close()
+        parts.insert(0, part)
+        wanted -= records - first
+
+    if altitude is None:
+        return None
+    return {
+        'time': np.concatenate([part['time'] for part in parts]),
+        'altitude': altitude,
+        'data': {variable: np.ma.concatenate([part[variable] for part in parts]) for variable in variables},
+        'units': units,
+    }
+
+
+
+def make_template(n_profiles=n_profiles, panels=panels, panel_limits=panel_limits):
+    """
+    Creates the figure the latest profiles are drawn on, with empty lines to fill in.
+
+    Args:
+        n_profiles (int): Optional. Number of profiles drawn.
+        panels (list): Optional. Variable drawn in each panel.
+        panel_limits (dict): Optional. Fixed x axis limits for variables.
+
+    Returns:
+        dict: 'fig', 'axes' and 'lines' for each variable (oldest profile first), 'title'
+            and 'labels' (x axis label of each variable, to add units to).
+
+    """
+    fig = new_figure((5 * len(panels), 8))
+    axes = {}
+    lines = {}
+    labels = {}
+    # older profiles fainter, the latest in black
+    shades = np.linspace(0.8, 0.0, n_profiles)
+    for n, variable in enumerate(panels):
+        ax = fig.add_subplot(1, len(panels), n + 1, sharey=axes[panels[0]] if n else None)
+        if variable == 'wind_from_direction':
+            lines[variable] = [ax.plot([], [], marker='.', linestyle='none', color=str(shade))[0] for shade in shades]
+            ax.set_xticks(range(0, 361, 90))
+        else:
+            lines[variable] = [ax.plot([], [], color=str(shade), linewidth=1 if i < n_profiles - 1 else 2)[0]
+                               for i, shade in enumerate(shades)]
+        if variable in panel_limits:
+            ax.set_xlim(*panel_limits[variable])
+        labels[variable] = ax.set_xlabel(variable, fontsize=13)
+        ax.tick_params(axis='both', which='both', labelsize=12)
+        ax.grid(which='both')
+        if n == 0:
+            ax.set_ylabel('Altitude (m)', fontsize=14)
+            add_text(ax, 'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK', ypos=1.06)
+        else:
+            ax.tick_params(axis='y', labelleft=False)
+        axes[variable] = ax
+    title = fig.suptitle('', x=0.98, y=0.97, ha='right', fontsize=14)
+    return {'fig': fig, 'axes': axes, 'lines': lines, 'title': title, 'labels': labels}
+
+
+
+def update_template(template, profiles, panel_limits=panel_limits):
+    """
+    Puts profiles on the lines of a template. Lines with no profile are emptied.
+
+    Args:
+        template (dict): Template from make_template.
+        profiles (dict): Profiles from read_latest_profiles.
+        panel_limits (dict): Optional. Fixed x axis limits for variables, others are scaled to the data.
+
+    """
+    altitude = profiles['altitude']
+    # layout only has to be worked out again if labels change, usually just the first time
+    relayout = False
+    for variable, lines in template['lines'].items():
+        data = profiles['data'][variable]
+        # latest profile on the last line
+        offset = len(lines) - len(data)
+        for i, line in enumerate(lines):
+            if i < offset:
+                line.set_data([], [])
+            else:
+                line.set_data(data[i - offset].filled(np.nan), altitude)
+        label = f'{variable} ({profiles["units"][variable]})'
+        if template['labels'][variable].get_text() != label:
+            template['labels'][variable].set_text(label)
+            relayout = True
+        ax = template['axes'][variable]
+        ax.relim()
+        ax.autoscale_view(scalex=variable not in panel_limits)
+
+    times = [dt.datetime.fromtimestamp(int(timestamp), dt.timezone.utc) for timestamp in profiles['time']]
+    if times:
+        template['title'].set_text(f'{len(times)} profiles, {times[0]:%H:%M} to {times[-1]:%H:%M} UTC {times[-1]:%Y/%m/%d}')
+    else:
+        template['title'].set_text('No profiles')
+    if relayout:
+        template['fig'].tight_layout(rect=(0, 0, 1, 0.92))
+
+
+
+def save_template(template, plot_file):
+    """
+    Saves a template to a PNG, written under another name first so a half written plot is never shown.
+
+    Args:
+        template (dict): Template from make_template.
+        plot_file (str): File path and name of plot.
+
+    """
+    template['fig'].savefig(f'{plot_file}.tmp', format='png')
+    os.replace(f'{plot_file}.tmp', plot_file)
+
+
+
+def nowcast_file_name(save_loc, mode):
+    """
+    Returns file path and name of the latest profiles plot.
+
+    Args:
+        save_loc (str): File path plots are saved to.
+        mode (str): Operation mode of wind profiler (high or low).
+
+    Returns:
+        str: File path and name of plot.
+
+    """
+    return f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_latest-profiles.png'
+
+
+
+def main(nc_file_path=nc_file_path, plots_path=plots_path, mode=mode, n_profiles=n_profiles, panels=panels,
+         panel_limits=panel_limits, template=None):
+    """
+    Makes the latest profiles plot.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        plots_path (str): Location to save plot.
+        mode (str): Operation mode of wind profiler (high or low).
+        n_profiles (int): Optional. Number of latest profiles to draw.
+        panels (list): Optional. Variable drawn in each panel.
+        panel_limits (dict): Optional. Fixed x axis limits for variables.
+        template (dict): Optional. Template from an earlier call, reused if it has the same panels and
+            number of profiles. Default makes a new one.
+
+    Returns:
+        dict: Template, to pass to the next call.
+        dict: Time in seconds spent reading data and making the plot.
+
+    """
+    start = time.perf_counter()
+    today_date = dt.datetime.now()
+    # newest first
+    ncfiles = wind_profiler_plots.window_nc_files(nc_file_path, today_date, mode, days=1)[::-1]
+    profiles = read_latest_profiles(ncfiles, panels, n_profiles=n_profiles)
+    timings = {'read': time.perf_counter() - start}
+
+    start = time.perf_counter()
+    if template is None or list(template['lines']) != list(panels) or len(template['lines'][panels[0]]) != n_profiles:
+        template = make_template(n_profiles, panels, panel_limits)
+    if profiles is None:
+        profiles = {'time': np.array([], dtype=int), 'altitude': np.array([]),
+                    'data': {variable: np.ma.masked_all((0, 0)) for variable in panels}, 'units': {variable: '' for variable in panels}}
+    update_template(template, profiles, panel_limits)
+    save_template(template, nowcast_file_name(plots_path, mode))
+    timings['render'] = time.perf_counter() - start
+    return template, timings
+
+
+
+def watch(nc_file_path=nc_file_path, plots_path=plots_path, mode=mode, interval=watch_interval, **options):
+    """
+    Remakes the latest profiles plot whenever the newest file changes, until interrupted.
+    Errors, such as reading a file while it is being written, are printed and the plot is
+    tried again at the next check.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        plots_path (str): Location to save plot.
+        mode (str): Operation mode of wind profiler (high or low).
+        interval (float): Optional. Seconds between checks for a changed file.
+        **options: Optional. n_profiles, panels and panel_limits, see main.
+
+    """
+    template = None
+    last_seen = None
+    while True:
+        ncfile = wind_profiler_plots.nc_file_name(nc_file_path, dt.datetime.now(), mode)
+        try:
+            stat = os.stat(ncfile)
+            seen = (ncfile, stat.st_mtime, stat.st_size)
+        except FileNotFoundError:
+            seen = (ncfile, None, None)
+        if seen != last_seen:
+            try:
+                template, timings = main(nc_file_path, plots_path, mode, template=template, **options)
+            except Exception as error:
+                # last_seen is left alone so the plot is tried again
+                print(f'{dt.datetime.now():%H:%M:%S} {mode}-mode: {type(error).__name__}: {error}, trying again')
+            else:
+                print(f'{dt.datetime.now():%H:%M:%S} {mode}-mode: read {timings["read"]:.3f} s, render {timings["render"]:.3f} s')
+                last_seen = seen
+        time.sleep(interval)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create plot of the latest profiles from ncas-radar-wind-profiler-1.')
+    parser.add_argument('--watch', action='store_true', help='remake the plot whenever today\'s file changes')
+    parser.add_argument('--mode', choices=['low', 'high'], default=mode, help='operation mode')
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(mode=args.mode)
+    else:
+        template, timings = main(mode=args.mode)
+        print(f'{args.mode}-mode: read {timings["read"]:.3f} s, render {timings["render"]:.3f} s')
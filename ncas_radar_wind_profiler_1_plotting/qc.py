@@ -0,0 +1,116 @@
+"""
+Quality-control mask for ncas-radar-wind-profiler-1 time/altitude data
+
+The mask is computed once per window from configurable rules and applied
+in place to every variable in the window, so all products plotted from the
+window hide the same gates.
+
+"""
+
+
+import numpy as np
+
+
+# rules not given in a qc_rules dictionary take these values
+# None switches a threshold off, min_neighbours of 0 switches off isolated pixel removal
+default_qc_rules = {
+    'snr_variable': 'signal_to_noise_ratio_minimum',
+    'snr_threshold': None,
+    'spectral_width_variable': 'spectral_width_of_beam_3',
+    'spectral_width_min': None,
+    'spectral_width_max': None,
+    'min_neighbours': 0,
+    'neighbour_window': 3,
+}
+
+
+
+def qc_variables(qc_rules):
+    """
+    Returns names of variables needed to compute the mask.
+
+    Args:
+        qc_rules (dict): QC rules, see default_qc_rules.
+
+    Returns:
+        list: Names of variables.
+
+    """
+    rules = {**default_qc_rules, **qc_rules}
+    variables = []
+    if rules['snr_threshold'] is not None or rules['min_neighbours'] > 0:
+        variables.append(rules['snr_variable'])
+    if rules['spectral_width_min'] is not None or rules['spectral_width_max'] is not None:
+        variables.append(rules['spectral_width_variable'])
+    return variables
+
+
+
+def neighbour_count(valid, size=3):
+    """
+    Counts valid neighbours of each pixel in a sliding window.
+
+    Args:
+        valid (array): Boolean array, True where pixel is valid.
+        size (int): Optional. Width of the sliding window, odd. Default is 3.
+
+    Returns:
+        array: Number of valid pixels in the window around each pixel, not counting itself.
+
+    """
+    half = size // 2
+    padded = np.pad(valid.astype(np.int16), half)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, (size, size))
+    return windows.sum(axis=(-2, -1)) - valid
+
+
+
+def compute_qc_mask(window, qc_rules):
+    """
+    Computes mask of gates that fail QC.
+
+    Args:
+        window (dict): Window from load_window.
+        qc_rules (dict): QC rules, see default_qc_rules.
+
+    Returns:
+        array: Boolean array with shape (time, altitude), True where gate fails QC.
+
+    """
+    rules = {**default_qc_rules, **qc_rules}
+    data = window['data']
+    mask = np.zeros((len(window['time']), len(window['altitude'])), dtype=bool)
+
+    if rules['snr_threshold'] is not None:
+        snr = data[rules['snr_variable']]
+        mask |= np.ma.filled(snr < rules['snr_threshold'], False)
+
+    if rules['spectral_width_min'] is not None:
+        width = data[rules['spectral_width_variable']]
+        mask |= np.ma.filled(width < rules['spectral_width_min'], False)
+
+    if rules['spectral_width_max'] is not None:
+        width = data[rules['spectral_width_variable']]
+        mask |= np.ma.filled(width > rules['spectral_width_max'], False)
+
+    # remove gates left with too few valid neighbours
+    if rules['min_neighbours'] > 0:
+        valid = ~mask & ~np.ma.getmaskarray(data[rules['snr_variable']])
+        mask |= valid & (neighbour_count(valid, rules['neighbour_window']) < rules['min_neighbours'])
+
+    return mask
+
+
+
+def apply_qc_mask(window, mask):
+    """
+    Masks gates that fail QC in every variable in the window.
+    Data are masked in place, not copied.
+
+    Args:
+        window (dict): Window from load_window.
+        mask (array): Boolean array from compute_qc_mask.
+
+    """
+    for data in window['data'].values():
+        data[mask] = np.ma.masked
@@ -0,0 +1,270 @@
+"""
+Query time series and profiles from a ncas-radar-wind-profiler-1 deployment
+
+Only the day files covering the requested times are opened, and only the
+records and gates asked for are read from them. Results are NumPy arrays,
+or CSV from the command line.
+
+Usage: python query.py series wind_speed --start 2023-07-10T00:00 --end 2023-07-15T00:00 --altitude 1500
+       python query.py profile wind_speed --time 2023-07-12T12:00
+
+"""
+
+
+from netCDF4 import Dataset
+import argparse
+import datetime as dt
+import os
+import sys
+
+import numpy as np
+
+import wind_profiler_plots
+
+
+
+def utc_time(time):
+    """
+    Returns a time in UTC. Times with no time zone are taken to be UTC already.
+
+    Args:
+        time (datetime): Time, with or without a time zone.
+
+    Returns:
+        datetime: Time in UTC, with time zone.
+
+    """
+    if time.tzinfo is None:
+        return time.replace(tzinfo=dt.timezone.utc)
+    return time.astimezone(dt.timezone.utc)
+
+
+
+def day_files(nc_file_path, start, end, mode):
+    """
+    Returns the day files that exist between two times.
+
+    Args:
+        nc_file_path (str): Location of netCDF files.
+        start (datetime): Start time, UTC if it has no time zone.
+        end (datetime): End time, UTC if it has no time zone.
+        mode (str): Operation mode of wind profiler (high or low).
+
+    Returns:
+        list: File paths and names of netCDF files, oldest first.
+
+    """
+    start = utc_time(start)
+    end = utc_time(end)
+    ncfiles = []
+    day = dt.datetime(start.year, start.month, start.day)
+    while day <= end.replace(tzinfo=None):
+        ncfile = wind_profiler_plots.nc_file_name(nc_file_path, day, mode)
+        if os.path.exists(ncfile):
+            ncfiles.append(ncfile)
+        day += dt.timedelta(days=1)
+    return ncfiles
+
+
+
+def file_coordinates(nc, ncfile, cache=None):
+    """
+    Reads time and altitude of one file, reused from cache if the file has not changed since.
+
+    Args:
+        nc (Dataset): Open netCDF file.
+        ncfile (str): File path and name of netCDF file.
+        cache (dict): Optional. Coordinates already read.
+
+    Returns:
+        array: Timestamps, seconds since 1970-01-01 00:00:00 UTC.
+        array: Altitude of each gate.
+
+    """
+    stat = os.stat(ncfile)
+    key = (ncfile, stat.st_mtime, stat.st_size)
+    if cache is not None and key in cache:
+        return cache[key]
+    coordinates = np.asarray(nc['time'][:]).astype(int), np.ma.getdata(nc['altitude'][:]).astype(float)
+    if cache is not None:
+        cache[key] = coordinates
+    return coordinates
+
+
+
+def gate_slice(y_altitude, altitude):
+    """
+    Returns the gates to read for an altitude or altitude range.
+
+    Args:
+        y_altitude (array): Altitude of each gate.
+        altitude (float or tuple): Altitude, for the nearest gate, or (lowest, highest) for all gates
+            between them. None for all gates.
+
+    Returns:
+        slice: Gates to read.
+
+    """
+    if altitude is None:
+        return slice(0, len(y_altitude))
+    if np.isscalar(altitude):
+        gate = int(np.argmin(np.abs(y_altitude - altitude)))
+        return slice(gate, gate + 1)
+    gates = np.flatnonzero((y_altitude >= altitude[0]) & (y_altitude <= altitude[1]))
+    if len(gates) == 0:
+        return slice(0, 0)
+    return slice(gates[0], gates[-1] + 1)
+
+
+
+def time_series(nc_file_path, variable, start, end, altitude=None, mode='low', cache=None):
+    """
+    Reads a variable between two times, at one gate or a range of gates.
+
+    Args:
+        nc_file_path (str): Location of netCDF files.
+        variable (str): Name of variable in netCDF files.
+        start (datetime): Start time, UTC if it has no time zone.
+        end (datetime): End time, inclusive, UTC if it has no time zone.
+        altitude (float or tuple): Optional. Altitude, for the nearest gate, or (lowest, highest)
+            for all gates between them. Default is all gates.
+        mode (str): Optional. Operation mode of wind profiler (high or low). Default is 'low'.
+        cache (dict): Optional. Coordinates already read, shared between queries.
+
+    Returns:
+        dict: 'time' (timestamps), 'altitude', 'data' (masked array with shape (time, altitude)) and 'units'.
+
+    Raises:
+        ValueError: If the gates asked for are at different altitudes in different files.
+
+    """
+    start_time = utc_time(start).timestamp()
+    end_time = utc_time(end).timestamp()
+    times = []
+    data = []
+    result_altitude = None
+    units = ''
+
+    for ncfile in day_files(nc_file_path, start, end, mode):
+        nc = Dataset(ncfile)
+        x_time, y_altitude = file_coordinates(nc, ncfile, cache=cache)
+        first = np.searchsorted(x_time, start_time, side='left')
+        last = np.searchsorted(x_time, end_time, side='right')
+        if last > first:
+            gates = gate_slice(y_altitude, altitude)
+            if result_altitude is None:
+                result_altitude = y_altitude[gates]
+            elif not np.array_equal(y_altitude[gates], result_altitude):
+                nc.close()
+                raise ValueError(f'Gates changed part way through the query at {ncfile}, query the times before and after separately')
+            values = nc[variable][first:last, gates]
+            times.append(x_time[first:last])
+            data.append(np.ma.masked_array(values, dtype=float))
+            units = nc[variable].units
+        nc.close()
+
+    if result_altitude is None:
+        result_altitude = np.array([]) if altitude is None or not np.isscalar(altitude) else np.array([float(altitude)])
+        return {'time': np.array([], dtype=int), 'altitude': result_altitude,
+                'data': np.ma.masked_all((0, len(result_altitude))), 'units': units}
+    return {'time': np.concatenate(times), 'altitude': result_altitude, 'data': np.ma.concatenate(data), 'units': units}
+
+
+
+def profile(nc_file_path, variable, time, altitude=None, mode='low', cache=None):
+    """
+    Reads the profile of a variable nearest a time, from the day file of that time
+    or the day either side of it.
+
+    Args:
+        nc_file_path (str): Location of netCDF files.
+        variable (str): Name of variable in netCDF files.
+        time (datetime): Time of profile, UTC if it has no time zone.
+        altitude (tuple): Optional. (lowest, highest) altitude. Default is all gates.
+        mode (str): Optional. Operation mode of wind profiler (high or low). Default is 'low'.
+        cache (dict): Optional. Coordinates already read, shared between queries.
+
+    Returns:
+        dict: 'time' (timestamp of profile, None if there are no files for the day or the days
+            either side), 'altitude', 'data' and 'units'.
+
+    """
+    time = utc_time(time)
+    timestamp = time.timestamp()
+    # the nearest profile to a time just after midnight may be in the file of the day before
+    nearest = None
+    for ncfile in day_files(nc_file_path, time - dt.timedelta(days=1), time + dt.timedelta(days=1), mode):
+        nc = Dataset(ncfile)
+        x_time, _ = file_coordinates(nc, ncfile, cache=cache)
+        nc.close()
+        if len(x_time) == 0:
+            continue
+        record = int(np.argmin(np.abs(x_time - timestamp)))
+        if nearest is None or abs(x_time[record] - timestamp) < abs(nearest[2] - timestamp):
+            nearest = (ncfile, record, x_time[record])
+    if nearest is None:
+        return {'time': None, 'altitude': np.array([]), 'data': np.ma.masked_all((0,)), 'units': ''}
+
+    ncfile, record, _ = nearest
+    nc = Dataset(ncfile)
+    x_time, y_altitude = file_coordinates(nc, ncfile, cache=cache)
+    gates = gate_slice(y_altitude, altitude)
+    result = {'time': int(x_time[record]), 'altitude': y_altitude[gates],
+              'data': np.ma.masked_array(nc[variable][record, gates], dtype=float), 'units': nc[variable].units}
+    nc.close()
+    return result
+
+
+
+def write_csv(result, variable, f=sys.stdout):
+    """
+    Writes a query result as CSV, one row for each time and gate, missing values left empty.
+
+    Args:
+        result (dict): Result of time_series or profile.
+        variable (str): Name of variable, for the header.
+        f (file): Optional. File to write to. Default is standard output.
+
+    """
+    x_time = np.atleast_1d(result['time']) if result['time'] is not None else np.array([], dtype=int)
+    data = np.ma.atleast_2d(result['data']) if len(x_time) else np.ma.masked_all((0, len(result['altitude'])))
+    missing = np.ma.getmaskarray(data)
+    f.write(f'time,altitude,{variable} ({result["units"]})\n')
+    for i, timestamp in enumerate(x_time):
+        iso_time = dt.datetime.fromtimestamp(int(timestamp), dt.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        for j, altitude in enumerate(result['altitude']):
+            value = '' if missing[i, j] else f'{data[i, j]:g}'
+            f.write(f'{iso_time},{altitude:g},{value}\n')
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Query time series and profiles from a ncas-radar-wind-profiler-1 deployment, as CSV.')
+    parser.add_argument('--nc-file-path', default=wind_profiler_plots.nc_file_path, help='location of netCDF files')
+    parser.add_argument('--mode', choices=['low', 'high'], default=wind_profiler_plots.mode, help='operation mode')
+    parser.add_argument('--output', default=None, help='CSV file to write, default is standard output')
+    subparsers = parser.add_subparsers(dest='query', required=True)
+    series_parser = subparsers.add_parser('series', help='time series at an altitude or over a range of altitudes')
+    series_parser.add_argument('variable', help='name of variable')
+    series_parser.add_argument('--start', required=True, type=dt.datetime.fromisoformat, help='start time, UTC unless an offset is given, e.g. 2023-07-10T00:00')
+    series_parser.add_argument('--end', required=True, type=dt.datetime.fromisoformat, help='end time, UTC unless an offset is given')
+    series_altitude = series_parser.add_mutually_exclusive_group()
+    series_altitude.add_argument('--altitude', type=float, default=None, help='altitude in m, nearest gate is used')
+    series_altitude.add_argument('--altitude-range', type=float, nargs=2, default=None, help='lowest and highest altitude in m')
+    profile_parser = subparsers.add_parser('profile', help='profile nearest a time')
+    profile_parser.add_argument('variable', help='name of variable')
+    profile_parser.add_argument('--time', required=True, type=dt.datetime.fromisoformat, help='time, UTC unless an offset is given, e.g. 2023-07-12T12:00')
+    profile_parser.add_argument('--altitude-range', type=float, nargs=2, default=None, help='lowest and highest altitude in m')
+    args = parser.parse_args()
+
+    if args.query == 'series':
+        altitude = args.altitude if args.altitude is not None else args.altitude_range
+        result = time_series(args.nc_file_path, args.variable, args.start, args.end, altitude=altitude, mode=args.mode)
+    else:
+        result = profile(args.nc_file_path, args.variable, args.time, altitude=args.altitude_range, mode=args.mode)
+
+    if args.output is None:
+        write_csv(result, args.variable)
+    else:
+        with open(args.output, 'w') as f:
+            write_csv(result, args.variable, f)
@@ -0,0 +1,262 @@
+"""
+Rewrite ncas-radar-wind-profiler-1 day files with a layout tuned for the plotting scripts
+
+Variables are written with time-major chunks sized to a plotting window and
+all gates in each chunk, so a window read of one variable touches as few
+chunks as possible. Copies are checked against the originals, and
+--benchmark reports read throughput of the original and rewritten files.
+
+Usage: python rechunk.py /path/to/deployment /path/to/optimised/deployment --window-hours 24 --complevel 1
+
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor
+from netCDF4 import Dataset
+import argparse
+import os
+import time
+
+import numpy as np
+
+import wind_profiler_plots
+
+
+
+def find_nc_files(nc_file_path):
+    """
+    Returns netCDF files under a directory, relative to it.
+
+    Args:
+        nc_file_path (str): Location of netCDF files.
+
+    Returns:
+        list: Paths of netCDF files relative to nc_file_path, sorted.
+
+    """
+    ncfiles = []
+    for root, _, files in os.walk(nc_file_path):
+        for name in files:
+            if name.endswith('.nc'):
+                ncfiles.append(os.path.relpath(os.path.join(root, name), nc_file_path))
+    return sorted(ncfiles)
+
+
+
+def time_chunk_length(nc, window_hours):
+    """
+    Returns number of records in a plotting window.
+
+    Args:
+        nc (Dataset): Open netCDF file.
+        window_hours (float): Length of plotting window in hours.
+
+    Returns:
+        int: Number of records, at least 1 and at most the length of the file.
+
+    """
+    # sampling_interval attribute in file should be something like '15 mintues'
+    sampling_interval = int(nc.sampling_interval.split(' ')[0])
+    records = int(np.ceil(window_hours * 60 / sampling_interval))
+    return max(1, min(records, len(nc.dimensions['time'])))
+
+
+
+def rechunk_file(source, destination, variables=None, window_hours=24, complevel=1):
+    """
+    Rewrites one netCDF file with time-major chunks.
+
+    Args:
+        source (str): File path and name of original netCDF file.
+        destination (str): File path and name of netCDF file to write.
+        variables (list): Optional. Names of variables to copy, None for all variables.
+            Coordinate variables are always copied.
+        window_hours (float): Optional. Length of plotting window in hours. Default is 24.
+        complevel (int): Optional. zlib compression level, 0 for no compression. Default is 1.
+
+    """
+    # opening the destination for writing would empty the source while it is being read
+    if os.path.realpath(destination) == os.path.realpath(source):
+        raise ValueError(f'Cannot rewrite {source} in place, give a different destination')
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    src = Dataset(source)
+    dst = Dataset(destination, 'w', format='NETCDF4')
+    src.set_auto_maskandscale(False)
+    dst.set_auto_maskandscale(False)
+
+    dst.setncatts({name: src.getncattr(name) for name in src.ncattrs()})
+    for name, dimension in src.dimensions.items():
+        dst.createDimension(name, None if dimension.isunlimited() else len(dimension))
+
+    chunk_records = time_chunk_length(src, window_hours)
+    for name, src_var in src.variables.items():
+        if variables is not None and name not in variables and name not in src.dimensions:
+            continue
+        chunksizes = [chunk_records if dim == 'time' else len(src.dimensions[dim]) for dim in src_var.dimensions]
+        fill_value = src_var.getncattr('_FillValue') if '_FillValue' in src_var.ncattrs() else False
+        dst_var = dst.createVariable(name, src_var.dtype, src_var.dimensions, fill_value=fill_value,
+                                     zlib=complevel > 0, complevel=max(complevel, 1), shuffle=complevel > 0,
+                                     chunksizes=chunksizes if chunksizes and all(chunksizes) else None)
+        dst_var.setncatts({attr: src_var.getncattr(attr) for attr in src_var.ncattrs() if attr != '_FillValue'})
+        dst_var[:] = src_var[:]
+
+    dst.close()
+    src.close()
+
+
+
+def verify_file(source, destination, variables=None):
+    """
+    Checks a rewritten file has the same attributes and data as the original.
+
+    Args:
+        source (str): File path and name of original netCDF file.
+        destination (str): File path and name of rewritten netCDF file.
+        variables (list): Optional. Names of variables that were copied, None for all variables.
+
+    Returns:
+        list: Differences found, empty if the copy matches.
+
+    """
+    src = Dataset(source)
+    dst = Dataset(destination)
+    src.set_auto_maskandscale(False)
+    dst.set_auto_maskandscale(False)
+    problems = []
+
+    for name in src.ncattrs():
+        if name not in dst.ncattrs() or str(src.getncattr(name)) != str(dst.getncattr(name)):
+            problems.append(f'global attribute {name} differs')
+
+    for name, src_var in src.variables.items():
+        if variables is not None and name not in variables and name not in src.dimensions:
+            continue
+        if name not in dst.variables:
+            problems.append(f'variable {name} missing')
+            continue
+        dst_var = dst.variables[name]
+        for attr in src_var.ncattrs():
+            if attr not in dst_var.ncattrs() or str(src_var.getncattr(attr)) != str(dst_var.getncattr(attr)):
+                problems.append(f'{name} attribute {attr} differs')
+        # dtype of vlen string variables is str, not a numpy dtype
+        floats = isinstance(src_var.dtype, np.dtype) and src_var.dtype.kind == 'f'
+        if not np.array_equal(src_var[:], dst_var[:], equal_nan=floats):
+            problems.append(f'{name} data differ')
+
+    dst.close()
+    src.close()
+    return problems
+
+
+
+def rechunk_job(job):
+    """
+    Rewrites and verifies one file, for use in a process pool.
+
+    Args:
+        job (tuple): (source, destination, variables, window_hours, complevel).
+
+    Returns:
+        tuple: (destination, list of differences found).
+
+    """
+    source, destination, variables, window_hours, complevel = job
+    rechunk_file(source, destination, variables=variables, window_hours=window_hours, complevel=complevel)
+    return destination, verify_file(source, destination, variables=variables)
+
+
+
+def read_throughput(nc_file_path, ncfiles, variables, window_hours=24):
+    """
+    Times reading variables as the plotting scripts do: the whole day,
+    and the last window_hours of the day.
+
+    Args:
+        nc_file_path (str): Location of netCDF files.
+        ncfiles (list): Paths of netCDF files relative to nc_file_path.
+        variables (list): Names of variables to read.
+        window_hours (float): Optional. Length of window in hours. Default is 24.
+
+    Returns:
+        dict: MB/s for 'day' and 'window' reads.
+
+    """
+    results = {}
+    for read in ['day', 'window']:
+        size = 0
+        start = time.perf_counter()
+        for ncfile in ncfiles:
+            nc = Dataset(f'{nc_file_path}/{ncfile}')
+            records = time_chunk_length(nc, window_hours) if read == 'window' else len(nc.dimensions['time'])
+            size += nc['time'][-records:].nbytes
+            for variable in variables:
+                if variable in nc.variables:
+                    size += nc[variable][-records:].nbytes
+            nc.close()
+        results[read] = size / 1e6 / (time.perf_counter() - start)
+    return results
+
+
+
+def main(nc_file_path, output_path, variables=None, window_hours=24, complevel=1, processes=None, benchmark=False):
+    """
+    Rewrites every day file of a deployment with a layout tuned for the plotting scripts.
+
+    Args:
+        nc_file_path (str): Location of original netCDF files.
+        output_path (str): Location to write netCDF files, with the same directory layout.
+        variables (list): Optional. Names of variables to copy, None for all variables.
+        window_hours (float): Optional. Length of plotting window in hours. Default is 24.
+        complevel (int): Optional. zlib compression level, 0 for no compression. Default is 1.
+        processes (int): Optional. Number of worker processes. Default is the number of CPUs.
+        benchmark (bool): Optional. Print read throughput before and after. Default is False.
+
+    Returns:
+        dict: Differences found for each file that does not match the original.
+
+    """
+    if os.path.realpath(output_path) == os.path.realpath(nc_file_path):
+        raise ValueError(f'Output path {output_path} is the same as {nc_file_path}, originals would be overwritten')
+    ncfiles = find_nc_files(nc_file_path)
+    jobs = [(f'{nc_file_path}/{ncfile}', f'{output_path}/{ncfile}', variables, window_hours, complevel) for ncfile in ncfiles]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        problems = {destination: found for destination, found in executor.map(rechunk_job, jobs) if found}
+
+    for destination, found in problems.items():
+        print(f'{destination}: {", ".join(found)}')
+    print(f'Rewrote {len(ncfiles)} files, {len(ncfiles) - len(problems)} verified')
+
+    if benchmark:
+        read_variables = variables if variables is not None else wind_profiler_plots.product_variables()
+        before = read_throughput(nc_file_path, ncfiles, read_variables, window_hours)
+        after = read_throughput(output_path, ncfiles, read_variables, window_hours)
+        original_size = sum(os.path.getsize(f'{nc_file_path}/{ncfile}') for ncfile in ncfiles)
+        new_size = sum(os.path.getsize(f'{output_path}/{ncfile}') for ncfile in ncfiles)
+        print(f'{"":<10} {"size":>10} {"day read":>12} {"window read":>12}')
+        print(f'{"original":<10} {original_size / 1e6:>8.1f}MB {before["day"]:>8.1f}MB/s {before["window"]:>8.1f}MB/s')
+        print(f'{"rewritten":<10} {new_size / 1e6:>8.1f}MB {after["day"]:>8.1f}MB/s {after["window"]:>8.1f}MB/s')
+        print('Files were just written, so both reads may come from the page cache; repeat on a cold cache for shared filesystem numbers.')
+
+    return problems
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rewrite ncas-radar-wind-profiler-1 day files with a layout tuned for the plotting scripts.')
+    parser.add_argument('nc_file_path', help='location of original netCDF files')
+    parser.add_argument('output_path', help='location to write netCDF files')
+    parser.add_argument('--window-hours', type=float, default=24, help='length of plotting window in hours, sets time chunk size')
+    parser.add_argument('--complevel', type=int, default=1, help='zlib compression level, 0 for none')
+    copied = parser.add_mutually_exclusive_group()
+    copied.add_argument('--variables', nargs='+', default=None, help='only copy these variables')
+    copied.add_argument('--plotted-only', action='store_true', help='only copy variables the plotting scripts use')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--benchmark', action='store_true', help='print read throughput before and after')
+    args = parser.parse_args()
+
+    variables = args.variables
+    if args.plotted_only:
+        variables = wind_profiler_plots.product_variables()
+    main(args.nc_file_path, args.output_path, variables=variables, window_hours=args.window_hours,
+         complevel=args.complevel, processes=args.processes, benchmark=args.benchmark)
@@ -0,0 +1,172 @@
+"""
+Resample ncas-radar-wind-profiler-1 records onto a regular time grid
+
+Records of any sampling interval are put on a grid of a chosen interval, so
+windows spanning files of different sampling intervals are not lost. Each
+record and each grid time is the centre of a cell one sampling interval
+wide. A coarser grid averages all valid values in each of its cells, with
+directions averaged as u and v weighted by wind speed, see aggregation.py,
+so 350 and 10 degrees average to 0, not 180. A finer grid either repeats
+each record over the grid times in its cell ('hold') or only uses grid
+times matching a record ('exact'). Either way grid times not covered by any
+record stay masked, so gaps stay gaps. Cells are found with integer
+arithmetic on sample numbers, with no loops over records.
+
+"""
+
+
+import numpy as np
+
+from aggregation import sample_numbers, cell_index, bin_totals, valid_values, empty_wind_partial, accumulate_wind, finalise_wind
+
+
+#################################
+# Options to potentially change #
+#################################
+
+# how records with a longer sampling interval than the grid are put on it:
+#   'hold' - each record fills the grid times within its own sampling interval
+#   'exact' - only grid times matching a record time are filled, others are left as gaps
+upsample = 'hold'
+
+# fewest valid values averaged into a grid time, fewer are masked
+min_count = 1
+
+# variables in degrees, averaged as u and v weighted by wind_speed, or as unit vectors if wind_speed is not read
+circular_variables = ['wind_from_direction']
+
+#################################
+
+
+
+def block_average(index, data, n_grid, min_count=min_count):
+    """
+    Averages rows of data that fall in the same grid time.
+
+    Args:
+        index (array): Grid time of each row, 0 to n_grid - 1.
+        data (array): Data with shape (time, altitude).
+        n_grid (int): Number of grid times.
+        min_count (int): Optional. Fewest valid values for a grid time not to be masked.
+
+    Returns:
+        masked array: Averages with shape (n_grid, altitude).
+
+    """
+    values, valid = valid_values(data)
+    counts = bin_totals(index, valid.astype(float), n_grid)
+    mean = bin_totals(index, values, n_grid) / np.maximum(counts, 1)
+    return np.ma.masked_array(mean, mask=counts < max(min_count, 1))
+
+
+
+def direction_average(index, wind_speed, wind_from_direction, n_grid, min_count=min_count):
+    """
+    Averages wind directions of rows that fall in the same grid time.
+
+    Args:
+        index (array): Grid time of each row, 0 to n_grid - 1.
+        wind_speed (array): Wind speed with shape (time, altitude), None to average directions as unit vectors.
+        wind_from_direction (array): Direction in degrees with shape (time, altitude).
+        n_grid (int): Number of grid times.
+        min_count (int): Optional. Fewest valid values for a grid time not to be masked.
+
+    Returns:
+        masked array: Directions with shape (n_grid, altitude).
+
+    """
+    partial = empty_wind_partial((n_grid, wind_from_direction.shape[1]))
+    accumulate_wind(partial, index, wind_speed, wind_from_direction)
+    return np.ma.masked_invalid(finalise_wind(partial, min_count=min_count)['wind_from_direction'])
+
+
+
+def join_records(records, variables, grid_interval):
+    """
+    Joins consecutive records with the same sampling interval, if shorter than the grid interval,
+    so grid times whose cells span two files average records from both. Records at times already
+    in an earlier file are dropped.
+
+    Args:
+        records (list): Data from wind_profiler_plots.read_day_file for each file, oldest first.
+        variables (list): Names of variables in records.
+        grid_interval (int): Number of minutes between grid times.
+
+    Returns:
+        list: Records, joined where possible. Records passed in are not changed.
+
+    """
+    joined = []
+    for record in records:
+        previous = joined[-1] if joined else None
+        if (previous is None or record['sampling_interval'] != previous['sampling_interval']
+                or record['sampling_interval'] >= grid_interval or len(record['altitude']) != len(previous['altitude'])):
+            joined.append(record)
+            continue
+        new = ~np.isin(record['time'], previous['time'])
+        joined[-1] = {
+            **previous,
+            'time': np.concatenate([previous['time'], record['time'][new]]),
+            'data': {variable: np.ma.concatenate([previous['data'][variable], record['data'][variable][new]]) for variable in variables},
+        }
+    return joined
+
+
+
+def resample_record(record, variables, grid_time, grid_interval, upsample=upsample, min_count=min_count,
+                    circular_variables=circular_variables):
+    """
+    Puts one file's data on a regular time grid.
+
+    Args:
+        record (dict): Data from wind_profiler_plots.read_day_file.
+        variables (list): Names of variables in record.
+        grid_time (array): Grid timestamps, grid_interval minutes apart.
+        grid_interval (int): Number of minutes between grid times.
+        upsample (str): Optional. 'hold' or 'exact', see upsample option.
+        min_count (int): Optional. Fewest valid values averaged into a grid time.
+        circular_variables (list): Optional. Variables averaged as directions.
+
+    Returns:
+        dict: Masked array with shape (grid time, altitude) for each variable.
+        array: True for grid times covered by a record, whether or not its values are valid.
+
+    """
+    sampling_interval = record['sampling_interval']
+    grid_samples = sample_numbers(grid_time, grid_interval)
+    n_grid = len(grid_time)
+    n_alt = len(record['altitude'])
+    samples = sample_numbers(record['time'], sampling_interval)
+    data = {}
+
+    if sampling_interval > grid_interval:
+        # each grid time takes the record whose cell contains it, if there is one
+        wanted = cell_index(grid_samples, grid_interval, sampling_interval)
+        order = np.argsort(samples, kind='stable')
+        position = np.clip(np.searchsorted(samples[order], wanted), 0, max(len(samples) - 1, 0))
+        covered = (samples[order][position] == wanted) if len(samples) else np.zeros(n_grid, dtype=bool)
+        if upsample == 'exact':
+            covered &= grid_samples * grid_interval == wanted * sampling_interval
+        rows = order[position[covered]]
+        for variable in variables:
+            data[variable] = np.ma.masked_all((n_grid, n_alt))
+            data[variable][covered] = record['data'][variable][rows]
+        return data, covered
+
+    index = cell_index(samples, sampling_interval, grid_interval) - grid_samples[0]
+    inside = (index >= 0) & (index < n_grid)
+    index = index[inside]
+    covered = np.zeros(n_grid, dtype=bool)
+    covered[index] = True
+
+    for variable in variables:
+        if sampling_interval == grid_interval:
+            # one record for each grid time, values are copied rather than averaged
+            data[variable] = np.ma.masked_all((n_grid, n_alt))
+            data[variable][index] = record['data'][variable][inside]
+        elif variable in circular_variables:
+            wind_speed = record['data']['wind_speed'][inside] if 'wind_speed' in record['data'] else None
+            data[variable] = direction_average(index, wind_speed, record['data'][variable][inside], n_grid, min_count=min_count)
+        else:
+            data[variable] = block_average(index, record['data'][variable][inside], n_grid, min_count=min_count)
+    return data, covered
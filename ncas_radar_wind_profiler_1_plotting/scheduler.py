@@ -0,0 +1,174 @@
+"""
+Make ncas-radar-wind-profiler-1 plots with the quicklook PNGs first
+
+Outputs are split into two tiers. The quicklook tier, the PNGs shown on the
+public quicklook page (last 24 hours and wind_profiler_plots_day images),
+is made first. The archive tier, PDFs, longer windows, multipanel plots and
+wind_windows plots, is made afterwards, and anything not started by
+archive_deadline is dropped so a slow run does not hold up the next one.
+PDFs of quicklook plots are saved from the figures already drawn.
+
+Usage: python scheduler.py
+
+"""
+
+
+import datetime as dt
+import os
+import time
+
+import freshness
+import wind_profiler_plots
+import wind_profiler_plots_day
+from qc import compute_qc_mask, apply_qc_mask
+
+
+#################################
+# Options to potentially change #
+#################################
+
+# windows, in days, and products drawn in the quicklook tier, as PNGs
+quicklook_windows = [1]
+quicklook_products = ['wind-speed-direction', 'upward_air_velocity', 'signal_to_noise_ratio_minimum', 'spectral_width_of_beam_3']
+
+# sampling intervals of wind_profiler_plots_day images, made in the quicklook tier, [] for none
+day_intervals = ['5', '15']
+
+# seconds from the start of a run after which archive outputs not yet started are dropped, None to always make them
+archive_deadline = None
+
+#################################
+
+
+
+def load_window_qc(nc_file_path, mode, days, variables, qc_rules, cache):
+    """
+    Loads a window ending now and applies QC.
+
+    Args:
+        nc_file_path (str): Location of netCDF files.
+        mode (str): Operation mode of wind profiler (high or low).
+        days (int): Length of window in days.
+        variables (list): Names of variables to load.
+        qc_rules (dict): QC rules, None for no QC.
+        cache (dict): Data read from files, shared between windows.
+
+    Returns:
+        dict: Window from wind_profiler_plots.load_window.
+        float: Modification time of the newest file in the window, None if there are none.
+
+    """
+    ncfiles = wind_profiler_plots.window_nc_files(nc_file_path, dt.datetime.now(), mode, days)
+    window = wind_profiler_plots.load_window(ncfiles, variables, days=days, cache=cache)
+    if qc_rules is not None:
+        apply_qc_mask(window, compute_qc_mask(window, qc_rules))
+    mtimes = [os.path.getmtime(ncfile) for ncfile in ncfiles if os.path.exists(ncfile)]
+    return window, max(mtimes) if mtimes else None
+
+
+
+def main(nc_file_path=wind_profiler_plots.nc_file_path, plots_path=wind_profiler_plots.plots_path, mode=wind_profiler_plots.mode,
+         qc_rules=wind_profiler_plots.qc_rules, windows=wind_profiler_plots.windows, products=wind_profiler_plots.products,
+         colours=wind_profiler_plots.colours, multipanel_variables=wind_profiler_plots.multipanel_variables,
+         render=wind_profiler_plots.render, quicklook_windows=quicklook_windows, quicklook_products=quicklook_products,
+         day_nc_file_path=wind_profiler_plots_day.nc_file_path, day_plots_path=wind_profiler_plots_day.plots_path,
+         day_intervals=day_intervals, archive_deadline=archive_deadline, freshness_path=wind_profiler_plots.freshness_path,
+         wind_windows=wind_profiler_plots.wind_windows):
+    """
+    Make quicklook PNGs, then archive outputs until the deadline.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        plots_path (str): Location to save plots.
+        mode (str): Operation mode of wind profiler (high or low).
+        qc_rules (dict): Optional. QC rules to mask gates with, None for no QC.
+        windows (list): Optional. Windows to plot, in days.
+        products (list): Optional. Products to plot for each window.
+        colours (dict): Optional. Colour map and colour bar settings for each variable.
+        multipanel_variables (list): Optional. Names of variables in multipanel plot.
+        render (str): Optional. 'auto' or 'mesh', see wind_profiler_plots.time_height_mesh.
+        quicklook_windows (list): Optional. Windows, in days, with PNGs in the quicklook tier.
+        quicklook_products (list): Optional. Products with PNGs in the quicklook tier.
+        day_nc_file_path (str): Optional. Location of netCDF files for wind_profiler_plots_day.
+        day_plots_path (str): Optional. Location to save wind_profiler_plots_day images.
+        day_intervals (list): Optional. Sampling intervals of wind_profiler_plots_day images.
+        archive_deadline (float): Optional. Seconds from the start of the run after which
+            archive outputs not yet started are dropped, None to always make them.
+        freshness_path (str): Optional. Location to keep freshness of quicklook PNGs, None to not record, see freshness.py.
+        wind_windows (dict): Optional. Minutes averaged over for each longer window, in days, of wind speed
+            and direction, made in the archive tier, see wind_profiler_plots.wind_window.
+
+    Returns:
+        dict: 'quicklook' (seconds until the last quicklook PNG was saved), 'data_to_png'
+            (seconds from the newest data file changing to the last quicklook PNG, None if
+            there are no files), 'total' (seconds for the whole run) and 'dropped' (archive
+            outputs not made).
+
+    """
+    start = time.perf_counter()
+    variables = wind_profiler_plots.product_variables(products, multipanel_variables, qc_rules)
+    cache = {}
+    newest_data = None
+    windows_loaded = {}
+
+    def window(days):
+        nonlocal newest_data
+        if days not in windows_loaded:
+            windows_loaded[days], mtime = load_window_qc(nc_file_path, mode, days, variables, qc_rules, cache)
+            if mtime is not None and days in quicklook_windows:
+                newest_data = mtime if newest_data is None else max(newest_data, mtime)
+        return windows_loaded[days]
+
+    # quicklook tier: PNGs in order, keeping figures to save as PDFs later
+    archive = []
+    freshness_records = []
+    for days in windows:
+        if days not in quicklook_windows:
+            continue
+        for product in products:
+            if product not in quicklook_products:
+                continue
+            fig = wind_profiler_plots.plot_product(window(days), product, plots_path, colours=colours,
+                                                   multipanel_variables=multipanel_variables, render=render, formats=('png',))
+            freshness_records.append(freshness.product_freshness(window(days), product, wind_profiler_plots.product_variables([product], multipanel_variables), time.time()))
+            pdf = wind_profiler_plots.plot_file_name(plots_path, mode, product, days * 24, 'pdf')
+            archive.append((f'{product} last-{days * 24}-hours pdf', lambda fig=fig, pdf=pdf: fig.savefig(pdf)))
+    for interval in day_intervals:
+        wind_profiler_plots_day.main(day_nc_file_path, day_plots_path, interval)
+    quicklook = time.perf_counter() - start
+    data_to_png = time.time() - newest_data if newest_data is not None else None
+    if freshness_path is not None:
+        freshness.record_run(freshness_path, freshness_records)
+
+    # archive tier: everything else, dropped once past the deadline
+    for days in windows:
+        for product in products:
+            if days in quicklook_windows and product in quicklook_products:
+                continue
+            archive.append((f'{product} last-{days * 24}-hours png and pdf', lambda days=days, product=product: wind_profiler_plots.plot_product(
+                window(days), product, plots_path, colours=colours, multipanel_variables=multipanel_variables, render=render)))
+    for days, averaging_interval in wind_windows.items():
+        archive.append((f'wind-speed-direction last-{days * 24}-hours {averaging_interval} minute averages',
+                        lambda days=days, averaging_interval=averaging_interval: wind_profiler_plots.wind_speed_direction_plot(
+                            wind_profiler_plots.wind_window(wind_profiler_plots.window_nc_files(nc_file_path, dt.datetime.now(), mode, days),
+                                                            days, averaging_interval, mode=mode, qc_rules=qc_rules),
+                            plots_path, render=render)))
+
+    dropped = []
+    for name, task in archive:
+        if archive_deadline is not None and time.perf_counter() - start > archive_deadline:
+            dropped.append(name)
+            continue
+        task()
+
+    return {'quicklook': quicklook, 'data_to_png': data_to_png, 'total': time.perf_counter() - start, 'dropped': dropped}
+
+
+
+if __name__ == "__main__":
+    for run_mode in ["low", "high"]:
+        report = main(mode=run_mode, day_intervals=day_intervals if run_mode == 'low' else [])
+        data_to_png = f'{report["data_to_png"]:.1f} s' if report['data_to_png'] is not None else 'no data'
+        print(f'{run_mode}-mode: quicklook PNGs {report["quicklook"]:.2f} s, data to PNG {data_to_png}, total {report["total"]:.2f} s')
+        if report['dropped']:
+            print(f'  dropped past archive deadline: {", ".join(report["dropped"])}')
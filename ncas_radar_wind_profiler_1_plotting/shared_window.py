@@ -0,0 +1,304 @@
+"""
+Make ncas-radar-wind-profiler-1 plots in worker processes that share one copy of the data
+
+Each loaded window (time, altitude, and the data and mask of each variable)
+is copied once into a shared memory segment. Workers are only sent a small
+descriptor, and map the arrays read-only from the segment, so memory use
+does not grow with the number of workers. The segment is removed when
+plotting finishes or fails, including when a worker crashes; segments left
+by a run that was killed are removed by the next run.
+
+Usage: python shared_window.py
+
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import datetime as dt
+import itertools
+import os
+import time
+
+import numpy as np
+
+import wind_profiler_plots
+from qc import compute_qc_mask, apply_qc_mask
+
+
+#################################
+# Options to potentially change #
+#################################
+
+# number of worker processes, None for the number of CPUs
+processes = None
+
+#################################
+
+
+# segment names start with this, then the pid of the process that made them
+segment_prefix = 'nrwp1'
+segment_counter = itertools.count()
+
+
+
+def aligned(offset):
+    """
+    Returns offset rounded up to a multiple of 64 bytes.
+    """
+    return (offset + 63) // 64 * 64
+
+
+
+def share_window(window):
+    """
+    Copies the arrays of a window into one shared memory segment.
+
+    Args:
+        window (dict): Window from wind_profiler_plots.load_window.
+
+    Returns:
+        dict: Descriptor to pass to attach_window: segment name, offset, shape and dtype
+            of each array, and the rest of the window.
+        SharedMemory: Segment, to close and unlink when finished with.
+
+    """
+    arrays = {'time': np.asarray(window['time']), 'altitude': np.ma.getdata(window['altitude'])}
+    for variable, data in window['data'].items():
+        arrays[f'data/{variable}'] = np.ma.getdata(data)
+        arrays[f'mask/{variable}'] = np.ma.getmaskarray(data)
+
+    layout = {}
+    size = 0
+    for name, array in arrays.items():
+        layout[name] = (size, array.shape, array.dtype.str)
+        size = aligned(size + array.nbytes)
+
+    segment = shared_memory.SharedMemory(name=f'{segment_prefix}_{os.getpid()}_{next(segment_counter)}', create=True, size=max(size, 1))
+    for name, array in arrays.items():
+        offset, shape, dtype = layout[name]
+        np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=offset)[...] = array
+
+    descriptor = {
+        'segment': segment.name,
+        'arrays': layout,
+        'variables': list(window['data']),
+        **{key: window[key] for key in ['exists', 'mode', 'days', 'units']},
+    }
+    return descriptor, segment
+
+
+
+def open_segment(name):
+    """
+    Opens an existing shared memory segment without taking ownership of it.
+
+    Args:
+        name (str): Segment name.
+
+    Returns:
+        SharedMemory: Segment.
+
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before python 3.13 the segment is also registered with the resource tracker, which
+        # workers share with the process that made it, so it is still only removed once
+        return shared_memory.SharedMemory(name=name)
+
+
+
+def attach_window(descriptor):
+    """
+    Maps a shared window read-only.
+
+    Args:
+        descriptor (dict): Descriptor from share_window.
+
+    Returns:
+        dict: Window with arrays backed by the shared segment.
+        SharedMemory: Segment, to close when the window is no longer needed.
+
+    """
+    segment = open_segment(descriptor['segment'])
+
+    def array(name):
+        offset, shape, dtype = descriptor['arrays'][name]
+        view = np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=offset)
+        view.flags.writeable = False
+        return view
+
+    window = {key: descriptor[key] for key in ['exists', 'mode', 'days', 'units']}
+    window['time'] = array('time')
+    window['altitude'] = array('altitude')
+    window['data'] = {variable: np.ma.masked_array(array(f'data/{variable}'), mask=array(f'mask/{variable}'), copy=False)
+                      for variable in descriptor['variables']}
+    return window, segment
+
+
+
+def release_segment(segment):
+    """
+    Closes and removes a shared memory segment made by share_window.
+
+    Args:
+        segment (SharedMemory): Segment.
+
+    """
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+
+def remove_stale_segments(shm_path='/dev/shm'):
+    """
+    Removes segments left by runs that were killed before they could clean up.
+    Only works where segments are files in shm_path, as on Linux.
+
+    Args:
+        shm_path (str): Optional. Location of shared memory segments. Default '/dev/shm'.
+
+    Returns:
+        list: Names of segments removed.
+
+    """
+    removed = []
+    if not os.path.isdir(shm_path):
+        return removed
+    for name in os.listdir(shm_path):
+        parts = name.split('_')
+        if len(parts) != 3 or parts[0] != segment_prefix or not parts[1].isdigit():
+            continue
+        try:
+            os.kill(int(parts[1]), 0)
+        except ProcessLookupError:
+            try:
+                os.remove(f'{shm_path}/{name}')
+                removed.append(name)
+            except FileNotFoundError:
+                pass
+        except PermissionError:
+            # process exists but belongs to another user
+            pass
+    return removed
+
+
+
+def plot_product_job(job):
+    """
+    Plots one product from a shared window, for use in a process pool.
+
+    Args:
+        job (tuple): (descriptor, product, save_loc, plot options for wind_profiler_plots.plot_product).
+
+    Returns:
+        str: Product plotted.
+
+    """
+    descriptor, product, save_loc, options = job
+    window, segment = attach_window(descriptor)
+    try:
+        wind_profiler_plots.plot_product(window, product, save_loc, **options)
+    finally:
+        # arrays must be gone before the segment can be closed
+        del window
+        segment.close()
+    return product
+
+
+
+def plot_window_shared(window, save_loc, products=wind_profiler_plots.products, processes=processes, **options):
+    """
+    Plots all products of a window in worker processes sharing one copy of its arrays.
+
+    Args:
+        window (dict): Window from wind_profiler_plots.load_window.
+        save_loc (str): File path to save plots to.
+        products (list): Optional. Products to plot.
+        processes (int): Optional. Number of worker processes. Default is the number of CPUs.
+        **options: Optional. colours, multipanel_variables and render, see wind_profiler_plots.plot_product.
+
+    """
+    descriptor, segment = share_window(window)
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(plot_product_job, [(descriptor, product, save_loc, options) for product in products]))
+    finally:
+        # also runs if a worker crashed and the pool is broken
+        release_segment(segment)
+
+
+
+def main(nc_file_path=wind_profiler_plots.nc_file_path, plots_path=wind_profiler_plots.plots_path, mode=wind_profiler_plots.mode,
+         qc_rules=wind_profiler_plots.qc_rules, windows=wind_profiler_plots.windows, products=wind_profiler_plots.products,
+         colours=wind_profiler_plots.colours, multipanel_variables=wind_profiler_plots.multipanel_variables,
+         render=wind_profiler_plots.render, processes=processes, wind_windows=wind_profiler_plots.wind_windows):
+    """
+    Make plots for last 24/48 hours of wind profiler data, with products drawn in worker processes.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        plots_path (str): Location to save plots.
+        mode (str): Operation mode of wind profiler (high or low).
+        qc_rules (dict): Optional. QC rules to mask gates with, None for no QC.
+        windows (list): Optional. Windows to plot, in days.
+        products (list): Optional. Products to plot for each window.
+        colours (dict): Optional. Colour map and colour bar settings for each variable.
+        multipanel_variables (list): Optional. Names of variables in multipanel plot.
+        render (str): Optional. 'auto' or 'mesh', see wind_profiler_plots.time_height_mesh.
+        processes (int): Optional. Number of worker processes. Default is the number of CPUs.
+        wind_windows (dict): Optional. Minutes averaged over for each longer window, in days, of wind speed
+            and direction, see wind_profiler_plots.wind_window.
+
+    Returns:
+        dict: Time in seconds spent loading data, applying QC and making plots.
+
+    """
+    removed = remove_stale_segments()
+    if removed:
+        print(f'Removed shared memory left by earlier runs: {", ".join(removed)}')
+
+    today_date = dt.datetime.now()
+    variables = wind_profiler_plots.product_variables(products, multipanel_variables, qc_rules)
+    timings = {'load': 0.0, 'qc': 0.0, 'render': 0.0}
+    cache = {}
+
+    for days in windows:
+        start = time.perf_counter()
+        ncfiles = wind_profiler_plots.window_nc_files(nc_file_path, today_date, mode, days)
+        window = wind_profiler_plots.load_window(ncfiles, variables, days=days, cache=cache)
+        timings['load'] += time.perf_counter() - start
+
+        if qc_rules is not None:
+            start = time.perf_counter()
+            apply_qc_mask(window, compute_qc_mask(window, qc_rules))
+            timings['qc'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        plot_window_shared(window, plots_path, products=products, processes=processes, colours=colours,
+                           multipanel_variables=multipanel_variables, render=render)
+        timings['render'] += time.perf_counter() - start
+
+    for days, averaging_interval in wind_windows.items():
+        # QC is applied as the files are streamed, so its time is part of load
+        start = time.perf_counter()
+        ncfiles = wind_profiler_plots.window_nc_files(nc_file_path, today_date, mode, days)
+        window = wind_profiler_plots.wind_window(ncfiles, days, averaging_interval, mode=mode, qc_rules=qc_rules)
+        timings['load'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        plot_window_shared(window, plots_path, products=['wind-speed-direction'], processes=processes, render=render)
+        timings['render'] += time.perf_counter() - start
+
+    return timings
+
+
+
+if __name__ == "__main__":
+    for run_mode in ["low", "high"]:
+        timings = main(mode=run_mode)
+        print(f'{run_mode}-mode: ' + ', '.join(f'{stage} {seconds:.2f} s' for stage, seconds in timings.items()))
@@ -0,0 +1,278 @@
+"""
+Create a synthetic deployment of ncas-radar-wind-profiler-1 snr-winds netCDF files
+
+Files have the variables, attributes and directory/file name layout the
+plotting scripts expect, so benchmarks and scaling tests can be run without
+real data. Sampling interval, number of gates, gaps, modes and length of the
+deployment can all be set.
+
+Usage: python synthetic_deployment.py /path/to/output --days 365 --interval 1 --gates 200
+
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor
+from netCDF4 import Dataset
+import argparse
+import datetime as dt
+import os
+import time
+
+import numpy as np
+
+import wind_profiler_plots
+import wind_profiler_plots_day
+
+
+#################################
+# Options to potentially change #
+#################################
+
+# gate altitudes in each mode, (lowest, highest) in m
+mode_altitudes = {'low': (100, 4000), 'high': (400, 8000)}
+
+# gaps in data:
+#   gap_fraction - fraction of profiles missing at random
+#   outage_probability - chance of an outage starting in any hour, outages last 1 to 6 hours
+#   missing_day_probability - chance of a whole day file not existing
+gaps = {'gap_fraction': 0.0, 'outage_probability': 0.0, 'missing_day_probability': 0.0}
+
+fill_value = -1.0e20
+
+#################################
+
+
+variable_attributes = {
+    'wind_speed': {'units': 'm s-1', 'long_name': 'Wind Speed'},
+    'wind_from_direction': {'units': 'degree', 'long_name': 'Wind From Direction'},
+    'upward_air_velocity': {'units': 'm s-1', 'long_name': 'Upward Air Velocity'},
+    'signal_to_noise_ratio_minimum': {'units': 'dB', 'long_name': 'Signal to Noise Ratio: minimum value from all beams'},
+    'spectral_width_of_beam_1': {'units': 'm s-1', 'long_name': 'Spectral Width of Beam 1'},
+    'spectral_width_of_beam_2': {'units': 'm s-1', 'long_name': 'Spectral Width of Beam 2'},
+    'spectral_width_of_beam_3': {'units': 'm s-1', 'long_name': 'Spectral Width of Beam 3'},
+}
+
+
+
+def profile_times(date, sampling_interval, gaps, rng):
+    """
+    Returns times of profiles for one day, with gaps.
+
+    Args:
+        date (datetime): Day of data.
+        sampling_interval (int): Number of minutes between profiles.
+        gaps (dict): Gap settings, see gaps option.
+        rng (Generator): Random number generator.
+
+    Returns:
+        array: Timestamps, seconds since 1970-01-01 00:00:00 UTC.
+
+    """
+    start = int(dt.datetime(date.year, date.month, date.day, tzinfo=dt.timezone.utc).timestamp())
+    times = np.arange(start, start + 86400, sampling_interval * 60)
+    keep = rng.random(len(times)) >= gaps.get('gap_fraction', 0.0)
+
+    # outages of 1 to 6 hours
+    hour = (times - start) // 3600
+    for outage_start in np.flatnonzero(rng.random(24) < gaps.get('outage_probability', 0.0)):
+        keep &= ~((hour >= outage_start) & (hour < outage_start + rng.integers(1, 7)))
+
+    return times[keep]
+
+
+
+def synthetic_profiles(times, altitude, rng):
+    """
+    Creates realistic looking wind profiler data: winds increasing and veering with height,
+    daytime convection in vertical velocity and SNR falling off with height.
+
+    Args:
+        times (array): Timestamps, seconds since 1970-01-01 00:00:00 UTC.
+        altitude (array): Altitude of each gate.
+        rng (Generator): Random number generator.
+
+    Returns:
+        dict: Masked array with shape (time, altitude) for each variable.
+
+    """
+    t = times[:, None].astype(float)
+    z = (altitude / altitude.max())[None, :]
+    shape = (len(times), len(altitude))
+    hour = (t % 86400) / 3600
+    daytime = np.clip(np.sin(np.pi * (hour - 6) / 12), 0, None)
+
+    wind_speed = np.clip(5 + 12 * z + 4 * np.sin(2 * np.pi * t / (3 * 86400)) + rng.normal(0, 1.5, shape), 0, None)
+    wind_from_direction = (230 + 50 * z + 40 * np.sin(2 * np.pi * t / (2 * 86400)) + rng.normal(0, 15, shape)) % 360
+    upward_air_velocity = daytime * np.exp(-z * 3) * rng.normal(0, 1, shape) + rng.normal(0, 0.1, shape)
+    snr = 40 - 55 * z + 5 * daytime + rng.normal(0, 3, shape)
+    spectral_width = 0.3 + 0.6 * np.exp(-z * 3) * (0.5 + daytime) + np.abs(rng.normal(0, 0.1, shape))
+
+    # no data where signal is too weak
+    missing = snr < -15
+    data = {
+        'wind_speed': wind_speed,
+        'wind_from_direction': wind_from_direction,
+        'upward_air_velocity': upward_air_velocity,
+        'signal_to_noise_ratio_minimum': snr,
+        'spectral_width_of_beam_1': spectral_width * rng.uniform(0.9, 1.1, shape),
+        'spectral_width_of_beam_2': spectral_width * rng.uniform(0.9, 1.1, shape),
+        'spectral_width_of_beam_3': spectral_width,
+    }
+    return {variable: np.ma.masked_array(values, mask=missing) for variable, values in data.items()}
+
+
+
+def write_day_file(ncfile, date, mode, sampling_interval, altitude, gaps=gaps, seed=0, compress=False):
+    """
+    Writes one day file of synthetic data.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        date (datetime): Day of data.
+        mode (str): Operation mode of wind profiler (high or low).
+        sampling_interval (int): Number of minutes between profiles.
+        altitude (array): Altitude of each gate.
+        gaps (dict): Optional. Gap settings, see gaps option.
+        seed (int): Optional. Random number generator seed.
+        compress (bool): Optional. Compress variables with zlib. Default is False, which is faster to write.
+
+    Returns:
+        int: Size of file in bytes, 0 if the day is missing.
+
+    """
+    rng = np.random.default_rng([seed, date.toordinal(), len(mode), sampling_interval])
+    if rng.random() < gaps.get('missing_day_probability', 0.0):
+        return 0
+
+    times = profile_times(date, sampling_interval, gaps, rng)
+    data = synthetic_profiles(times, altitude, rng)
+
+    os.makedirs(os.path.dirname(ncfile), exist_ok=True)
+    nc = Dataset(ncfile, 'w')
+    nc.title = 'Synthetic wind profiles for testing'
+    nc.source = 'ncas-radar-wind-profiler-1 synthetic_deployment.py'
+    nc.sampling_interval = f'{sampling_interval} minutes'
+    nc.mode = mode
+
+    nc.createDimension('time', len(times))
+    nc.createDimension('altitude', len(altitude))
+
+    time_var = nc.createVariable('time', 'f8', ('time',))
+    time_var.units = 'seconds since 1970-01-01 00:00:00 +00:00'
+    time_var.long_name = 'Time (seconds since 1970-01-01 00:00:00)'
+    time_var[:] = times
+
+    altitude_var = nc.createVariable('altitude', 'f4', ('altitude',))
+    altitude_var.units = 'm'
+    altitude_var.long_name = 'Geometric height above geoid (WGS84)'
+    altitude_var[:] = altitude
+
+    for variable, attributes in variable_attributes.items():
+        var = nc.createVariable(variable, 'f4', ('time', 'altitude'), fill_value=fill_value, zlib=compress)
+        var.units = attributes['units']
+        var.long_name = attributes['long_name']
+        var[:] = data[variable]
+
+    nc.close()
+    return os.path.getsize(ncfile)
+
+
+
+def write_day_file_job(job):
+    """
+    Writes one day file from a job tuple, for use in a process pool.
+
+    Args:
+        job (tuple): Arguments for write_day_file.
+
+    Returns:
+        int: Size of file in bytes.
+
+    """
+    return write_day_file(*job)
+
+
+
+def main(nc_file_path, start_date, days=7, modes=['low', 'high'], sampling_interval=15, gates=None,
+         gaps=gaps, layout='plots', processes=None, seed=0, compress=False):
+    """
+    Writes a synthetic deployment.
+
+    Args:
+        nc_file_path (str): Location to write netCDF files.
+        start_date (datetime): First day of deployment.
+        days (int): Optional. Number of days. Default is 7.
+        modes (list): Optional. Operation modes of wind profiler. Default ['low', 'high'].
+        sampling_interval (int): Optional. Number of minutes between profiles. Default is 15.
+        gates (int): Optional. Number of gates, default is every 100 m in low mode and every 200 m in high mode.
+        gaps (dict): Optional. Gap settings, see gaps option.
+        layout (str): Optional. File names as read by wind_profiler_plots.py ('plots')
+            or wind_profiler_plots_day.py ('day'). Default 'plots'. Day file names have
+            no mode, so 'day' needs a single mode.
+        processes (int): Optional. Number of worker processes. Default is the number of CPUs.
+        seed (int): Optional. Random number generator seed.
+        compress (bool): Optional. Compress variables with zlib.
+
+    Returns:
+        int: Total size of files written in bytes.
+
+    """
+    if layout == 'day' and len(modes) != 1:
+        raise ValueError(f'Day layout file names have no mode, give one mode, not {modes}')
+    jobs = []
+    for mode in modes:
+        lowest, highest = mode_altitudes[mode]
+        n_gates = gates if gates is not None else int((highest - lowest) / (100 if mode == 'low' else 200)) + 1
+        altitude = np.linspace(lowest, highest, n_gates)
+        for i in range(days):
+            date = start_date + dt.timedelta(days=i)
+            if layout == 'day':
+                ncfile = wind_profiler_plots_day.nc_file_name(nc_file_path, date, sampling_interval)
+            else:
+                ncfile = wind_profiler_plots.nc_file_name(nc_file_path, date, mode)
+            jobs.append((ncfile, date, mode, sampling_interval, altitude, gaps, seed, compress))
+
+    # two workers writing the same file at once corrupt it
+    ncfiles = [job[0] for job in jobs]
+    if len(set(ncfiles)) != len(ncfiles):
+        raise ValueError('More than one file would be written to the same path')
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        sizes = list(executor.map(write_day_file_job, jobs, chunksize=max(1, len(jobs) // 64)))
+    return sum(sizes)
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create a synthetic deployment of ncas-radar-wind-profiler-1 snr-winds netCDF files.')
+    parser.add_argument('nc_file_path', help='location to write netCDF files')
+    parser.add_argument('--start', default=None, help='first day, YYYYmmdd, default is so the deployment ends today')
+    parser.add_argument('--days', type=int, default=7, help='number of days')
+    parser.add_argument('--modes', nargs='+', default=None, choices=['low', 'high'],
+                        help='operation modes, default is low and high, or low only with --layout day')
+    parser.add_argument('--interval', type=int, default=15, help='minutes between profiles')
+    parser.add_argument('--gates', type=int, default=None, help='number of gates')
+    parser.add_argument('--gap-fraction', type=float, default=gaps['gap_fraction'], help='fraction of profiles missing at random')
+    parser.add_argument('--outage-probability', type=float, default=gaps['outage_probability'], help='chance of an outage starting in any hour')
+    parser.add_argument('--missing-day-probability', type=float, default=gaps['missing_day_probability'], help='chance of a day file not existing')
+    parser.add_argument('--layout', choices=['plots', 'day'], default='plots', help='file names for wind_profiler_plots.py or wind_profiler_plots_day.py')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--seed', type=int, default=0, help='random number generator seed')
+    parser.add_argument('--compress', action='store_true', help='compress variables with zlib')
+    args = parser.parse_args()
+
+    if args.start is None:
+        start_date = dt.datetime.now() - dt.timedelta(days=args.days - 1)
+    else:
+        start_date = dt.datetime.strptime(args.start, '%Y%m%d')
+    if args.modes is None:
+        args.modes = ['low'] if args.layout == 'day' else ['low', 'high']
+    run_gaps = {'gap_fraction': args.gap_fraction, 'outage_probability': args.outage_probability,
+                'missing_day_probability': args.missing_day_probability}
+
+    start = time.perf_counter()
+    size = main(args.nc_file_path, start_date, days=args.days, modes=args.modes, sampling_interval=args.interval,
+                gates=args.gates, gaps=run_gaps, layout=args.layout, processes=args.processes, seed=args.seed,
+                compress=args.compress)
+    seconds = time.perf_counter() - start
+    print(f'Wrote {size / 1e6:.1f} MB in {seconds:.1f} s ({size / 1e6 / seconds:.1f} MB/s)')
@@ -0,0 +1,409 @@
+"""
+Export ncas-radar-wind-profiler-1 time/altitude data as compact quantized tiles for client-side rendering
+
+Each tile holds one day of one variable on a regular time axis: values
+quantized to uint8/uint16 with a scale and offset, a missing-data bitplane,
+and the time and altitude coordinates. See TILE_FORMAT.md for the layout.
+Tiles for today are updated in place as new profiles arrive, only writing
+the new rows.
+
+Usage: python tiles.py
+
+"""
+
+
+from netCDF4 import Dataset
+import datetime as dt
+import json
+import os
+import struct
+
+import numpy as np
+
+from wind_profiler_plots import day_time_axis, nc_file_name, zero_pad_number
+
+
+#################################
+# Options to potentially change #
+#################################
+
+deployment='20230710_woest'
+nc_file_path = f'/gws/pw/j07/ncas_obs_vol1/amf/processing/ncas-radar-wind-profiler-1/{deployment}'
+tiles_path = '/home/users/ncasit/nrwp1_plot_test/tiles'
+mode = 'low'
+
+# days before and including today to export or update
+days = 2
+
+# (lowest value, highest value, tile dtype) for each variable, values outside are clipped
+# keep these fixed so tiles from different days share a colour scale
+tile_ranges = {
+    'wind_speed': (0, 50, 'uint8'),
+    'wind_from_direction': (0, 360, 'uint16'),
+    'upward_air_velocity': (-5, 5, 'uint8'),
+    'signal_to_noise_ratio_minimum': (-30, 70, 'uint8'),
+    'spectral_width_of_beam_3': (0, 5, 'uint8'),
+}
+
+#################################
+
+
+tile_magic = b'WPT1'
+tile_extension = 'wpt'
+
+
+
+def quantize(data, vmin, vmax, dtype):
+    """
+    Quantizes data to unsigned integers.
+
+    Args:
+        data (masked array): Data to quantize.
+        vmin (float): Value of 0.
+        vmax (float): Value of the largest integer.
+        dtype (str): 'uint8' or 'uint16'.
+
+    Returns:
+        array: Quantized values, 0 where data are missing.
+        array: Boolean array, True where data are missing.
+        float: Scale, value = offset + scale * quantized value.
+        float: Offset.
+
+    """
+    levels = np.iinfo(dtype).max
+    scale = (vmax - vmin) / levels
+    values = np.ma.getdata(data).astype(float)
+    missing = np.ma.getmaskarray(data) | ~np.isfinite(values)
+    quantized = np.rint((np.clip(np.where(missing, vmin, values), vmin, vmax) - vmin) / scale).astype(dtype)
+    quantized[missing] = 0
+    return quantized, missing, scale, float(vmin)
+
+
+
+def pack_mask(missing):
+    """
+    Packs missing data flags into a bitplane with each time row padded to whole bytes.
+
+    Args:
+        missing (array): Boolean array with shape (time, altitude).
+
+    Returns:
+        array: uint8 array with shape (time, ceil(altitude / 8)), most significant bit first.
+
+    """
+    return np.packbits(missing, axis=1)
+
+
+
+def aligned(offset):
+    """
+    Returns offset rounded up to a multiple of 8 bytes, so sections can be viewed as typed arrays.
+    """
+    return (offset + 7) // 8 * 8
+
+
+
+def tile_layout(header):
+    """
+    Works out byte offsets and lengths of the sections of a tile.
+
+    Args:
+        header (dict): Tile header without 'sections'.
+
+    Returns:
+        dict: [offset, length] in bytes of 'time', 'altitude', 'values' and 'mask', from the start of the file.
+        int: Length of header block, including padding.
+
+    """
+    header_bytes = json.dumps({**header, 'sections': {name: [0, 0] for name in ['time', 'altitude', 'values', 'mask']}}).encode()
+    # leave room for offsets to grow when they are filled in
+    header_block = aligned(8 + len(header_bytes) + 128)
+    n_time = header['n_time']
+    n_altitude = header['n_altitude']
+    lengths = {
+        'time': n_time * 8,
+        'altitude': n_altitude * 4,
+        'values': n_time * n_altitude * np.dtype(header['dtype']).itemsize,
+        'mask': n_time * ((n_altitude + 7) // 8),
+    }
+    sections = {}
+    offset = header_block
+    for name in ['time', 'altitude', 'values', 'mask']:
+        sections[name] = [offset, lengths[name]]
+        offset = aligned(offset + lengths[name])
+    return sections, header_block
+
+
+
+def write_tile(tile_file, header, x_time, y_altitude, quantized, missing):
+    """
+    Writes a whole tile.
+
+    Args:
+        tile_file (str): File path and name of tile.
+        header (dict): Tile header without 'sections'.
+        x_time (array): Timestamps of each row, seconds since 1970-01-01 00:00:00 UTC.
+        y_altitude (array): Altitude of each gate.
+        quantized (array): Quantized values with shape (time, altitude).
+        missing (array): Boolean array with shape (time, altitude), True where data are missing.
+
+    Returns:
+        dict: Header with 'sections'.
+
+    """
+    sections, header_block = tile_layout(header)
+    header = {**header, 'sections': sections}
+    header_bytes = json.dumps(header).encode()
+
+    os.makedirs(os.path.dirname(tile_file), exist_ok=True)
+    temporary_file = f'{tile_file}.tmp'
+    with open(temporary_file, 'wb') as f:
+        f.write(tile_magic + struct.pack('<I', len(header_bytes)) + header_bytes)
+        for name, array in [('time', np.asarray(x_time, dtype='<f8')),
+                            ('altitude', np.ma.getdata(y_altitude).astype('<f4')),
+                            ('values', quantized.astype(quantized.dtype.newbyteorder('<'))),
+                            ('mask', pack_mask(missing))]:
+            f.seek(sections[name][0])
+            f.write(array.tobytes())
+        f.truncate(aligned(sections['mask'][0] + sections['mask'][1]))
+    # replace in one step so readers never see a half written tile
+    os.replace(temporary_file, tile_file)
+    return header
+
+
+
+def read_tile_header(tile_file):
+    """
+    Reads the header of a tile.
+
+    Args:
+        tile_file (str): File path and name of tile.
+
+    Returns:
+        dict: Tile header.
+
+    """
+    with open(tile_file, 'rb') as f:
+        if f.read(4) != tile_magic:
+            raise ValueError(f'{tile_file} is not a wind profiler tile')
+        length = struct.unpack('<I', f.read(4))[0]
+        return json.loads(f.read(length))
+
+
+
+def read_tile(tile_file):
+    """
+    Reads a tile back into time, altitude and data.
+
+    Args:
+        tile_file (str): File path and name of tile.
+
+    Returns:
+        dict: Tile header, 'time', 'altitude' and 'data' (masked array with shape (time, altitude)).
+
+    """
+    header = read_tile_header(tile_file)
+    sections = header['sections']
+    n_time = header['n_time']
+    n_altitude = header['n_altitude']
+    with open(tile_file, 'rb') as f:
+        content = f.read()
+
+    def section(name, dtype, count):
+        return np.frombuffer(content, dtype=dtype, count=count, offset=sections[name][0])
+
+    values = section('values', np.dtype(header['dtype']).newbyteorder('<'), n_time * n_altitude).reshape(n_time, n_altitude)
+    mask_bytes = section('mask', np.uint8, sections['mask'][1]).reshape(n_time, -1)
+    missing = np.unpackbits(mask_bytes, axis=1, count=n_altitude).astype(bool)
+    data = np.ma.masked_array(header['offset'] + header['scale'] * values.astype(float), mask=missing)
+    return {**header, 'time': section('time', '<f8', n_time), 'altitude': section('altitude', '<f4', n_altitude), 'data': data}
+
+
+
+def update_tile_rows(tile_file, header, rows, quantized, missing):
+    """
+    Writes new rows into an existing tile in place.
+
+    Args:
+        tile_file (str): File path and name of tile.
+        header (dict): Tile header from read_tile_header.
+        rows (array): Index of each row to write.
+        quantized (array): Quantized values with shape (rows, altitude).
+        missing (array): Boolean array with shape (rows, altitude).
+
+    """
+    sections = header['sections']
+    itemsize = np.dtype(header['dtype']).itemsize
+    row_values = header['n_altitude'] * itemsize
+    row_mask = (header['n_altitude'] + 7) // 8
+    mask_bytes = pack_mask(missing)
+    quantized = quantized.astype(quantized.dtype.newbyteorder('<'))
+    with open(tile_file, 'r+b') as f:
+        for i, row in enumerate(rows):
+            f.seek(sections['values'][0] + row * row_values)
+            f.write(quantized[i].tobytes())
+            f.seek(sections['mask'][0] + row * row_mask)
+            f.write(mask_bytes[i].tobytes())
+
+
+
+def export_day(ncfile, tiles_path, mode, date, variables, index, tile_ranges=tile_ranges):
+    """
+    Writes or updates the tiles for one day file. If tiles exist for the day and the file has only
+    had profiles added since, only profiles newer than the last exported profile are read and written.
+    Tiles are rewritten if the file has been changed in any other way, or a tile is missing, and
+    nothing is read if the file has not changed.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        tiles_path (str): Location of tiles.
+        mode (str): Operation mode of wind profiler (high or low).
+        date (datetime): Day of data.
+        variables (list): Names of variables to export.
+        index (dict): Tile index, updated with the tiles written.
+        tile_ranges (dict): Optional. (lowest value, highest value, dtype) for each variable.
+
+    Returns:
+        int: Number of profiles written.
+
+    """
+    day = f'{date.year}{zero_pad_number(date.month)}{zero_pad_number(date.day)}'
+    day_index = index['days'].get(day, {})
+    stat = os.stat(ncfile)
+    tile_files = [f'{tiles_path}/{mode}/{day}/{variable}.{tile_extension}' for variable in variables]
+    if (day_index.get('mtime') == stat.st_mtime and day_index.get('size') == stat.st_size
+            and all(variable in day_index.get('variables', {}) for variable in variables)
+            and all(os.path.exists(tile_file) for tile_file in tile_files)):
+        return 0
+
+    nc = Dataset(ncfile)
+    # sampling_interval attribute in file should be something like '15 mintues'
+    sampling_interval = int(nc.sampling_interval.split(' ')[0])
+    y_altitude = nc['altitude'][:]
+    x_time = day_time_axis(date, sampling_interval)
+    file_time = np.asarray(nc['time'][:]).astype(int)
+
+    # tiles can only be updated in place if the grid has not changed
+    full = (day_index.get('sampling_interval') != sampling_interval or day_index.get('n_altitude') != len(y_altitude)
+            or any(variable not in day_index.get('variables', {}) for variable in variables)
+            or not all(os.path.exists(tile_file) for tile_file in tile_files))
+    # and only if profiles were added after those already exported, with none changed or removed:
+    # a reprocessed file has a new modification time but not more profiles after last_time
+    if not full:
+        full = (stat.st_size < day_index.get('size', 0) or file_time.max(initial=-1) <= day_index['last_time']
+                or np.count_nonzero(file_time <= day_index['last_time']) != day_index.get('records'))
+    last_time = -np.inf if full else day_index['last_time']
+
+    new = np.flatnonzero(file_time > last_time)
+    rows = np.clip(np.searchsorted(x_time, file_time[new]), 0, len(x_time) - 1)
+    on_grid = x_time[rows] == file_time[new]
+    first = new[0] if len(new) else 0
+
+    day_variables = {}
+    for variable in variables:
+        vmin, vmax, dtype = tile_ranges[variable]
+        data = nc[variable][first:][new - first][on_grid]
+        quantized, missing, scale, offset = quantize(data, vmin, vmax, dtype)
+        tile_file = f'{tiles_path}/{mode}/{day}/{variable}.{tile_extension}'
+        if full:
+            header = {
+                'format': 'ncas-radar-wind-profiler-1 tile', 'version': 1,
+                'variable': variable, 'units': nc[variable].units, 'mode': mode, 'date': day,
+                'dtype': dtype, 'scale': scale, 'offset': offset, 'valid_min': vmin, 'valid_max': vmax,
+                'sampling_interval': sampling_interval, 'n_time': len(x_time), 'n_altitude': len(y_altitude),
+            }
+            grid_values = np.zeros((len(x_time), len(y_altitude)), dtype=dtype)
+            grid_missing = np.ones((len(x_time), len(y_altitude)), dtype=bool)
+            grid_values[rows[on_grid]] = quantized
+            grid_missing[rows[on_grid]] = missing
+            write_tile(tile_file, header, x_time, y_altitude, grid_values, grid_missing)
+        else:
+            update_tile_rows(tile_file, read_tile_header(tile_file), rows[on_grid], quantized, missing)
+        day_variables[variable] = {'file': f'{mode}/{day}/{variable}.{tile_extension}', 'units': nc[variable].units,
+                                   'valid_min': vmin, 'valid_max': vmax, 'dtype': dtype}
+
+    nc.close()
+    index['days'][day] = {
+        'sampling_interval': sampling_interval,
+        'n_altitude': len(y_altitude),
+        'last_time': int(file_time.max(initial=-1)),
+        'records': len(file_time),
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'variables': {**day_index.get('variables', {}), **day_variables} if not full else day_variables,
+    }
+    return int(on_grid.sum())
+
+
+
+def read_index(tiles_path, mode):
+    """
+    Reads tile index for a mode, or creates an empty one.
+
+    Args:
+        tiles_path (str): Location of tiles.
+        mode (str): Operation mode of wind profiler (high or low).
+
+    Returns:
+        dict: Tile index.
+
+    """
+    index_file = f'{tiles_path}/{mode}/index.json'
+    if os.path.exists(index_file):
+        with open(index_file) as f:
+            return json.load(f)
+    return {'mode': mode, 'days': {}}
+
+
+
+def write_index(tiles_path, mode, index):
+    """
+    Writes tile index for a mode, replacing the old one in one step.
+
+    Args:
+        tiles_path (str): Location of tiles.
+        mode (str): Operation mode of wind profiler (high or low).
+        index (dict): Tile index.
+
+    """
+    os.makedirs(f'{tiles_path}/{mode}', exist_ok=True)
+    index_file = f'{tiles_path}/{mode}/index.json'
+    with open(f'{index_file}.tmp', 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(f'{index_file}.tmp', index_file)
+
+
+
+def main(nc_file_path=nc_file_path, tiles_path=tiles_path, mode=mode, days=days, variables=None):
+    """
+    Export or update tiles for the last few days.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        tiles_path (str): Location to save tiles.
+        mode (str): Operation mode of wind profiler (high or low).
+        days (int): Optional. Number of days before today to export as well as today.
+        variables (list): Optional. Names of variables to export, default all in tile_ranges.
+
+    Returns:
+        int: Number of profiles written.
+
+    """
+    if variables is None:
+        variables = list(tile_ranges)
+    index = read_index(tiles_path, mode)
+    today_date = dt.datetime.now(dt.timezone.utc)
+    written = 0
+    for i in range(days, -1, -1):
+        date = today_date - dt.timedelta(days=i)
+        ncfile = nc_file_name(nc_file_path, date, mode)
+        if os.path.exists(ncfile):
+            written += export_day(ncfile, tiles_path, mode, date, variables, index)
+    write_index(tiles_path, mode, index)
+    return written
+
+
+
+if __name__ == "__main__":
+    main(mode="low")
+    main(mode="high")
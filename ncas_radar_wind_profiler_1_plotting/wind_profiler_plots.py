@@ -4,12 +4,20 @@ Create wind speed and direction plot for last 24 and 48 hours from ncas-radar-wi
 """
 
 
+from concurrent.futures import ThreadPoolExecutor
 from netCDF4 import Dataset
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import matplotlib.dates as mdates
 import numpy as np
 import datetime as dt
 import os
+import time
+
+from qc import qc_variables, compute_qc_mask, apply_qc_mask
+import aggregation
+import freshness
+import resample
 
 
 #################################
@@ -21,6 +29,40 @@ nc_file_path = f'/gws/pw/j07/ncas_obs_vol1/amf/processing/ncas-radar-wind-profil
 plots_path = f'/home/users/ncasit/nrwp1_plot_test'
 mode = 'low'
 
+# QC rules, see qc.default_qc_rules, e.g. {'snr_threshold': -15, 'min_neighbours': 2}
+# None for no QC
+qc_rules = None
+
+# windows to plot, in days before now
+windows = [1, 2]
+
+# products to plot for each window: 'wind-speed-direction', 'multipanel' or a variable name
+products = ['wind-speed-direction', 'upward_air_velocity', 'signal_to_noise_ratio_minimum', 'spectral_width_of_beam_3', 'multipanel']
+multipanel_variables = ['upward_air_velocity', 'signal_to_noise_ratio_minimum', 'spectral_width_of_beam_3']
+
+# colour map and colour bar centred around 0 (true) or not (false) for each variable, default 'viridis' not centred
+colours = {'upward_air_velocity': {'cmap': 'RdBu_r', 'zero_centre_cbar': True}}
+
+# longer windows, in days, of wind speed and direction plots made from averages streamed from day files, with the
+# minutes averaged over for each, e.g. {7: 60}, see aggregation.py
+wind_windows = {}
+
+# minutes between times plotted, files with other sampling intervals are resampled to it, see resample.py
+# None for the sampling interval of the newest file
+sampling_interval = None
+
+# how time/altitude data are drawn: 'auto' draws regular grids as a single image, 'mesh' always uses pcolormesh
+render = 'auto'
+
+# number of products to draw at once in threads, 1 draws one at a time
+render_threads = 1
+
+# day files up to this many bytes are read in one go and opened from memory, 0 to always open files normally
+bulk_read_limit = 64 * 1024**2
+
+# location to keep plot freshness history and Prometheus textfile, None to not record, see freshness.py
+freshness_path = None
+
 #################################
 
 
@@ -51,460 +93,498 @@ def create_time_xaxis(sampling_interval, days=1):
 
 
 
-def add_text(ax,plt,text,xpos=0.0,ypos=1.01,fontsize=12,color='black'):
-    plt.text(xpos,ypos,text,fontsize=fontsize, transform=ax.transAxes, color=color)
+def day_time_axis(date, sampling_interval):
+    """
+    Returns a regular time axis covering one day.
 
+    Args:
+        date (datetime): Day.
+        sampling_interval (int): Number of minutes between samples.
 
+    Returns:
+        array: Timestamps, seconds since 1970-01-01 00:00:00 UTC.
 
-def simple_2d_plot_last24(variable, yesterday_ncfile, today_ncfile, save_loc, cmap='viridis', zero_centre_cbar = False):
-    if 'low-mode' in yesterday_ncfile:
-        mode = 'low'
-    else:
-        mode = 'high'
+    """
+    start = int(dt.datetime(date.year, date.month, date.day, tzinfo=dt.timezone.utc).timestamp())
+    return np.arange(start, start + 86400, sampling_interval * 60)
 
-    if os.path.exists(yesterday_ncfile):
-        yesterday_exists = True 
-        yesterday_ncfile = Dataset(yesterday_ncfile)
-        ncfile = yesterday_ncfile
-    else:
-        yesterday_exists = False
 
-    if os.path.exists(today_ncfile):
-        today_exists = True
-        today_ncfile = Dataset(today_ncfile)
-        ncfile = today_ncfile
+
+def add_text(ax,text,xpos=0.0,ypos=1.01,fontsize=12,color='black'):
+    ax.text(xpos,ypos,text,fontsize=fontsize, transform=ax.transAxes, color=color)
+
+
+
+def new_figure(figsize):
+    """
+    Creates a figure with its own Agg canvas. Figures are not registered with pyplot,
+    so several can be drawn at once in different threads.
+
+    Args:
+        figsize (tuple): Width and height in inches.
+
+    Returns:
+        Figure: Figure with a white background.
+
+    """
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    fig.set_facecolor('white')
+    return fig
+
+
+
+def empty_window(variables, days=1, mode='low'):
+    """
+    Creates a window with no data, used to make empty plots when no files exist.
+
+    Args:
+        variables (list): Names of variables in window.
+        days (int): Optional. Number of days for x axis. Default is 1.
+        mode (str): Optional. Operation mode of wind profiler (high or low). Default 'low'.
+
+    Returns:
+        dict: Window with all data masked.
+
+    """
+    x_time = create_time_xaxis(15, days=days)
+    y_altitude = np.linspace(0,8000,9)
+    return {
+        'exists': False,
+        'mode': mode,
+        'days': days,
+        'time': x_time,
+        'altitude': y_altitude,
+        'data': {variable: np.ma.masked_all((len(x_time),len(y_altitude))) for variable in variables},
+        'units': {},
+        'file_mtime': None,
+    }
+
+
+
+def open_day_file(ncfile, bulk_read_limit=bulk_read_limit, cache=None):
+    """
+    Opens a netCDF file. Files up to bulk_read_limit bytes are read in one sequential read
+    and opened from memory, which saves the many small reads netCDF makes on a parallel
+    filesystem. Falls back to opening the file normally if it cannot be opened from memory.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        bulk_read_limit (int): Optional. Largest file in bytes to read into memory, 0 to always open normally.
+        cache (dict): Optional. File contents are kept here and reused if the file has not changed since.
+
+    Returns:
+        Dataset: Open netCDF file.
+
+    """
+    stat = os.stat(ncfile)
+    if stat.st_size > bulk_read_limit:
+        return Dataset(ncfile)
+    key = ('contents', ncfile, stat.st_mtime, stat.st_size)
+    if cache is not None and key in cache:
+        contents = cache[key]
     else:
-        today_exists = False
+        with open(ncfile, 'rb') as f:
+            contents = f.read()
+        if cache is not None:
+            cache[key] = contents
+    try:
+        return Dataset(ncfile, memory=contents)
+    except (OSError, ValueError):
+        # netCDF library built without in-memory support
+        return Dataset(ncfile)
 
 
-    # if any files exist, get data
-    # if no file exists, make empty plot
-    if today_exists or yesterday_exists:
-        # create x axis of all sampling times in last 24 hours
-        # sampling_interval attribute in file should be something like '15 mintues'
-        sampling_interval = int(ncfile.sampling_interval.split(' ')[0])
-    
-        x_time = create_time_xaxis(sampling_interval)
-    
-        # get y axis data
-        y_altitude = ncfile['altitude'][:]
 
-        # empty array for data to add to
-        data = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data = np.ma.masked_where(data == -99999, data)
+def read_day_file(ncfile, variables, cache=None, bulk_read_limit=bulk_read_limit):
+    """
+    Reads variables from one netCDF file.
+
+    Args:
+        ncfile (str): File path and name of netCDF file.
+        variables (list): Names of variables in netCDF file.
+        cache (dict): Optional. Data already read, reused if the file has not changed since.
+        bulk_read_limit (int): Optional. Largest file in bytes to read into memory in one go, see open_day_file.
+
+    Returns:
+        dict: 'sampling_interval' (minutes), 'time', 'altitude', 'mtime' of file, and 'data' and 'units' for each variable.
+
+    """
+    stat = os.stat(ncfile)
+    key = (ncfile, stat.st_mtime, stat.st_size)
+    if cache is not None and key in cache:
+        record = cache[key]
+    else:
+        record = None
+
+    missing = variables if record is None else [variable for variable in variables if variable not in record['data']]
+    if missing:
+        nc = open_day_file(ncfile, bulk_read_limit, cache=cache)
+        if record is None:
+            # sampling_interval attribute in file should be something like '15 mintues'
+            record = {
+                'sampling_interval': int(nc.sampling_interval.split(' ')[0]),
+                'time': np.asarray(nc['time'][:]).astype(int),
+                'altitude': nc['altitude'][:],
+                'mtime': stat.st_mtime,
+                'data': {},
+                'units': {},
+            }
+        for variable in missing:
+            record['data'][variable] = nc[variable][:]
+            record['units'][variable] = nc[variable].units
+        nc.close()
+        if cache is not None:
+            cache[key] = record
+
+    return record
+
+
+
+def load_window(ncfiles, variables, days=1, cache=None, bulk_read_limit=bulk_read_limit, sampling_interval=sampling_interval):
+    """
+    Loads variables from netCDF files onto a time axis covering the last n days.
+    Files that do not exist are skipped. If no file exists, the window is empty.
     
-        # fill the arrays with data from the right time when there is data at that time
-        for i, time in enumerate(x_time):
-            found = False
-            if yesterday_exists:
-                for j, yt in enumerate(yesterday_ncfile['time'][:]):
-                    if int(yt) == time:
-                        data[i] = yesterday_ncfile[variable][j]
-                        found = True
-            if not found and today_exists:
-                for j, tt in enumerate(today_ncfile['time'][:]):
-                    if int(tt) == time:
-                        data[i] = today_ncfile[variable][j]
+    Args:
+        ncfiles (list): File paths and names of netCDF files, oldest first.
+        variables (list): Names of variables in netCDF files.
+        days (int): Optional. Number of days for x axis. Default is 1.
+        cache (dict): Optional. Data read from files, shared between windows.
+        bulk_read_limit (int): Optional. Largest file in bytes to read into memory in one go, see open_day_file.
+        sampling_interval (int): Optional. Minutes between times in window, None for that of the newest file.
+
+    Returns:
+        dict: Window with 'time' (timestamps), 'altitude', and 'data' and 'units' for each variable.
     
-        # convert x time units back into datetime format
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
+    """
+    mode = 'low' if 'low-mode' in ncfiles[-1] else 'high'
+    records = [read_day_file(ncfile, variables, cache=cache, bulk_read_limit=bulk_read_limit) for ncfile in ncfiles if os.path.exists(ncfile)]
+    return window_from_records(records, variables, days=days, mode=mode, sampling_interval=sampling_interval)
 
-    else:
-        # data for empty plot
-        x_time = create_time_xaxis(15)
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
-        y_altitude = np.linspace(0,8000,9)
-        data = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data = np.ma.masked_where(data == -99999, data)
 
 
-    # make and save plot
-    x,y = np.meshgrid(x_time,y_altitude)
+def window_from_records(records, variables, days=1, mode='low', sampling_interval=sampling_interval):
+    """
+    Puts data read from netCDF files onto a time axis covering the last n days.
+    Files with a different sampling interval to the window are resampled, see resample.py.
+    If there are no records, the window is empty.
 
-    vmax = np.nanpercentile(np.abs(data.compressed()),98) if zero_centre_cbar else None
-    vmin = -np.nanpercentile(np.abs(data.compressed()),98) if zero_centre_cbar else None
+    Args:
+        records (list): Data from read_day_file for each file, oldest first.
+        variables (list): Names of variables in records.
+        days (int): Optional. Number of days for x axis. Default is 1.
+        mode (str): Optional. Operation mode of wind profiler (high or low). Default 'low'.
+        sampling_interval (int): Optional. Minutes between times in window, None for that of the newest file.
 
-    fig = plt.figure(figsize=(20,8))
-    fig.set_facecolor('white')
-    ax = fig.add_subplot(111)
-    
-    pc = ax.pcolormesh(x,y,data.T,cmap=cmap,vmin=vmin,vmax=vmax)
-    plt.gca().xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
+    Returns:
+        dict: Window with 'time' (timestamps), 'altitude', 'data' and 'units' for each variable,
+            and 'file_mtime' of the newest file.
+
+    """
+    # if no file exists, make empty plot
+    if not records:
+        return empty_window(variables, days=days, mode=mode)
+
+    # create x axis of all sampling times in window
+    latest = records[-1]
+    if sampling_interval is None:
+        sampling_interval = latest['sampling_interval']
+    x_time = create_time_xaxis(sampling_interval, days=days)
+
+    # get y axis data
+    y_altitude = latest['altitude']
+
+    # empty arrays for data to add to
+    data = {variable: np.ma.masked_all((len(x_time),len(y_altitude))) for variable in variables}
+
+    # fill the arrays with data resampled to the x axis,
+    # earlier files take precedence if times overlap
+    filled = np.zeros(len(x_time), dtype=bool)
+    for record in resample.join_records(records, variables, sampling_interval):
+        resampled, covered = resample.resample_record(record, variables, x_time, sampling_interval)
+        match = covered & ~filled
+        for variable in variables:
+            data[variable][match] = resampled[variable][match]
+        filled |= covered
+
+    units = {variable: latest['units'][variable] for variable in variables}
+
+    return {
+        'exists': True,
+        'mode': mode,
+        'days': days,
+        'time': x_time,
+        'altitude': y_altitude,
+        'data': data,
+        'units': units,
+        'file_mtime': max(record['mtime'] for record in records),
+    }
+
+
+
+def wind_window(ncfiles, days, averaging_interval, mode='low', qc_rules=None):
+    """
+    Averages wind from netCDF files onto a time axis covering the last n days, reading each file a few records
+    at a time. Wind speed is the mean speed and direction is from the mean u and v, see aggregation.py.
+
+    Args:
+        ncfiles (list): File paths and names of netCDF files, oldest first.
+        days (int): Number of days for x axis.
+        averaging_interval (int): Minutes averaged over for each time, at least the sampling interval of the files.
+        mode (str): Optional. Operation mode of wind profiler (high or low). Default 'low'.
+        qc_rules (dict): Optional. QC rules, gates failing them are left out of the averages. None for no QC.
+
+    Returns:
+        dict: Window with 'wind_speed' and 'wind_from_direction', as load_window returns.
+
+    """
+    variables = ['wind_speed', 'wind_from_direction']
+    x_time = create_time_xaxis(averaging_interval, days=days)
+    y_altitude, partial, units = aggregation.aggregate_wind_files(ncfiles, x_time, averaging_interval, qc_rules=qc_rules)
+    if partial is None:
+        return empty_window(variables, days=days, mode=mode)
+    wind = aggregation.finalise_wind(partial)
+    return {
+        'exists': True,
+        'mode': mode,
+        'days': days,
+        'time': x_time,
+        'altitude': y_altitude,
+        'data': {variable: np.ma.masked_invalid(wind[variable]) for variable in variables},
+        'units': units,
+        'file_mtime': max(os.path.getmtime(ncfile) for ncfile in ncfiles if os.path.exists(ncfile)),
+    }
+
+
+
+def format_time_axis(ax):
+    """
+    Sets time axis ticks, labels and grid used on all time/altitude plots.
+
+    Args:
+        ax (Axes): Axes to format.
+
+    """
+    ax.xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
     ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-    plt.gca().xaxis.set_major_locator(mdates.DayLocator())
+    ax.xaxis.set_major_locator(mdates.DayLocator())
     ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
     ax.set_ylabel('Altitude (m)', fontsize=17)
     ax.set_xlabel('Time (UTC)', fontsize=17)
-    ax.set_title('Last 24 hours', fontsize=19)
     ax.tick_params(axis='both', which='both', labelsize=14)
     ax.grid(which='both')
 
-    cbar = fig.colorbar(pc, ax = ax)
-    if yesterday_exists or today_exists:
-        cbar.ax.set_ylabel(f'{variable} ({ncfile[variable].units})', fontsize=17)
-    else:
-        cbar.ax.set_ylabel(f'{variable}', fontsize=17)
-    cbar.ax.tick_params(axis='both', which='both', labelsize=12)
 
-    add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
-    plt.tight_layout()
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_{variable.lower()}_last-24-hours.png')
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_{variable.lower()}_last-24-hours.pdf')
-    plt.close()
 
+def time_axis_numbers(x_time):
+    """
+    Converts timestamps to Matplotlib date numbers.
+
+    Args:
+        x_time (array): Timestamps, seconds since 1970-01-01 00:00:00 UTC.
 
+    Returns:
+        array: Matplotlib date numbers.
 
+    """
+    return mdates.date2num(np.asarray(x_time).astype(np.int64).astype('datetime64[s]'))
 
-def simple_2d_plot_last48(variable, day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile, save_loc, cmap='viridis', zero_centre_cbar=False):
-    if 'low-mode' in yesterday_ncfile:
-        mode = 'low'
-    else:
-        mode = 'high'
 
-    if os.path.exists(day_before_yesterday_ncfile):
-        day_before_yesterday_exists = True
-        day_before_yesterday_ncfile = Dataset(day_before_yesterday_ncfile)
-        ncfile = day_before_yesterday_ncfile
-    else:
-        day_before_yesterday_exists = False
 
-    if os.path.exists(yesterday_ncfile):
-        yesterday_exists = True
-        yesterday_ncfile = Dataset(yesterday_ncfile)
-        ncfile = yesterday_ncfile
-    else:
-        yesterday_exists = False
+def cell_edges(centres):
+    """
+    Returns edges of cells around centres, halfway between neighbouring centres
+    and half a cell beyond the first and last centres, as pcolormesh uses.
 
-    if os.path.exists(today_ncfile):
-        today_exists = True
-        today_ncfile = Dataset(today_ncfile)
-        ncfile = today_ncfile
-    else:
-        today_exists = False
+    Args:
+        centres (array): Cell centres.
 
+    Returns:
+        array: Cell edges, one longer than centres.
 
-    # if any files exist, get data
-    # if no file exists, make empty plot
-    if today_exists or yesterday_exists or day_before_yesterday_exists:
-        # create x axis of all sampling times in last 24 hours
-        # sampling_interval attribute in file should be something like '15 mintues'
-        sampling_interval = int(ncfile.sampling_interval.split(' ')[0])
-
-        x_time = create_time_xaxis(sampling_interval, days = 2)
-
-        # get y axis data
-        y_altitude = ncfile['altitude'][:]
-
-        # empty array for data to add to
-        data = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data = np.ma.masked_where(data == -99999, data)
-
-        # fill the arrays with data from the right time when there is data at that time
-        for i, time in enumerate(x_time):
-            found = False
-            if day_before_yesterday_exists:
-                for j, dbt in enumerate(day_before_yesterday_ncfile['time'][:]):
-                    if int(dbt) == time:
-                        data[i] = day_before_yesterday_ncfile[variable][j]
-                        found = True
-            if not found and yesterday_exists:
-                for j, yt in enumerate(yesterday_ncfile['time'][:]):
-                    if int(yt) == time:
-                        data[i] = yesterday_ncfile[variable][j]
-            if not found and today_exists:
-                for j, tt in enumerate(today_ncfile['time'][:]):
-                    if int(tt) == time:
-                        data[i] = today_ncfile[variable][j]
-
-        # convert x time units back into datetime format
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
+    """
+    centres = np.asarray(centres, dtype=float)
+    if len(centres) == 1:
+        return np.array([centres[0] - 0.5, centres[0] + 0.5])
+    middles = (centres[:-1] + centres[1:]) / 2
+    return np.concatenate([[2 * centres[0] - middles[0]], middles, [2 * centres[-1] - middles[-1]]])
 
-    else:
-        # data for empty plot
-        x_time = create_time_xaxis(15, days = 2)
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
-        y_altitude = np.linspace(0,8000,9)
-        data = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data = np.ma.masked_where(data == -99999, data)
 
 
-    # make and save plot
-    x,y = np.meshgrid(x_time,y_altitude)
+def is_regular(centres, tolerance=0.01):
+    """
+    Checks if centres are increasing and evenly spaced.
 
-    vmax = np.nanpercentile(np.abs(data.compressed()),98) if zero_centre_cbar else None
-    vmin = -np.nanpercentile(np.abs(data.compressed()),98) if zero_centre_cbar else None
+    Args:
+        centres (array): Cell centres.
+        tolerance (float): Optional. Largest allowed difference in spacing, as a fraction of mean spacing. Default is 0.01.
 
-    fig = plt.figure(figsize=(20,8))
-    fig.set_facecolor('white')
-    ax = fig.add_subplot(111)
+    Returns:
+        bool: True if centres are evenly spaced.
 
-    pc = ax.pcolormesh(x,y,data.T,cmap=cmap,vmin=vmin,vmax=vmax)
-    plt.gca().xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
-    ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-    plt.gca().xaxis.set_major_locator(mdates.DayLocator())
-    ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
-    ax.set_ylabel('Altitude (m)', fontsize=17)
-    ax.set_xlabel('Time (UTC)', fontsize=17)
-    ax.set_title('Last 48 hours', fontsize=19)
-    ax.tick_params(axis='both', which='both', labelsize=14)
-    ax.grid(which='both')
+    """
+    spacing = np.diff(np.asarray(centres, dtype=float))
+    if len(spacing) == 0 or np.any(spacing <= 0):
+        return False
+    return np.ptp(spacing) <= tolerance * spacing.mean()
 
-    cbar = fig.colorbar(pc, ax = ax)
-    if yesterday_exists or today_exists:
-        cbar.ax.set_ylabel(f'{variable} ({ncfile[variable].units})', fontsize=17)
+
+
+def time_height_mesh(ax, x_time, y_altitude, data, cmap=None, vmin=None, vmax=None, render=render):
+    """
+    Draws time/altitude data. Regular grids are drawn as a single image,
+    grids with increasing but unevenly spaced gates as a rectilinear image,
+    and anything else with pcolormesh.
+
+    Args:
+        ax (Axes): Axes to draw on.
+        x_time (array): Timestamps, seconds since 1970-01-01 00:00:00 UTC.
+        y_altitude (array): Altitude of each gate.
+        data (masked array): Data with shape (time, altitude).
+        cmap (str): Optional. Name of colour map.
+        vmin (float): Optional. Lower colour limit.
+        vmax (float): Optional. Upper colour limit.
+        render (str): Optional. 'auto' or 'mesh' to always use pcolormesh.
+
+    Returns:
+        ScalarMappable: Image or mesh, for the colour bar.
+
+    """
+    x = time_axis_numbers(x_time)
+    y = np.ma.getdata(y_altitude).astype(float)
+    increasing = np.all(np.diff(x) > 0) and np.all(np.diff(y) > 0)
+
+    if render == 'mesh' or not increasing:
+        x,y = np.meshgrid(x,y)
+        return ax.pcolormesh(x,y,data.T,cmap=cmap,vmin=vmin,vmax=vmax,shading='nearest')
+
+    x_edges = cell_edges(x)
+    y_edges = cell_edges(y)
+    if is_regular(x) and is_regular(y):
+        return ax.imshow(data.T, extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]), origin='lower',
+                         aspect='auto', interpolation='nearest', cmap=cmap, vmin=vmin, vmax=vmax)
     else:
-        cbar.ax.set_ylabel(f'{variable}', fontsize=17)
-    cbar.ax.tick_params(axis='both', which='both', labelsize=12)
+        return ax.pcolorfast(x_edges, y_edges, data.T, cmap=cmap, vmin=vmin, vmax=vmax)
 
-    
-    add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
-    plt.tight_layout()
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_{variable.lower()}_last-48-hours.png')
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_{variable.lower()}_last-48-hours.pdf')
-    plt.close()
 
 
+def zero_centre_limits(data):
+    """
+    Returns colour bar limits centred around 0, covering 98% of the data.
+
+    Args:
+        data (masked array): Data to plot.
+
+    Returns:
+        float: vmin, None if there is no data.
+        float: vmax, None if there is no data.
 
-def wind_speed_direction_plot_last24(yesterday_ncfile, today_ncfile, save_loc, barb_interval=3):
     """
-    Creates wind speed and direction plot for last 24 hours from ncas-radar-wind-profiler-1
-    
+    if data.count() == 0:
+        return None, None
+    vmax = np.nanpercentile(np.abs(data.compressed()),98)
+    return -vmax, vmax
+
+
+
+def plot_file_name(save_loc, mode, product, hours, extension):
+    """
+    Returns file path and name of a plot.
+
     Args:
-        yesterday_ncfile (str): File path and name of netCDF file with yesterday's data.
-        today_ncfile (str): File path and name of netCDF file with today's data.
-        save_loc (str): File path to save plots to.
-        barb_interval (int): Optional. Interval between data points to plot wind barbs. Default is 3.
-    
+        save_loc (str): File path plots are saved to.
+        mode (str): Operation mode of wind profiler (high or low).
+        product (str): 'wind-speed-direction', 'multipanel' or a variable name.
+        hours (int): Length of window in hours.
+        extension (str): File type, e.g. 'png'.
+
+    Returns:
+        str: File path and name of plot.
+
     """
-    
-    if 'low-mode' in yesterday_ncfile:
-        mode = 'low'
-    else:
-        mode = 'high'
-    
-    if os.path.exists(yesterday_ncfile):
-        yesterday_exists = True
-        yesterday_ncfile = Dataset(yesterday_ncfile)
-        ncfile = yesterday_ncfile
-    else:
-        yesterday_exists = False
+    return f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_{product.lower()}_last-{hours}-hours.{extension}'
 
-    if os.path.exists(today_ncfile):
-        today_exists = True
-        today_ncfile = Dataset(today_ncfile)
-        ncfile = today_ncfile
-    else:
-        today_exists = False
 
-    
-    # if any files exist, get data
-    # if no file exists, make empty plot
-    if today_exists or yesterday_exists:
-        # create x axis of all sampling times in last 24 hours
-        # sampling_interval attribute in file should be something like '15 mintues'
-        sampling_interval = int(ncfile.sampling_interval.split(' ')[0])
-       
-        x_time = create_time_xaxis(sampling_interval, days=1)
- 
-        # get y axis data
-        y_altitude = ncfile['altitude'][:]
-    
-        # make empty arrays to fill with data
-        data_ws = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data_ws = np.ma.masked_where(data_ws == -99999, data_ws)
-        data_dir = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data_dir = np.ma.masked_where(data_dir == -99999, data_dir)
-    
-        # fill the arrays with data from the right time when there is data at that time
-        for i, time in enumerate(x_time):
-            found = False
-            if yesterday_exists:
-                for j, yt in enumerate(yesterday_ncfile['time'][:]):
-                    if int(yt) == time:
-                        data_ws[i] = yesterday_ncfile['wind_speed'][j]
-                        data_dir[i] = yesterday_ncfile['wind_from_direction'][j]
-                        found = True
-            if not found and today_exists:
-                for j, tt in enumerate(today_ncfile['time'][:]):
-                    if int(tt) == time:
-                        data_ws[i] = today_ncfile['wind_speed'][j]
-                        data_dir[i] = today_ncfile['wind_from_direction'][j]
-                    
-
-        # get u and v wind components
-        u = data_ws * -np.sin(np.deg2rad(data_dir))
-        v = data_ws * -np.cos(np.deg2rad(data_dir))
-
-        # convert x time units back into datetime format
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
-    else:
-        # data for empty plot
-        x_time = create_time_xaxis(15)
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
-        y_altitude = np.linspace(0,8000,9)
-        data_ws = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data_ws = np.ma.masked_where(data_ws == -99999, data_ws)
-        data_dir = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data_dir = np.ma.masked_where(data_dir == -99999, data_dir)
-        u = data_ws * -np.sin(np.deg2rad(data_dir))
-        v = data_ws * -np.cos(np.deg2rad(data_dir))
 
-    
-    # make and save plot
-    x,y = np.meshgrid(x_time,y_altitude)
-    
-    fig = plt.figure(figsize=(20,8))
-    fig.set_facecolor('white')
+def simple_2d_plot(window, variable, save_loc, cmap='viridis', zero_centre_cbar=False, render=render, formats=('png', 'pdf')):
+    """
+    Creates time/altitude plot of variable from a loaded window.
+
+    Args:
+        window (dict): Window from load_window.
+        variable (str): Name of variable in window.
+        save_loc (str): File path to save plots to.
+        cmap (str): Optional. Name of colour map to use in plot. Default 'viridis'
+        zero_centre_cbar (bool): Optional. Color bar centred around 0 (true) or not (false). Default 'False'.
+        render (str): Optional. 'auto' or 'mesh', see time_height_mesh.
+        formats (tuple): Optional. File types to save. Default ('png', 'pdf').
+
+    Returns:
+        Figure: Plot, so it can be saved in other formats later without drawing it again.
+
+    """
+    mode = window['mode']
+    hours = window['days'] * 24
+    data = window['data'][variable]
+
+    vmin, vmax = zero_centre_limits(data) if zero_centre_cbar else (None, None)
+
+    fig = new_figure((20,8))
     ax = fig.add_subplot(111)
     
-    pc = ax.pcolormesh(x,y,data_ws.T)
-    plt.gca().xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
-    ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-    plt.gca().xaxis.set_major_locator(mdates.DayLocator())
-    ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
-    ax.set_ylabel('Altitude (m)', fontsize=17)
-    ax.set_xlabel('Time (UTC)', fontsize=17)
-    ax.set_title('Last 24 hours', fontsize=19)
-    ax.tick_params(axis='both', which='both', labelsize=14)
-    ax.grid(which='both')    
+    pc = time_height_mesh(ax, window['time'], window['altitude'], data, cmap=cmap, vmin=vmin, vmax=vmax, render=render)
+    format_time_axis(ax)
+    ax.set_title(f'Last {hours} hours', fontsize=19)
 
     cbar = fig.colorbar(pc, ax = ax)
-    cbar.ax.set_ylabel('Wind speed (m/s)', fontsize=17)
+    if window['exists']:
+        cbar.ax.set_ylabel(f'{variable} ({window["units"][variable]})', fontsize=17)
+    else:
+        cbar.ax.set_ylabel(f'{variable}', fontsize=17)
     cbar.ax.tick_params(axis='both', which='both', labelsize=12)
-    
-    #ax.barbs(x[::barb_interval,::barb_interval], y[::barb_interval,::barb_interval], u[::barb_interval,::barb_interval].T, v[::barb_interval,::barb_interval].T, length = 6)
-    # want all arrows to be same length
-    arrow_length = 1
-    v1 = (((arrow_length ** 2) / ((u**2 / v**2) + 1)) ** 0.5) * np.sign(v)
-    u1 = (v1/v)*u 
-
-    ax.quiver(x[::barb_interval,::barb_interval], y[::barb_interval,::barb_interval], u1[::barb_interval,::barb_interval].T, v1[::barb_interval,::barb_interval].T, scale=48, scale_units='width')
 
-    add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK') 
+    add_text(ax,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
+    fig.tight_layout()
+    for extension in formats:
+        fig.savefig(plot_file_name(save_loc, mode, variable, hours, extension))
+    return fig
 
-    plt.tight_layout()
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_wind-speed-direction_last-24-hours.png')
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_wind-speed-direction_last-24-hours.pdf')
-    plt.close()
 
 
-
-def wind_speed_direction_plot_last48(day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile, save_loc, barb_interval=3):
+def wind_speed_direction_plot(window, save_loc, barb_interval=3, render=render, formats=('png', 'pdf')):
     """
-    Creates wind speed and direction plot for last 48 hours from ncas-radar-wind-profiler-1
-    
+    Creates wind speed and direction plot from a loaded window.
+
     Args:
-        day_before_yesterday_ncfile (str): File path and name of netCDF file for the day before yesterday.
-        yesterday_ncfile (str): File path and name of netCDF file with yesterday's data.
-        today_ncfile (str): File path and name of netCDF file with today's data.
+        window (dict): Window from load_window, with 'wind_speed' and 'wind_from_direction'.
         save_loc (str): File path to save plots to.
         barb_interval (int): Optional. Interval between data points to plot wind barbs. Default is 3.
-    
-    """
-    
-    if 'low-mode' in yesterday_ncfile:
-        mode = 'low'
-    else:
-        mode = 'high'
-    
-    if os.path.exists(day_before_yesterday_ncfile):
-        day_before_yesterday_exists = True
-        day_before_yesterday_ncfile = Dataset(day_before_yesterday_ncfile)
-        ncfile = day_before_yesterday_ncfile
-    else:
-        day_before_yesterday_exists = False
+        render (str): Optional. 'auto' or 'mesh', see time_height_mesh.
+        formats (tuple): Optional. File types to save. Default ('png', 'pdf').
 
+    Returns:
+        Figure: Plot, so it can be saved in other formats later without drawing it again.
 
-    if os.path.exists(yesterday_ncfile):
-        yesterday_exists = True
-        yesterday_ncfile = Dataset(yesterday_ncfile)
-        ncfile = yesterday_ncfile
-    else:
-        yesterday_exists = False
+    """
+    mode = window['mode']
+    hours = window['days'] * 24
+    data_ws = window['data']['wind_speed']
+    data_dir = window['data']['wind_from_direction']
 
-    if os.path.exists(today_ncfile):
-        today_exists = True
-        today_ncfile = Dataset(today_ncfile)
-        ncfile = today_ncfile
-    else:
-        today_exists = False
-    
+    # get u and v wind components
+    u = data_ws * -np.sin(np.deg2rad(data_dir))
+    v = data_ws * -np.cos(np.deg2rad(data_dir))
 
-    # if any files exist, get data
-    # if no file exists, make empty plot
-    if today_exists or yesterday_exists or day_before_yesterday_exists:    
-        # create x axis of all sampling times in last 24 hours
-        # sampling_interval attribute in file should be something like '15 mintues'
-        sampling_interval = int(ncfile.sampling_interval.split(' ')[0])
-        
-        x_time = create_time_xaxis(sampling_interval, days=2)
- 
-        # get y axis data
-        y_altitude = ncfile['altitude'][:]
- 
-        # make empty arrays to fill with data
-        data_ws = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data_ws = np.ma.masked_where(data_ws == -99999, data_ws)
-        data_dir = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data_dir = np.ma.masked_where(data_dir == -99999, data_dir)
-        
-        # fill the arrays with data from the right time when there is data at that time
-        for i, time in enumerate(x_time):
-            found = False
-            if day_before_yesterday_exists:
-                for j, dbt in enumerate(day_before_yesterday_ncfile['time'][:]):
-                    if int(dbt) == time:
-                        data_ws[i] = day_before_yesterday_ncfile['wind_speed'][j]
-                        data_dir[i] = day_before_yesterday_ncfile['wind_from_direction'][j]
-                        found = True
-            if not found and yesterday_exists:
-                for j, yt in enumerate(yesterday_ncfile['time'][:]):
-                    if int(yt) == time:
-                        data_ws[i] = yesterday_ncfile['wind_speed'][j]
-                        data_dir[i] = yesterday_ncfile['wind_from_direction'][j]
-                        found = True
-            if not found and today_exists:
-                for j, tt in enumerate(today_ncfile['time'][:]):
-                    if int(tt) == time:
-                        data_ws[i] = today_ncfile['wind_speed'][j]
-                        data_dir[i] = today_ncfile['wind_from_direction'][j]
-                    
-
-        # get u and v wind components
-        u = data_ws * -np.sin(np.deg2rad(data_dir))
-        v = data_ws * -np.cos(np.deg2rad(data_dir))
-    
-        # convert x time units back into datetime format
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
-    else:
-        # data for empty plot
-        x_time = create_time_xaxis(15, days = 2)
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
-        y_altitude = np.linspace(0,8000,9)
-        data_ws = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data_ws = np.ma.masked_where(data_ws == -99999, data_ws)
-        data_dir = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data_dir = np.ma.masked_where(data_dir == -99999, data_dir)
-        u = data_ws * -np.sin(np.deg2rad(data_dir))
-        v = data_ws * -np.cos(np.deg2rad(data_dir))
-    
     # make and save plot
-    x,y = np.meshgrid(x_time,y_altitude)
+    x,y = np.meshgrid(time_axis_numbers(window['time']),window['altitude'])
     
-    fig = plt.figure(figsize=(20,8))
-    fig.set_facecolor('white')
+    fig = new_figure((20,8))
     ax = fig.add_subplot(111)
     
-    pc = ax.pcolormesh(x,y,data_ws.T)
-    plt.gca().xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
-    ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-    plt.gca().xaxis.set_major_locator(mdates.DayLocator())
-    ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
-    ax.set_ylabel('Altitude (m)', fontsize=17)
-    ax.set_xlabel('Time (UTC)', fontsize=17)
-    ax.set_title('Last 48 hours', fontsize=19)
-    ax.tick_params(axis='both', which='both', labelsize=14)
-    ax.grid(which='both')    
+    pc = time_height_mesh(ax, window['time'], window['altitude'], data_ws, render=render)
+    format_time_axis(ax)
+    ax.set_title(f'Last {hours} hours', fontsize=19)
 
     cbar = fig.colorbar(pc, ax = ax)
     cbar.ax.set_ylabel('Wind speed (m/s)', fontsize=17)
@@ -514,287 +594,249 @@ def wind_speed_direction_plot_last48(day_before_yesterday_ncfile, yesterday_ncfi
     # want all arrows to be same length
     arrow_length = 1
     v1 = (((arrow_length ** 2) / ((u**2 / v**2) + 1)) ** 0.5) * np.sign(v)
-    u1 = (v1/v)*u
+    u1 = (v1/v)*u 
 
     ax.quiver(x[::barb_interval,::barb_interval], y[::barb_interval,::barb_interval], u1[::barb_interval,::barb_interval].T, v1[::barb_interval,::barb_interval].T, scale=48, scale_units='width')
 
+    add_text(ax,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK') 
 
-    add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')    
-    
-    plt.tight_layout()
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_wind-speed-direction_last-48-hours.png')
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_wind-speed-direction_last-48-hours.pdf')
-    plt.close()
-    
+    fig.tight_layout()
+    for extension in formats:
+        fig.savefig(plot_file_name(save_loc, mode, 'wind-speed-direction', hours, extension))
+    return fig
 
 
-def multi_plot_24hrs(variables, yesterday_ncfile, today_ncfile, save_loc):
+
+def multi_plot(window, variables, save_loc, colours=colours, render=render, formats=('png', 'pdf')):
     """
-    variable - list
+    Creates plot with a time/altitude panel for each variable from a loaded window.
+
+    Args:
+        window (dict): Window from load_window.
+        variables (list): Names of variables in window.
+        save_loc (str): File path to save plots to.
+        colours (dict): Optional. Colour map and colour bar settings for each variable.
+        render (str): Optional. 'auto' or 'mesh', see time_height_mesh.
+        formats (tuple): Optional. File types to save. Default ('png', 'pdf').
+
+    Returns:
+        Figure: Plot, so it can be saved in other formats later without drawing it again.
+
     """
-    if 'low-mode' in yesterday_ncfile:
-        mode = 'low'
-    else:
-        mode = 'high'
+    mode = window['mode']
+    hours = window['days'] * 24
+
+    no_plots = len(variables)
+
+    fig = new_figure((20,8*no_plots))
+
+    for n in range(no_plots):
+        variable = variables[n]
+        ax = fig.add_subplot(no_plots,1,n+1)
+        data = window['data'][variable]
+
+        colour = colours.get(variable, {})
+        if window['exists']:
+            cmap = colour.get('cmap', 'viridis')
+        else:
+            cmap = 'viridis'
+        if colour.get('zero_centre_cbar', False) and window['exists']:
+            vmin, vmax = zero_centre_limits(data)
+        else:
+            vmax = None
+            vmin = None
+
+        pc = time_height_mesh(ax, window['time'], window['altitude'], data, cmap=cmap, vmin=vmin, vmax=vmax, render=render)
+        format_time_axis(ax)
+
+        if n == 0:
+            add_text(ax,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
+
+        cbar = fig.colorbar(pc, ax = ax)
+        if window['exists']:
+            cbar.ax.set_ylabel(f'{variable} ({window["units"][variable]})', fontsize=17)
+        else:
+            cbar.ax.set_ylabel(f'{variable}', fontsize=17)
+        cbar.ax.tick_params(axis='both', which='both', labelsize=12)
 
-    if os.path.exists(yesterday_ncfile):
-        yesterday_exists = True
-        yesterday_ncfile = Dataset(yesterday_ncfile)
-        ncfile = yesterday_ncfile
-    else:
-        yesterday_exists = False
+    fig.tight_layout()
+    for extension in formats:
+        fig.savefig(plot_file_name(save_loc, mode, 'multipanel', hours, extension))
+    return fig
 
-    if os.path.exists(today_ncfile):
-        today_exists = True
-        today_ncfile = Dataset(today_ncfile)
-        ncfile = today_ncfile
+
+
+def plot_product(window, product, save_loc, colours=colours, multipanel_variables=multipanel_variables, render=render, formats=('png', 'pdf')):
+    """
+    Creates one product from a loaded window.
+
+    Args:
+        window (dict): Window from load_window.
+        product (str): 'wind-speed-direction', 'multipanel' or a variable name.
+        save_loc (str): File path to save plots to.
+        colours (dict): Optional. Colour map and colour bar settings for each variable.
+        multipanel_variables (list): Optional. Names of variables in multipanel plot.
+        render (str): Optional. 'auto' or 'mesh', see time_height_mesh.
+        formats (tuple): Optional. File types to save. Default ('png', 'pdf').
+
+    Returns:
+        Figure: Plot.
+
+    """
+    if product == 'wind-speed-direction':
+        return wind_speed_direction_plot(window, save_loc, render=render, formats=formats)
+    elif product == 'multipanel':
+        return multi_plot(window, multipanel_variables, save_loc, colours=colours, render=render, formats=formats)
     else:
-        today_exists = False
+        colour = colours.get(product, {})
+        return simple_2d_plot(window, product, save_loc, cmap=colour.get('cmap', 'viridis'), zero_centre_cbar=colour.get('zero_centre_cbar', False), render=render, formats=formats)
 
 
-    # if any files exist, get data
-    # if no file exists, make empty plot
-    if today_exists or yesterday_exists:
-        # create x axis of all sampling times in last 24 hours
-        # sampling_interval attribute in file should be something like '15 mintues'
-        sampling_interval = int(ncfile.sampling_interval.split(' ')[0])
 
-        x_time1 = create_time_xaxis(sampling_interval, days=1)
-        # convert x time units back into datetime format
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time1]
+def plot_window(window, save_loc, products=products, colours=colours, multipanel_variables=multipanel_variables, render=render, threads=render_threads):
+    """
+    Creates all products from a loaded window.
 
-        y_altitude = ncfile['altitude'][:]
+    Args:
+        window (dict): Window from load_window.
+        save_loc (str): File path to save plots to.
+        products (list): Optional. Products to plot: 'wind-speed-direction', 'multipanel' or a variable name.
+        colours (dict): Optional. Colour map and colour bar settings for each variable.
+        multipanel_variables (list): Optional. Names of variables in multipanel plot.
+        render (str): Optional. 'auto' or 'mesh', see time_height_mesh.
+        threads (int): Optional. Number of products to draw at once. Threads share the window's arrays, which are only read.
 
-        x,y = np.meshgrid(x_time,y_altitude)
-    
-        no_plots = len(variables)
+    Returns:
+        dict: Time each product was saved, seconds since 1970-01-01 00:00:00 UTC.
 
-        fig = plt.figure(figsize=(20,8*no_plots))
-        fig.set_facecolor('white')
-    
-        for n in range(no_plots):
-            variable = variables[n]
-            ax = fig.add_subplot(no_plots,1,n+1)
-             
-            data = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-            data = np.ma.masked_where(data == -99999, data)
-    
-            for i, time in enumerate(x_time1):
-                found = False
-                if yesterday_exists:
-                    for j, yt in enumerate(yesterday_ncfile['time'][:]):
-                        if int(yt) == time:
-                            data[i] = yesterday_ncfile[variable][j]
-                            found = True
-                if not found and today_exists:
-                    for j, tt in enumerate(today_ncfile['time'][:]):
-                        if int(tt) == time:
-                            data[i] = today_ncfile[variable][j]
-
-            if variable == 'upward_air_velocity':
-                cmap = 'RdBu_r'
-                vmax = np.nanpercentile(np.abs(data.compressed()),98)
-                vmin = -np.nanpercentile(np.abs(data.compressed()),98)
-            else:
-                cmap = "viridis"
-                vmax = None
-                vmin = None
-            
-            pc = ax.pcolormesh(x,y,data.T,cmap=cmap,vmin=vmin,vmax=vmax)
-            ax.xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
-            ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-            ax.xaxis.set_major_locator(mdates.DayLocator())
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
-            ax.set_ylabel('Altitude (m)', fontsize=17)
-            ax.set_xlabel('Time (UTC)', fontsize=17)
-            #ax.set_title('Last 24 hours', fontsize=19)
-            ax.tick_params(axis='both', which='both', labelsize=14)
-            ax.grid(axis='both', which='both')
-
-            if n == 0:
-                add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')        
-
-            cbar = fig.colorbar(pc, ax = ax)
-            cbar.ax.set_ylabel(f'{variable} ({ncfile[variable].units})', fontsize=17)
-            cbar.ax.tick_params(axis='both', which='both', labelsize=12)
+    """
+    def plot(product):
+        plot_product(window, product, save_loc, colours=colours, multipanel_variables=multipanel_variables, render=render)
+        return time.time()
+
+    if threads > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # map returns results in product order and raises here any error from a thread
+            return dict(zip(products, executor.map(plot, products)))
     else:
-        # data for empty plot
-        x_time = create_time_xaxis(15)
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
-        y_altitude = np.linspace(0,8000,9)
-        data = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data = np.ma.masked_where(data == -99999, data)
-        x,y = np.meshgrid(x_time,y_altitude)
-        no_plots = len(variables)
-        fig = plt.figure(figsize=(20,8*no_plots))
-        fig.set_facecolor('white')
-        for n in range(no_plots):
-            variable = variables[n]
-            ax = fig.add_subplot(no_plots,1,n+1)
-            pc = ax.pcolormesh(x,y,data.T)
-            ax.xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
-            ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-            ax.xaxis.set_major_locator(mdates.DayLocator())
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
-            ax.set_ylabel('Altitude (m)', fontsize=17)
-            ax.set_xlabel('Time (UTC)', fontsize=17)
-            ax.tick_params(axis='both', which='both', labelsize=14)
-            ax.grid(axis='both', which='both')
-
-            if n == 0:
-                add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
-
-            cbar = fig.colorbar(pc, ax = ax)
-            cbar.ax.set_ylabel(f'{variable}', fontsize=17)
-            cbar.ax.tick_params(axis='both', which='both', labelsize=12)
+        return {product: plot(product) for product in products}
 
 
-    plt.tight_layout()
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_multipanel_last-24-hours.png')
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_multipanel_last-24-hours.pdf')
-    plt.close()
 
+def product_variables(products=products, multipanel_variables=multipanel_variables, qc_rules=None):
+    """
+    Returns names of variables needed to plot products.
+
+    Args:
+        products (list): Optional. Products to plot.
+        multipanel_variables (list): Optional. Names of variables in multipanel plot.
+        qc_rules (dict): Optional. QC rules, adds variables needed for QC.
 
+    Returns:
+        list: Names of variables.
 
-def multi_plot_48hrs(variables, day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile, save_loc):
     """
-    variable - list
+    variables = []
+    for product in products:
+        if product == 'wind-speed-direction':
+            needed = ['wind_speed', 'wind_from_direction']
+        elif product == 'multipanel':
+            needed = multipanel_variables
+        else:
+            needed = [product]
+        variables += [variable for variable in needed if variable not in variables]
+    if qc_rules is not None:
+        variables += [variable for variable in qc_variables(qc_rules) if variable not in variables]
+    return variables
+
+
+
+def simple_2d_plot_last24(variable, yesterday_ncfile, today_ncfile, save_loc, cmap='viridis', zero_centre_cbar = False):
     """
-    if 'low-mode' in yesterday_ncfile:
-        mode = 'low'
-    else:
-        mode = 'high'
+    Creates plot of variable for last 24 hours from ncas-radar-wind-profiler-1
 
-    if os.path.exists(day_before_yesterday_ncfile):
-        day_before_yesterday_exists = True
-        day_before_yesterday_ncfile = Dataset(day_before_yesterday_ncfile)
-        ncfile = day_before_yesterday_ncfile
-    else:
-        day_before_yesterday_exists = False
+    Args:
+        variable (str): Name of variable in netCDF file
+        yesterday_ncfile (str): File path and name of netCDF file with yesterday's data.
+        today_ncfile (str): File path and name of netCDF file with today's data.
+        save_loc (str): File path to save plots to.
+        cmap (str): Optional. Name of colour map to use in plot. Default 'viridis'
+        zero_centre_cbar (bool): Optional. Color bar centred around 0 (true) or not (false). Default 'False'.
 
+    """
+    window = load_window([yesterday_ncfile, today_ncfile], [variable], days=1)
+    simple_2d_plot(window, variable, save_loc, cmap=cmap, zero_centre_cbar=zero_centre_cbar)
 
-    if os.path.exists(yesterday_ncfile):
-        yesterday_exists = True
-        yesterday_ncfile = Dataset(yesterday_ncfile)
-        ncfile = yesterday_ncfile
-    else:
-        yesterday_exists = False
 
-    if os.path.exists(today_ncfile):
-        today_exists = True
-        today_ncfile = Dataset(today_ncfile)
-        ncfile = today_ncfile
-    else:
-        today_exists = False
 
 
-    # if any files exist, get data
-    # if no file exists, make empty plot
-    if today_exists or yesterday_exists or day_before_yesterday_exists:
-        # create x axis of all sampling times in last 24 hours
-        # sampling_interval attribute in file should be something like '15 mintues'
-        sampling_interval = int(ncfile.sampling_interval.split(' ')[0])
+def simple_2d_plot_last48(variable, day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile, save_loc, cmap='viridis', zero_centre_cbar=False):
+    """
+    Creates plot of variable for last 48 hours from ncas-radar-wind-profiler-1
 
+    Args:
+        variable (str): Name of variable in netCDF file
+        day_before_yesterday_ncfile (str): File path and name of netCDF file for the day before yesterday.
+        yesterday_ncfile (str): File path and name of netCDF file with yesterday's data.
+        today_ncfile (str): File path and name of netCDF file with today's data.
+        save_loc (str): File path to save plots to.
+        cmap (str): Optional. Name of colour map to use in plot. Default 'viridis'
+        zero_centre_cbar (bool): Optional. Color bar centred around 0 (true) or not (false). Default 'False'.
 
-        x_time1 = create_time_xaxis(sampling_interval, days=2)
-        # convert x time units back into datetime format
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time1]
+    """
+    window = load_window([day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile], [variable], days=2)
+    simple_2d_plot(window, variable, save_loc, cmap=cmap, zero_centre_cbar=zero_centre_cbar)
 
-        y_altitude = ncfile['altitude'][:]
 
-        x,y = np.meshgrid(x_time,y_altitude)
 
-        no_plots = len(variables)
+def wind_speed_direction_plot_last24(yesterday_ncfile, today_ncfile, save_loc, barb_interval=3):
+    """
+    Creates wind speed and direction plot for last 24 hours from ncas-radar-wind-profiler-1
     
-        fig = plt.figure(figsize=(20,8*no_plots))
-        fig.set_facecolor('white')
+    Args:
+        yesterday_ncfile (str): File path and name of netCDF file with yesterday's data.
+        today_ncfile (str): File path and name of netCDF file with today's data.
+        save_loc (str): File path to save plots to.
+        barb_interval (int): Optional. Interval between data points to plot wind barbs. Default is 3.
     
-        for n in range(no_plots):
-            variable = variables[n]
-            ax = fig.add_subplot(no_plots,1,n+1)
+    """
+    window = load_window([yesterday_ncfile, today_ncfile], ['wind_speed', 'wind_from_direction'], days=1)
+    wind_speed_direction_plot(window, save_loc, barb_interval=barb_interval)
+
+
+
+def wind_speed_direction_plot_last48(day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile, save_loc, barb_interval=3):
+    """
+    Creates wind speed and direction plot for last 48 hours from ncas-radar-wind-profiler-1
+    
+    Args:
+        day_before_yesterday_ncfile (str): File path and name of netCDF file for the day before yesterday.
+        yesterday_ncfile (str): File path and name of netCDF file with yesterday's data.
+        today_ncfile (str): File path and name of netCDF file with today's data.
+        save_loc (str): File path to save plots to.
+        barb_interval (int): Optional. Interval between data points to plot wind barbs. Default is 3.
     
-            data = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-            data = np.ma.masked_where(data == -99999, data)
+    """
+    window = load_window([day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile], ['wind_speed', 'wind_from_direction'], days=2)
+    wind_speed_direction_plot(window, save_loc, barb_interval=barb_interval)
     
-            for i, time in enumerate(x_time1):
-                found = False
-                if day_before_yesterday_exists:
-                    for j, dbt in enumerate(day_before_yesterday_ncfile['time'][:]):
-                        if int(dbt) == time:
-                            data[i] = day_before_yesterday_ncfile[variable][j]
-                            found = True
-                if not found and yesterday_exists:
-                    for j, yt in enumerate(yesterday_ncfile['time'][:]):
-                        if int(yt) == time:
-                            data[i] = yesterday_ncfile[variable][j]
-                            found = True
-                if not found and today_exists:
-                    for j, tt in enumerate(today_ncfile['time'][:]):
-                        if int(tt) == time:
-                            data[i] = today_ncfile[variable][j]
-
-            if variable == 'upward_air_velocity':
-                cmap = 'RdBu_r'
-                vmax = np.nanpercentile(np.abs(data.compressed()),98)
-                vmin = -np.nanpercentile(np.abs(data.compressed()),98)
-            else:
-                cmap = "viridis"
-                vmax = None
-                vmin = None
-
-            pc = ax.pcolormesh(x,y,data.T,cmap=cmap,vmin=vmin,vmax=vmax)
-            ax.xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
-            ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-            ax.xaxis.set_major_locator(mdates.DayLocator())
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
-            ax.set_ylabel('Altitude (m)', fontsize=17)
-            ax.set_xlabel('Time (UTC)', fontsize=17)
-            #ax.set_title('Last 24 hours', fontsize=19)
-            ax.tick_params(axis='both', which='both', labelsize=14)
-            ax.grid(axis='both', which='both')
-
-            if n == 0:
-                add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
-
-            cbar = fig.colorbar(pc, ax = ax)
-            cbar.ax.set_ylabel(f'{variable} ({ncfile[variable].units})', fontsize=17)
-            cbar.ax.tick_params(axis='both', which='both', labelsize=12)
-    else:
-        # data for empty plot
-        x_time = create_time_xaxis(15, days = 2)
-        x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
-        y_altitude = np.linspace(0,8000,9)
-        data = np.ma.ones((len(x_time),len(y_altitude))) * -99999
-        data = np.ma.masked_where(data == -99999, data)
-        x,y = np.meshgrid(x_time,y_altitude)
-        no_plots = len(variables)
-        fig = plt.figure(figsize=(20,8*no_plots))
-        fig.set_facecolor('white')
-        for n in range(no_plots):
-            variable = variables[n]
-            ax = fig.add_subplot(no_plots,1,n+1)
-            pc = ax.pcolormesh(x,y,data.T)
-            ax.xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
-            ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-            ax.xaxis.set_major_locator(mdates.DayLocator())
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
-            ax.set_ylabel('Altitude (m)', fontsize=17)
-            ax.set_xlabel('Time (UTC)', fontsize=17)
-            ax.tick_params(axis='both', which='both', labelsize=14)
-            ax.grid(axis='both', which='both')
-            if n == 0:
-                add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
-
-            cbar = fig.colorbar(pc, ax = ax)
-            cbar.ax.set_ylabel(f'{variable}', fontsize=17)
-            cbar.ax.tick_params(axis='both', which='both', labelsize=12)
 
-    add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')    
 
-    plt.tight_layout()
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_multipanel_last-48-hours.png')
-    plt.savefig(f'{save_loc}/ncas-wind-profiler-1_{mode}-mode_multipanel_last-48-hours.pdf')
-    plt.close()
+def multi_plot_24hrs(variables, yesterday_ncfile, today_ncfile, save_loc):
+    """
+    variable - list
+    """
+    window = load_window([yesterday_ncfile, today_ncfile], variables, days=1)
+    multi_plot(window, variables, save_loc)
+
+
+
+def multi_plot_48hrs(variables, day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile, save_loc):
+    """
+    variable - list
+    """
+    window = load_window([day_before_yesterday_ncfile, yesterday_ncfile, today_ncfile], variables, days=2)
+    multi_plot(window, variables, save_loc)
 
 
 
@@ -816,50 +858,124 @@ def zero_pad_number(n):
         return f'0{n}'
     else:
         return f'{n}'
+
+
+
+def nc_file_name(nc_file_path, date, mode):
+    """
+    Returns file path and name of the netCDF file for one day of data.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        date (datetime): Day of data
+        mode (str): Operation mode of wind profiler (high or low).
+
+    Returns:
+        str: File path and name of netCDF file.
+
+    """
+    return f'{nc_file_path}/{date.year}/{zero_pad_number(date.month)}/ncas-radar-wind-profiler-1_mobile_{date.year}{zero_pad_number(date.month)}{zero_pad_number(date.day)}_snr-winds_{mode}-mode_15min_v1.0.nc'
     
     
     
-def main(nc_file_path=nc_file_path, plots_path=plots_path, mode=mode):
+def window_nc_files(nc_file_path, date, mode, days=1):
+    """
+    Returns file paths and names of netCDF files needed for last n days, oldest first.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        date (datetime): Latest day of data
+        mode (str): Operation mode of wind profiler (high or low).
+        days (int): Optional. Number of days. Default is 1.
+
+    Returns:
+        list: File paths and names of netCDF files.
+
+    """
+    return [nc_file_name(nc_file_path, date - dt.timedelta(days=i), mode) for i in range(days, -1, -1)]
+
+
+
+def main(nc_file_path=nc_file_path, plots_path=plots_path, mode=mode, qc_rules=qc_rules, windows=windows, products=products, colours=colours, multipanel_variables=multipanel_variables, render=render, render_threads=render_threads, bulk_read_limit=bulk_read_limit, freshness_path=freshness_path, sampling_interval=sampling_interval, wind_windows=wind_windows, records=None, date=None):
     """
     Make plots for last 24/48 hours of wind profiler data.
+    Data for each window are loaded once and shared by all plots.
     
     Args:
         nc_file_path (str): Location of netCDF files
         plots_path (str): Location to save plots.
         mode (str): Operation mode of wind profiler (high or low).
+        qc_rules (dict): Optional. QC rules to mask gates with, None for no QC.
+        windows (list): Optional. Windows to plot, in days.
+        products (list): Optional. Products to plot for each window.
+        colours (dict): Optional. Colour map and colour bar settings for each variable.
+        multipanel_variables (list): Optional. Names of variables in multipanel plot.
+        render (str): Optional. 'auto' or 'mesh', see time_height_mesh.
+        render_threads (int): Optional. Number of products to draw at once, see plot_window.
+        bulk_read_limit (int): Optional. Largest file in bytes to read into memory in one go, see open_day_file.
+        freshness_path (str): Optional. Location to keep plot freshness history and Prometheus textfile, None to not record.
+        sampling_interval (int): Optional. Minutes between times plotted, None for that of the newest file in each window.
+        wind_windows (dict): Optional. Minutes averaged over for each longer window, in days, of wind speed and direction, see wind_window.
+        records (dict): Optional. Data already read from each file by read_day_file, instead of reading files here.
+            Files not in records, or None, are plotted as missing. wind_windows are not plotted, as they are
+            streamed from the files and those reads would not be under the caller's control.
+        date (datetime): Optional. Latest day plotted, None for now. Give the date records were found for,
+            so a run crossing midnight looks for the same files.
+
+    Returns:
+        dict: Time in seconds spent loading data, applying QC and making plots.
     
     """
-    today_date = dt.datetime.now()
-    yesterday_date = today_date - dt.timedelta(days=1)
-    day_before_yesterday_date = today_date - dt.timedelta(days=2)
+    today_date = date if date is not None else dt.datetime.now()
 
-    today_nc_file_path=f'{nc_file_path}/{today_date.year}/{zero_pad_number(today_date.month)}'
-    yesterday_nc_file_path=f'{nc_file_path}/{yesterday_date.year}/{zero_pad_number(yesterday_date.month)}'
-    day_before_yesterday_nc_file_path=f'{nc_file_path}/{day_before_yesterday_date.year}/{zero_pad_number(day_before_yesterday_date.month)}'
-    
-    today_file = f'ncas-radar-wind-profiler-1_mobile_{today_date.year}{zero_pad_number(today_date.month)}{zero_pad_number(today_date.day)}_snr-winds_{mode}-mode_15min_v1.0.nc'
-    
-    yesterday_file = f'ncas-radar-wind-profiler-1_mobile_{yesterday_date.year}{zero_pad_number(yesterday_date.month)}{zero_pad_number(yesterday_date.day)}_snr-winds_{mode}-mode_15min_v1.0.nc'
-    
-    day_before_yesterday_file = f'ncas-radar-wind-profiler-1_mobile_{day_before_yesterday_date.year}{zero_pad_number(day_before_yesterday_date.month)}{zero_pad_number(day_before_yesterday_date.day)}_snr-winds_{mode}-mode_15min_v1.0.nc'
-    
-    
-    wind_speed_direction_plot_last24(f'{yesterday_nc_file_path}/{yesterday_file}', f'{today_nc_file_path}/{today_file}', plots_path)
-    
-    wind_speed_direction_plot_last48(f'{day_before_yesterday_nc_file_path}/{day_before_yesterday_file}',f'{yesterday_nc_file_path}/{yesterday_file}', f'{today_nc_file_path}/{today_file}', plots_path)
+    variables = product_variables(products, multipanel_variables, qc_rules)
+
+    timings = {'load': 0.0, 'qc': 0.0, 'render': 0.0}
+
+    # files in more than one window are only read once
+    cache = {}
+    freshness_records = []
+
+    for days in windows:
+        start = time.perf_counter()
+        ncfiles = window_nc_files(nc_file_path, today_date, mode, days)
+        if records is None:
+            window = load_window(ncfiles, variables, days=days, cache=cache, bulk_read_limit=bulk_read_limit, sampling_interval=sampling_interval)
+        else:
+            window = window_from_records([records[ncfile] for ncfile in ncfiles if records.get(ncfile) is not None], variables, days=days, mode=mode,
+                                         sampling_interval=sampling_interval)
+        timings['load'] += time.perf_counter() - start
+
+        if qc_rules is not None:
+            start = time.perf_counter()
+            apply_qc_mask(window, compute_qc_mask(window, qc_rules))
+            timings['qc'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        rendered = plot_window(window, plots_path, products=products, colours=colours, multipanel_variables=multipanel_variables, render=render, threads=render_threads)
+        timings['render'] += time.perf_counter() - start
+
+        freshness_records += [freshness.product_freshness(window, product, product_variables([product], multipanel_variables), rendered[product])
+                              for product in products]
+
+    # streamed from files, so only made when files are read here
+    for days, averaging_interval in (wind_windows.items() if records is None else []):
+        start = time.perf_counter()
+        window = wind_window(window_nc_files(nc_file_path, today_date, mode, days), days, averaging_interval, mode=mode, qc_rules=qc_rules)
+        timings['load'] += time.perf_counter() - start
 
-    for var in ['upward_air_velocity']:   
-        simple_2d_plot_last24(var, f'{yesterday_nc_file_path}/{yesterday_file}', f'{today_nc_file_path}/{today_file}', plots_path, cmap='RdBu_r', zero_centre_cbar=True) 
-        simple_2d_plot_last48(var, f'{day_before_yesterday_nc_file_path}/{day_before_yesterday_file}', f'{yesterday_nc_file_path}/{yesterday_file}', f'{today_nc_file_path}/{today_file}', plots_path, cmap='RdBu_r', zero_centre_cbar=True)
+        start = time.perf_counter()
+        wind_speed_direction_plot(window, plots_path, render=render)
+        timings['render'] += time.perf_counter() - start
+        freshness_records.append(freshness.product_freshness(window, 'wind-speed-direction', ['wind_speed', 'wind_from_direction'], time.time()))
 
-    for var in ['signal_to_noise_ratio_minimum', 'spectral_width_of_beam_3']:
-        simple_2d_plot_last24(var, f'{yesterday_nc_file_path}/{yesterday_file}', f'{today_nc_file_path}/{today_file}', plots_path)
-        simple_2d_plot_last48(var, f'{day_before_yesterday_nc_file_path}/{day_before_yesterday_file}', f'{yesterday_nc_file_path}/{yesterday_file}', f'{today_nc_file_path}/{today_file}', plots_path)
+    if freshness_path is not None:
+        freshness.record_run(freshness_path, freshness_records)
 
-    multi_plot_24hrs(['upward_air_velocity', 'signal_to_noise_ratio_minimum', 'spectral_width_of_beam_3'], f'{yesterday_nc_file_path}/{yesterday_file}', f'{today_nc_file_path}/{today_file}', plots_path)
-    multi_plot_48hrs(['upward_air_velocity', 'signal_to_noise_ratio_minimum', 'spectral_width_of_beam_3'], f'{day_before_yesterday_nc_file_path}/{day_before_yesterday_file}', f'{yesterday_nc_file_path}/{yesterday_file}', f'{today_nc_file_path}/{today_file}', plots_path)
+    return timings
 
 
 if __name__ == "__main__":
-    main(mode="low")
-    main(mode="high")
+    for run_mode in ["low", "high"]:
+        timings = main(mode=run_mode)
+        print(f'{run_mode}-mode: ' + ', '.join(f'{stage} {seconds:.2f} s' for stage, seconds in timings.items()))
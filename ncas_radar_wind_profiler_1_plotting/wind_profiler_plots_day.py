@@ -5,12 +5,13 @@ Create wind speed and direction plot for last 24 and 48 hours from ncas-radar-wi
 
 
 from netCDF4 import Dataset
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
 import datetime as dt
 import os
 
+from wind_profiler_plots import time_height_mesh, time_axis_numbers, new_figure
+
 
 #################################
 # Options to potentially change #
@@ -21,6 +22,9 @@ nc_file_path = f'/gws/pw/j07/ncas_obs_vol1/amf/processing/ncas-radar-wind-profil
 plots_path = '/gws/pw/j07/woest/public/quicklooks/ncas-radar-wind-profiler-1'
 mode = 'low'
 
+# how time/altitude data are drawn: 'auto' draws regular grids as a single image, 'mesh' always uses pcolormesh
+render = 'auto'
+
 #################################
 
 
@@ -70,12 +74,12 @@ def zero_pad_number(n):
 
 
 
-def add_text(ax,plt,text,xpos=0.0,ypos=1.01,fontsize=12,color='black'):
-    plt.text(xpos,ypos,text,fontsize=fontsize, transform=ax.transAxes, color=color)
+def add_text(ax,text,xpos=0.0,ypos=1.01,fontsize=12,color='black'):
+    ax.text(xpos,ypos,text,fontsize=fontsize, transform=ax.transAxes, color=color)
 
 
 
-def simple_2d_plot(variable, ncfile, save_loc, cmap='viridis', zero_centre_cbar = False):
+def simple_2d_plot(variable, ncfile, save_loc, cmap='viridis', zero_centre_cbar = False, render=render):
     """
     Creates plot of variable for today from ncas-radar-wind-profiler-1
     
@@ -85,19 +89,18 @@ def simple_2d_plot(variable, ncfile, save_loc, cmap='viridis', zero_centre_cbar
         save_loc (str): File path to save plots to.
         cmap (str): Optional. Name of colour map to use in plot. Default 'viridis'
         zero_centre_cbar (bool): Optional. Color bar centred around 0 (true) or not (false). Default 'False'.
+        render (str): Optional. 'auto' or 'mesh', see wind_profiler_plots.time_height_mesh.
     
     """
 
     nc = Dataset(ncfile)
 
     x_time = nc['time'][:]
-    x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
     
     y_altitude = nc['altitude'][:]
     
     data = nc[variable][:]
     
-    x,y = np.meshgrid(x_time,y_altitude)
 #    vmax = np.nanpercentile(np.abs(data.compressed()),98) if zero_centre_cbar else None
 #    vmin = -np.nanpercentile(np.abs(data.compressed()),98) if zero_centre_cbar else None
 
@@ -111,14 +114,13 @@ def simple_2d_plot(variable, ncfile, save_loc, cmap='viridis', zero_centre_cbar
         vmax = np.nanpercentile(np.abs(data.compressed()),98) if zero_centre_cbar else None
         vmin = -np.nanpercentile(np.abs(data.compressed()),98) if zero_centre_cbar else None
     
-    fig = plt.figure(figsize=(20,8))
-    fig.set_facecolor('white')
+    fig = new_figure((20,8))
     ax = fig.add_subplot(111)
     
-    pc = ax.pcolormesh(x,y,data.T,cmap=cmap,vmin=vmin,vmax=vmax)
-    plt.gca().xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
+    pc = time_height_mesh(ax, x_time, y_altitude, data, cmap=cmap, vmin=vmin, vmax=vmax, render=render)
+    ax.xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
     ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-    plt.gca().xaxis.set_major_locator(mdates.DayLocator())
+    ax.xaxis.set_major_locator(mdates.DayLocator())
     ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
     ax.set_ylabel('Altitude (m)', fontsize=17)
     ax.set_xlabel('Time (UTC)', fontsize=17)
@@ -132,20 +134,19 @@ def simple_2d_plot(variable, ncfile, save_loc, cmap='viridis', zero_centre_cbar
     cbar.ax.set_ylabel(f'{variable} ({nc[variable].units})', fontsize=17)
     cbar.ax.tick_params(axis='both', which='both', labelsize=12)
 
-    #add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
-    plt.tight_layout()
+    #add_text(ax,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK')
+    fig.tight_layout()
     if "signal_to_noise_ratio" in variable:
-        plt.savefig(f'{save_loc}/snr.png')
+        fig.savefig(f'{save_loc}/snr.png')
     elif "upward_air_velocity" in variable:
-        plt.savefig(f'{save_loc}/upward_wind.png')
+        fig.savefig(f'{save_loc}/upward_wind.png')
     else:
-        plt.savefig(f'{save_loc}/{variable.lower()}.png')
-    plt.close()
+        fig.savefig(f'{save_loc}/{variable.lower()}.png')
 
 
 
 
-def wind_speed_direction_plot(ncfile, save_loc, barb_interval=3):
+def wind_speed_direction_plot(ncfile, save_loc, barb_interval=3, render=render):
     """
     Creates wind speed and direction plot for today from ncas-radar-wind-profiler-1
     
@@ -153,13 +154,13 @@ def wind_speed_direction_plot(ncfile, save_loc, barb_interval=3):
         ncfile (str): File path and name of netCDF file with today's data.
         save_loc (str): File path to save plots to.
         barb_interval (int): Optional. Interval between data points to plot wind barbs. Default is 3.
+        render (str): Optional. 'auto' or 'mesh', see wind_profiler_plots.time_height_mesh.
     
     """
     
     nc = Dataset(ncfile)
 
     x_time = nc['time'][:]
-    x_time = [dt.datetime.utcfromtimestamp(time) for time in x_time]
     
     y_altitude = nc['altitude'][:]
     
@@ -172,16 +173,15 @@ def wind_speed_direction_plot(ncfile, save_loc, barb_interval=3):
 
     
     # make and save plot
-    x,y = np.meshgrid(x_time,y_altitude)
+    x,y = np.meshgrid(time_axis_numbers(x_time),y_altitude)
     
-    fig = plt.figure(figsize=(20,8))
-    fig.set_facecolor('white')
+    fig = new_figure((20,8))
     ax = fig.add_subplot(111)
     
-    pc = ax.pcolormesh(x,y,data_ws.T,vmin=0,vmax=25)
-    plt.gca().xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
+    pc = time_height_mesh(ax, x_time, y_altitude, data_ws, vmin=0, vmax=25, render=render)
+    ax.xaxis.set_minor_locator(mdates.HourLocator(byhour=range(0,24,2)))
     ax.xaxis.set_minor_formatter(mdates.DateFormatter("%H:%M"))
-    plt.gca().xaxis.set_major_locator(mdates.DayLocator())
+    ax.xaxis.set_major_locator(mdates.DayLocator())
     ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M\n%Y/%m/%d"))
     ax.set_ylabel('Altitude (m)', fontsize=17)
     ax.set_xlabel('Time (UTC)', fontsize=17)
@@ -202,12 +202,28 @@ def wind_speed_direction_plot(ncfile, save_loc, barb_interval=3):
 
     ax.quiver(x[::barb_interval,::barb_interval], y[::barb_interval,::barb_interval], u1[::barb_interval,::barb_interval].T, v1[::barb_interval,::barb_interval].T, scale=48, scale_units='width')
 
-    #add_text(ax,plt,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK') 
+    #add_text(ax,'NCAS Radar Wind Profiler 1\nCapel Dewi Atmospheric Observatory, Wales, UK') 
+
+    fig.tight_layout()
+    fig.savefig(f'{save_loc}/horizontal_winds.png')
+    #fig.savefig(f'{save_loc}/winds.pdf')
+
+
+
+def nc_file_name(nc_file_path, date, mode):
+    """
+    Returns file path and name of the netCDF file for one day of data.
+
+    Args:
+        nc_file_path (str): Location of netCDF files
+        date (datetime): Day of data
+        mode (str): Sampling interval of data in minutes, e.g. '5' or '15'.
 
-    plt.tight_layout()
-    plt.savefig(f'{save_loc}/horizontal_winds.png')
-    #plt.savefig(f'{save_loc}/winds.pdf')
-    plt.close()
+    Returns:
+        str: File path and name of netCDF file.
+
+    """
+    return f'{nc_file_path}/{date.year}/{zero_pad_number(date.month)}/ncas-radar-wind-profiler-1_mobile_{date.year}{zero_pad_number(date.month)}{zero_pad_number(date.day)}_snr-winds_{mode}min_v1.0.nc'
 
 
 
@@ -229,18 +245,16 @@ def main(nc_file_path=nc_file_path, plots_path=plots_path, mode=mode):
     
     today_date = dt.datetime.now()
     #today_date = dt.datetime.strptime("2023-07-31","%Y-%m-%d")
-    today_nc_file_path=f'{nc_file_path}/{today_date.year}/{zero_pad_number(today_date.month)}'
-    
-    today_file = f'ncas-radar-wind-profiler-1_mobile_{today_date.year}{zero_pad_number(today_date.month)}{zero_pad_number(today_date.day)}_snr-winds_{mode}min_v1.0.nc'
+    today_ncfile = nc_file_name(nc_file_path, today_date, mode)
     
-    if os.path.exists(f'{today_nc_file_path}/{today_file}'):
-        wind_speed_direction_plot(f'{today_nc_file_path}/{today_file}', f'{plots_path}/{mode}min')
+    if os.path.exists(today_ncfile):
+        wind_speed_direction_plot(today_ncfile, f'{plots_path}/{mode}min')
 
         for var in ['upward_air_velocity']:   
-            simple_2d_plot(var, f'{today_nc_file_path}/{today_file}', f'{plots_path}/{mode}min', cmap='RdBu_r', zero_centre_cbar=True) 
+            simple_2d_plot(var, today_ncfile, f'{plots_path}/{mode}min', cmap='RdBu_r', zero_centre_cbar=True) 
 
         for var in ['signal_to_noise_ratio_minimum']:
-            simple_2d_plot(var, f'{today_nc_file_path}/{today_file}', f'{plots_path}/{mode}min')
+            simple_2d_plot(var, today_ncfile, f'{plots_path}/{mode}min')
 
 
 
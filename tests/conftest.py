@@ -0,0 +1,10 @@
+"""
+Makes the plotting scripts importable by name, as they are when run from their own directory
+"""
+
+
+import os
+import sys
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ncas_radar_wind_profiler_1_plotting'))
@@ -0,0 +1,49 @@
+"""
+Tests averaging wind directions as u and v with known answers
+"""
+
+
+import numpy as np
+import pytest
+
+from aggregation import empty_wind_partial, accumulate_wind, finalise_wind
+
+
+
+def average_wind(wind_speed, wind_from_direction):
+    """
+    Returns finalised averages of rows of wind speed and direction, all put in one bin.
+    """
+    wind_from_direction = np.array(wind_from_direction, dtype=float)
+    partial = empty_wind_partial((1, wind_from_direction.shape[1]))
+    if wind_speed is not None:
+        wind_speed = np.array(wind_speed, dtype=float)
+    accumulate_wind(partial, np.zeros(len(wind_from_direction), dtype=int), wind_speed, wind_from_direction)
+    return finalise_wind(partial)
+
+
+
+@pytest.mark.parametrize('wind_speed', [[[5], [5]], None])
+def test_directions_either_side_of_north(wind_speed):
+    result = average_wind(wind_speed, [[350], [10]])
+    direction = result['wind_from_direction'][0, 0]
+    assert min(direction, 360 - direction) == pytest.approx(0, abs=1e-9)
+    assert result['steadiness'][0, 0] == pytest.approx(np.cos(np.deg2rad(10)))
+
+
+
+@pytest.mark.parametrize('wind_speed', [[[5, 3], [5, 3]], None])
+def test_opposing_winds_have_no_direction(wind_speed):
+    # sin(90) and sin(270) cancel exactly, cos(90) and cos(270) only to within rounding
+    result = average_wind(wind_speed, [[90, 0], [270, 180]])
+    assert np.isnan(result['wind_from_direction']).all()
+    np.testing.assert_allclose(result['steadiness'], 0, atol=1e-9)
+    np.testing.assert_allclose(result['vector_wind_speed'], 0, atol=1e-9)
+
+
+
+def test_calm_has_no_direction_or_steadiness():
+    result = average_wind([[0], [0]], [[90], [180]])
+    assert np.isnan(result['wind_from_direction'][0, 0])
+    assert np.isnan(result['steadiness'][0, 0])
+    assert result['wind_speed'][0, 0] == 0
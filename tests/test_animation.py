@@ -0,0 +1,47 @@
+"""
+Tests that a failing ffmpeg leaves no partial animation behind
+"""
+
+
+import datetime as dt
+import os
+import stat
+
+import numpy as np
+import pytest
+
+import animation
+from wind_profiler_plots import day_time_axis
+
+
+
+@pytest.fixture
+def failing_ffmpeg(tmp_path, monkeypatch):
+    """
+    Puts an ffmpeg first on the PATH that exits with an error without reading its input.
+    """
+    bin_path = tmp_path / 'bin'
+    bin_path.mkdir()
+    ffmpeg = bin_path / 'ffmpeg'
+    ffmpeg.write_text('#!/bin/sh\nexit 1\n')
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', f'{bin_path}{os.pathsep}{os.environ["PATH"]}')
+
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='needs a shell script as ffmpeg')
+@pytest.mark.parametrize('frame_bytes', [40, 4 * 640 * 480])
+def test_ffmpeg_exiting_early(tmp_path, failing_ffmpeg, frame_bytes):
+    animation_file = str(tmp_path / 'animation.mp4')
+    frames = (bytes(frame_bytes) for _ in range(20))
+    with pytest.raises(RuntimeError, match='ffmpeg failed'):
+        animation.write_frames_ffmpeg(frames, (frame_bytes // 4, 1), animation_file)
+    assert os.listdir(tmp_path) == ['bin']
+
+
+
+def test_day_time_axis():
+    x_time = day_time_axis(dt.datetime(2026, 6, 1, 23, 59), 15)
+    start = dt.datetime(2026, 6, 1, tzinfo=dt.timezone.utc).timestamp()
+    assert len(x_time) == 96
+    np.testing.assert_array_equal(x_time[[0, -1]], [start, start + 86400 - 900])
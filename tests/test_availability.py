@@ -0,0 +1,67 @@
+"""
+Tests availability counts for day files with repeated, out of day and hourly records
+"""
+
+
+import datetime as dt
+
+from netCDF4 import Dataset
+import numpy as np
+
+import availability
+
+
+date = dt.datetime(2026, 6, 1)
+start = int(dt.datetime(2026, 6, 1, tzinfo=dt.timezone.utc).timestamp())
+
+
+
+def write_day_file(ncfile, time, wind_speed, sampling_interval=15):
+    """
+    Writes a day file with the given times and wind speed, NaN values written as fill values.
+    """
+    nc = Dataset(ncfile, 'w')
+    nc.sampling_interval = f'{sampling_interval} minutes'
+    nc.createDimension('time', len(time))
+    nc.createDimension('altitude', len(wind_speed[0]))
+    nc.createVariable('time', 'f8', ('time',))[:] = time
+    nc.createVariable('altitude', 'f4', ('altitude',))[:] = np.arange(len(wind_speed[0])) * 100 + 500
+    nc.createVariable('wind_speed', 'f4', ('time', 'altitude'), fill_value=-1e20)[:] = \
+        np.ma.masked_invalid(np.array(wind_speed, dtype=float))
+    nc.close()
+    return ncfile
+
+
+
+def test_repeated_and_out_of_day_records(tmp_path):
+    nan = np.nan
+    # a record from the day before, 00:00 twice, 00:15, 01:00 and one from the next day
+    time = [start - 900, start, start, start + 900, start + 3600, start + 86400]
+    wind_speed = [[1, 1], [1, nan], [2, 2], [nan, 1], [1, 1], [1, 1]]
+    result = availability.day_availability(write_day_file(str(tmp_path / 'day.nc'), time, wind_speed), date)
+
+    assert result['hour_counts'][:3] == [2, 1, 0]
+    assert sum(result['hour_counts']) == 3
+    # the first of the repeated records is used, so gate counts match hour counts
+    assert result['gate_counts'] == [2, 2]
+    assert result['expected_per_hour'] == 4
+
+
+
+def test_no_records_in_day(tmp_path):
+    ncfile = write_day_file(str(tmp_path / 'day.nc'), [start - 900], [[1, 1]])
+    result = availability.day_availability(ncfile, date)
+    assert sum(result['hour_counts']) == 0
+    assert result['gate_counts'] == [0, 0]
+
+
+
+def test_intervals_over_an_hour(tmp_path):
+    time = start + np.arange(12) * 7200
+    ncfile = write_day_file(str(tmp_path / 'day.nc'), time, [[1]] * 12, sampling_interval=120)
+    result = availability.day_availability(ncfile, date)
+    summary = {'days': {'low': {'20260601': result}}}
+    assert result['expected_per_hour'] == 0.5
+    np.testing.assert_array_equal(availability.completeness(summary, 'low', ['20260601'])[0, ::2], 1)
+    altitude, fractions = availability.gate_fractions(summary, 'low', ['20260601'])
+    np.testing.assert_allclose(fractions, [1])
@@ -0,0 +1,80 @@
+"""
+Tests merging and finalising climatology partial aggregates
+"""
+
+
+from netCDF4 import Dataset
+
+import numpy as np
+import pytest
+
+import climatology
+
+
+
+def write_day_file(ncfile, time, altitude, wind_speed, wind_from_direction, upward_air_velocity, snr):
+    """
+    Writes a small day file with the variables climatology reads, NaN values written as fill values.
+    """
+    nc = Dataset(ncfile, 'w')
+    nc.createDimension('time', len(time))
+    nc.createDimension('altitude', len(altitude))
+    nc.createVariable('time', 'f8', ('time',))[:] = time
+    nc.createVariable('altitude', 'f4', ('altitude',))[:] = altitude
+    for variable, values in [('wind_speed', wind_speed), ('wind_from_direction', wind_from_direction),
+                             ('upward_air_velocity', upward_air_velocity), ('signal_to_noise_ratio_minimum', snr)]:
+        var = nc.createVariable(variable, 'f4', ('time', 'altitude'), fill_value=-1e20)
+        var[:] = np.ma.masked_invalid(np.array(values, dtype=float))
+    nc.close()
+    return ncfile
+
+
+
+@pytest.fixture
+def day_files(tmp_path):
+    altitude = [500, 1000]
+    # day 1: 00:00 and 01:00, day 2: 00:30
+    first = write_day_file(str(tmp_path / 'day1.nc'), [0, 3600], altitude,
+                           wind_speed=[[2, 4], [6, np.nan]], wind_from_direction=[[350, 90], [10, np.nan]],
+                           upward_air_velocity=[[1, -1], [3, np.nan]], snr=[[0, 0], [0, np.nan]])
+    second = write_day_file(str(tmp_path / 'day2.nc'), [86400 + 1800], altitude,
+                            wind_speed=[[4, 8]], wind_from_direction=[[0, 270]],
+                            upward_air_velocity=[[2, 5]], snr=[[0, np.nan]])
+    return first, second
+
+
+
+def test_merge_partials_either_order(day_files):
+    a, b = (climatology.reduce_day_file(ncfile) for ncfile in day_files)
+    ab = climatology.merge_partials(a, b)
+    ba = climatology.merge_partials(b, a)
+    for key in ab:
+        if key == 'wind':
+            for wind_key in ab['wind']:
+                np.testing.assert_allclose(ab['wind'][wind_key], ba['wind'][wind_key])
+        else:
+            np.testing.assert_array_equal(ab[key], ba[key])
+
+    clim = climatology.finalise_climatology(ab)
+    assert clim['records'] == 3
+    np.testing.assert_allclose(clim['wind_speed_mean'], [12 / 3, 12 / 2])
+    # 2 from 350, 6 from 10 and 4 from 0 average to just east of north
+    u = -(2 * np.sin(np.deg2rad(350)) + 6 * np.sin(np.deg2rad(10)))
+    v = -(2 * np.cos(np.deg2rad(350)) + 6 * np.cos(np.deg2rad(10)) + 4)
+    assert clim['wind_from_direction_mean'][0] == pytest.approx(np.rad2deg(np.arctan2(-u, -v)), abs=1e-4)
+    assert clim['wind_from_direction_steadiness'][0] == pytest.approx(np.hypot(u, v) / 12, rel=1e-6)
+    # 4 from the east and 8 from the west leave 4 from the west
+    assert clim['wind_from_direction_mean'][1] == pytest.approx(270, abs=1e-4)
+    assert clim['vector_wind_speed_mean'][1] == pytest.approx(4 / 2)
+    # hour 0 has 1 and 2 at the lowest gate, -1 and 5 at the next; hour 1 has 3 and nothing
+    np.testing.assert_allclose(clim['upward_air_velocity_diurnal_mean'][0], [1.5, 2])
+    np.testing.assert_allclose(clim['upward_air_velocity_diurnal_mean'][1], [3, np.nan])
+    np.testing.assert_allclose(clim['snr_availability'], [1, 1 / 3])
+
+
+
+def test_merge_partials_rejects_other_gates():
+    a = climatology.empty_partial([500, 1000])
+    b = climatology.empty_partial([500, 1000, 1500])
+    with pytest.raises(ValueError):
+        climatology.merge_partials(a, b)
@@ -0,0 +1,70 @@
+"""
+Tests the QC mask on small windows with known answers
+"""
+
+
+import numpy as np
+
+from qc import neighbour_count, compute_qc_mask, apply_qc_mask
+
+
+
+def window_from(snr, width=None):
+    """
+    Returns a window holding SNR, and spectral width if given, masked where NaN.
+    """
+    snr = np.ma.masked_invalid(np.array(snr, dtype=float))
+    data = {'signal_to_noise_ratio_minimum': snr}
+    if width is not None:
+        data['spectral_width_of_beam_3'] = np.ma.masked_invalid(np.array(width, dtype=float))
+    return {'time': np.arange(snr.shape[0]), 'altitude': np.arange(snr.shape[1]), 'data': data}
+
+
+
+def test_neighbour_count_at_edges():
+    valid = np.ones((3, 4), dtype=bool)
+    # outside the window counts as not valid
+    np.testing.assert_array_equal(neighbour_count(valid), [[3, 5, 5, 3],
+                                                           [5, 8, 8, 5],
+                                                           [3, 5, 5, 3]])
+
+
+
+def test_thresholds():
+    window = window_from([[-20, 0, np.nan], [5, -10, 0]], width=[[1, 4, 1], [0.1, 1, 1]])
+    mask = compute_qc_mask(window, {'snr_threshold': -15, 'spectral_width_min': 0.5, 'spectral_width_max': 3})
+    # already masked values are not marked as failing
+    np.testing.assert_array_equal(mask, [[True, True, False], [True, False, False]])
+
+
+
+def test_isolated_gates_removed_at_window_edges():
+    nan = np.nan
+    window = window_from([[0, 0, nan, nan, 0],
+                          [0, 0, nan, nan, nan],
+                          [nan, nan, nan, nan, nan],
+                          [nan, nan, nan, 0, nan]])
+    # corner gates of the block have 3 valid neighbours, the gates in the corner and last row none
+    mask = compute_qc_mask(window, {'min_neighbours': 1})
+    expected = np.zeros((4, 5), dtype=bool)
+    expected[0, 4] = expected[3, 3] = True
+    np.testing.assert_array_equal(mask, expected)
+
+    # neighbours outside the window do not count, so the block goes too
+    mask = compute_qc_mask(window, {'min_neighbours': 4})
+    np.testing.assert_array_equal(mask, ~np.ma.getmaskarray(window['data']['signal_to_noise_ratio_minimum']))
+
+
+
+def test_threshold_failures_are_not_neighbours():
+    window = window_from([[0, -20, 0]])
+    mask = compute_qc_mask(window, {'snr_threshold': -15, 'min_neighbours': 1})
+    np.testing.assert_array_equal(mask, [[True, True, True]])
+
+
+
+def test_apply_masks_every_variable():
+    window = window_from([[0, -20]], width=[[1, 1]])
+    apply_qc_mask(window, compute_qc_mask(window, {'snr_threshold': -15}))
+    for data in window['data'].values():
+        np.testing.assert_array_equal(np.ma.getmaskarray(data), [[False, True]])
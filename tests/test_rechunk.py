@@ -0,0 +1,66 @@
+"""
+Tests rewriting day files with rechunk.py
+"""
+
+
+from netCDF4 import Dataset
+
+import numpy as np
+import pytest
+
+import rechunk
+
+
+
+def write_day_file(ncfile):
+    """
+    Writes a small day file with a float variable holding NaN and fill values, and a string variable.
+    """
+    nc = Dataset(ncfile, 'w')
+    nc.sampling_interval = '15 minutes'
+    nc.createDimension('time', 4)
+    nc.createDimension('altitude', 3)
+    nc.createVariable('time', 'f8', ('time',))[:] = np.arange(4) * 900
+    nc.createVariable('altitude', 'f4', ('altitude',))[:] = [500, 1000, 1500]
+    var = nc.createVariable('wind_speed', 'f4', ('time', 'altitude'), fill_value=-1e20)
+    var.units = 'm s-1'
+    var[:] = np.ma.masked_array([[1, np.nan, 3]] * 4, mask=[[False, False, True]] * 4)
+    label = nc.createVariable('beam', str, ('altitude',))
+    label[:] = np.array(['vertical', 'north', 'east'], dtype=object)
+    nc.close()
+    return ncfile
+
+
+
+def test_rechunked_copy_with_string_variable_verifies(tmp_path):
+    source = write_day_file(str(tmp_path / 'day.nc'))
+    destination = str(tmp_path / 'out' / 'day.nc')
+    rechunk.rechunk_file(source, destination, window_hours=1)
+    assert rechunk.verify_file(source, destination) == []
+
+    nc = Dataset(destination)
+    assert nc['wind_speed'].chunking() == [4, 3]
+    assert list(nc['beam'][:]) == ['vertical', 'north', 'east']
+    nc.close()
+
+
+
+def test_changed_copy_fails_verification(tmp_path):
+    source = write_day_file(str(tmp_path / 'day.nc'))
+    destination = str(tmp_path / 'out' / 'day.nc')
+    rechunk.rechunk_file(source, destination)
+    nc = Dataset(destination, 'a')
+    nc['beam'][0] = 'west'
+    nc['wind_speed'][0, 0] = 2
+    nc.close()
+    assert sorted(rechunk.verify_file(source, destination)) == ['beam data differ', 'wind_speed data differ']
+
+
+
+def test_rechunk_in_place_is_refused(tmp_path):
+    source = write_day_file(str(tmp_path / 'day.nc'))
+    with pytest.raises(ValueError):
+        rechunk.rechunk_file(source, str(tmp_path / '.' / 'day.nc'))
+    with pytest.raises(ValueError):
+        rechunk.main(str(tmp_path), str(tmp_path) + '/')
+    assert rechunk.verify_file(source, source) == []
@@ -0,0 +1,36 @@
+"""
+Tests that products drawn in threads match products drawn one at a time
+"""
+
+
+import filecmp
+import os
+
+import pytest
+
+from benchmark import synthetic_window
+import wind_profiler_plots
+
+
+
+def test_threaded_plots_match_serial(tmp_path):
+    window = synthetic_window(15, 40, days=1)
+    pngs = {}
+    for threads in [1, 4]:
+        plots_dir = tmp_path / str(threads)
+        plots_dir.mkdir()
+        saved = wind_profiler_plots.plot_window(window, str(plots_dir), threads=threads)
+        assert list(saved) == wind_profiler_plots.products
+        pngs[threads] = sorted(name for name in os.listdir(plots_dir) if name.endswith('.png'))
+
+    assert len(pngs[1]) == len(wind_profiler_plots.products)
+    assert pngs[4] == pngs[1]
+    for name in pngs[1]:
+        assert filecmp.cmp(tmp_path / '1' / name, tmp_path / '4' / name, shallow=False), name
+
+
+
+def test_threaded_plots_raise_errors(tmp_path):
+    window = synthetic_window(15, 40, days=1)
+    with pytest.raises(KeyError):
+        wind_profiler_plots.plot_window(window, str(tmp_path), products=['upward_air_velocity', 'not_a_variable'], threads=2)
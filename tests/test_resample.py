@@ -0,0 +1,101 @@
+"""
+Tests resampling records onto regular time grids with known answers
+"""
+
+
+import datetime as dt
+
+import numpy as np
+import pytest
+
+import resample
+
+
+start = int(dt.datetime(2026, 6, 1, tzinfo=dt.timezone.utc).timestamp())
+
+
+
+def record_from(minutes, sampling_interval, **data):
+    """
+    Returns a record with times in minutes from midnight and one row of each variable for each time, masked where NaN.
+    """
+    data = {variable: np.ma.masked_invalid(np.array(values, dtype=float)) for variable, values in data.items()}
+    return {'time': start + np.array(minutes) * 60, 'altitude': np.arange(next(iter(data.values())).shape[1]) * 100.0,
+            'sampling_interval': sampling_interval, 'data': data}
+
+
+
+def grid_from(minutes):
+    """
+    Returns grid times at the given minutes from midnight.
+    """
+    return start + np.array(minutes) * 60
+
+
+
+def test_upsample_hold_and_exact():
+    record = record_from([0, 60], 60, wind_speed=[[1], [2]])
+    grid_time = grid_from(range(0, 120, 15))
+
+    data, covered = resample.resample_record(record, ['wind_speed'], grid_time, 15, upsample='hold')
+    # each record fills its own hour, centred on it, so 01:30 onwards is not covered
+    np.testing.assert_array_equal(covered, [True] * 6 + [False] * 2)
+    np.testing.assert_array_equal(data['wind_speed'][:6, 0], [1, 1, 2, 2, 2, 2])
+    assert data['wind_speed'].mask[6:].all()
+
+    data, covered = resample.resample_record(record, ['wind_speed'], grid_time, 15, upsample='exact')
+    np.testing.assert_array_equal(covered, [True, False, False, False, True, False, False, False])
+    np.testing.assert_array_equal(data['wind_speed'].filled(np.nan)[:, 0],
+                                  [1, np.nan, np.nan, np.nan, 2, np.nan, np.nan, np.nan])
+
+
+
+def test_block_average_min_count():
+    nan = np.nan
+    index = np.array([0, 0, 0, 1, 1, 2])
+    data = np.ma.masked_invalid([[1, nan], [2, nan], [6, 4], [5, nan], [nan, nan], [7, 8]])
+    mean = resample.block_average(index, data, 4, min_count=2)
+    np.testing.assert_array_equal(mean.filled(np.nan), [[3, nan], [nan, nan], [nan, nan], [nan, nan]])
+    mean = resample.block_average(index, data, 4, min_count=1)
+    np.testing.assert_array_equal(mean.filled(np.nan), [[3, 4], [5, nan], [7, 8], [nan, nan]])
+
+
+
+def test_downsample_averages_cells():
+    # the 15 minute cell centred on 00:15 holds 00:10, 00:15 and 00:20
+    record = record_from([5, 10, 15, 20], 5, wind_speed=[[1], [2], [4], [6]], wind_from_direction=[[90], [350], [10], [0]])
+    data, covered = resample.resample_record(record, ['wind_speed', 'wind_from_direction'], grid_from([0, 15]), 15)
+    np.testing.assert_array_equal(covered, [True, True])
+    np.testing.assert_allclose(data['wind_speed'][:, 0], [1, 4])
+    assert data['wind_from_direction'][0, 0] == pytest.approx(90)
+    # 2 from 350 and 4 from 10 pull the 6 from north slightly east
+    u = -(2 * np.sin(np.deg2rad(350)) + 4 * np.sin(np.deg2rad(10)))
+    v = -(2 * np.cos(np.deg2rad(350)) + 4 * np.cos(np.deg2rad(10)) + 6)
+    assert data['wind_from_direction'][1, 0] == pytest.approx(np.rad2deg(np.arctan2(-u, -v)))
+
+
+
+def test_join_records_drops_repeated_times():
+    first = record_from([0, 5, 10], 5, wind_speed=[[1], [2], [3]])
+    second = record_from([10, 15, 20], 5, wind_speed=[[30], [4], [5]])
+    hourly = record_from([60], 60, wind_speed=[[9]])
+    joined = resample.join_records([first, second, hourly], ['wind_speed'], 15)
+
+    assert len(joined) == 2
+    np.testing.assert_array_equal(joined[0]['time'], grid_from([0, 5, 10, 15, 20]))
+    # the repeated 00:10 record comes from the earlier file
+    np.testing.assert_array_equal(joined[0]['data']['wind_speed'][:, 0], [1, 2, 3, 4, 5])
+    assert joined[1] is hourly
+    assert len(first['time']) == 3
+
+    data, _ = resample.resample_record(joined[0], ['wind_speed'], grid_from([0, 15]), 15)
+    np.testing.assert_allclose(data['wind_speed'][:, 0], [1.5, 4])
+
+
+
+def test_records_at_grid_interval_are_copied():
+    record = record_from([0, 30], 15, wind_speed=[[1], [np.nan]])
+    data, covered = resample.resample_record(record, ['wind_speed'], grid_from([0, 15, 30]), 15)
+    np.testing.assert_array_equal(covered, [True, False, True])
+    assert data['wind_speed'].mask.all(axis=1).tolist() == [False, True, True]
+    assert data['wind_speed'][0, 0] == 1
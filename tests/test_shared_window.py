@@ -0,0 +1,121 @@
+"""
+Tests that windows shared with worker processes are mapped, not copied, and always cleaned up
+"""
+
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import benchmark
+from benchmark import synthetic_window
+import shared_window
+
+
+linux_only = pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup') or not os.path.isdir('/dev/shm'),
+                                reason='needs /proc/self/smaps_rollup and /dev/shm')
+
+
+
+class ExitOnUnpickle:
+    """
+    Ends the process that unpickles it, as if a worker had been killed.
+    """
+    def __reduce__(self):
+        return (os._exit, (1,))
+
+
+
+def own_segments():
+    """
+    Returns names of shared memory segments made by this process.
+    """
+    return {name for name in os.listdir('/dev/shm') if name.startswith(f'{shared_window.segment_prefix}_{os.getpid()}_')}
+
+
+
+def worker_growth(window, shared, processes=2):
+    """
+    Returns the largest private memory growth in MB of workers reading a window, sent as a copy or shared.
+    """
+    with ProcessPoolExecutor(max_workers=processes, initializer=benchmark.record_worker_baseline) as executor:
+        if not shared:
+            return max(executor.map(benchmark.read_window, [window] * processes)) / 1e6
+        descriptor, segment = shared_window.share_window(window)
+        try:
+            return max(executor.map(benchmark.shared_worker, [descriptor] * processes)) / 1e6
+        finally:
+            shared_window.release_segment(segment)
+
+
+
+@linux_only
+def test_worker_memory_does_not_grow_with_window_size():
+    small = synthetic_window(15, 40, days=1)
+    large = synthetic_window(1, 200, days=2)
+    large_size = sum(data.nbytes + np.ma.getmaskarray(data).nbytes for data in large['data'].values()) / 1e6
+
+    # copies do show up, so the measurement would catch shared arrays being copied
+    assert worker_growth(large, shared=False) > 0.5 * large_size
+    assert worker_growth(large, shared=True) < worker_growth(small, shared=True) + 2
+
+
+
+def test_attached_window_is_read_only_and_matches():
+    window = synthetic_window(15, 40, days=1)
+    descriptor, segment = shared_window.share_window(window)
+    try:
+        attached, attached_segment = shared_window.attach_window(descriptor)
+        np.testing.assert_array_equal(attached['time'], window['time'])
+        np.testing.assert_array_equal(attached['altitude'], window['altitude'])
+        assert list(attached['data']) == list(window['data'])
+        for variable, data in window['data'].items():
+            np.testing.assert_array_equal(np.ma.getdata(attached['data'][variable]), np.ma.getdata(data))
+            np.testing.assert_array_equal(np.ma.getmaskarray(attached['data'][variable]), np.ma.getmaskarray(data))
+            with pytest.raises(ValueError):
+                attached['data'][variable][0, 0] = 1.0
+        with pytest.raises(ValueError):
+            attached['time'][0] = 0
+        assert {key: attached[key] for key in ['exists', 'mode', 'days', 'units']} == \
+            {key: window[key] for key in ['exists', 'mode', 'days', 'units']}
+        del attached
+        attached_segment.close()
+    finally:
+        shared_window.release_segment(segment)
+
+
+
+@linux_only
+def test_segment_removed_when_worker_raises(tmp_path):
+    window = synthetic_window(15, 40, days=1)
+    with pytest.raises(KeyError):
+        shared_window.plot_window_shared(window, str(tmp_path), products=['not_a_variable'], processes=1)
+    assert own_segments() == set()
+
+
+
+@linux_only
+def test_segment_removed_when_worker_is_killed(tmp_path):
+    window = synthetic_window(15, 40, days=1)
+    with pytest.raises(BrokenProcessPool):
+        shared_window.plot_window_shared(window, str(tmp_path), products=['upward_air_velocity'], processes=1,
+                                         colours=ExitOnUnpickle())
+    assert own_segments() == set()
+
+
+
+def test_remove_stale_segments(tmp_path):
+    finished = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True, check=True)
+    dead_pid = int(finished.stdout)
+    for name in [f'{shared_window.segment_prefix}_{dead_pid}_0', f'{shared_window.segment_prefix}_{os.getpid()}_0', 'other_1_0']:
+        (tmp_path / name).write_bytes(b'')
+
+    removed = shared_window.remove_stale_segments(str(tmp_path))
+
+    assert removed == [f'{shared_window.segment_prefix}_{dead_pid}_0']
+    assert sorted(os.listdir(tmp_path)) == sorted([f'{shared_window.segment_prefix}_{os.getpid()}_0', 'other_1_0'])
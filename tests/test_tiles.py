@@ -0,0 +1,93 @@
+"""
+Tests exporting and updating data tiles as day files grow or are reprocessed
+"""
+
+
+import datetime as dt
+import os
+
+from netCDF4 import Dataset
+import numpy as np
+import pytest
+
+import tiles
+
+
+date = dt.datetime(2026, 6, 1, tzinfo=dt.timezone.utc)
+start = int(date.timestamp())
+
+
+
+def write_day_file(ncfile, wind_speed, mtime):
+    """
+    Writes a 15 minute day file with one row of wind speed for each profile from midnight, setting its modification time.
+    """
+    wind_speed = np.array(wind_speed, dtype=float)
+    nc = Dataset(ncfile, 'w')
+    nc.sampling_interval = '15 minutes'
+    nc.createDimension('time', len(wind_speed))
+    nc.createDimension('altitude', wind_speed.shape[1])
+    nc.createVariable('time', 'f8', ('time',))[:] = start + np.arange(len(wind_speed)) * 900
+    nc.createVariable('altitude', 'f4', ('altitude',))[:] = np.arange(wind_speed.shape[1]) * 100 + 500
+    var = nc.createVariable('wind_speed', 'f4', ('time', 'altitude'), fill_value=-1e20)
+    var.units = 'm s-1'
+    var[:] = wind_speed
+    nc.close()
+    os.utime(ncfile, (mtime, mtime))
+    return ncfile
+
+
+
+@pytest.fixture
+def export(tmp_path):
+    ncfile = str(tmp_path / 'day.nc')
+    tiles_path = str(tmp_path / 'tiles')
+    index = {'mode': 'low', 'days': {}}
+    tile_file = f'{tiles_path}/low/20260601/wind_speed.{tiles.tile_extension}'
+
+    def run(wind_speed, mtime):
+        write_day_file(ncfile, wind_speed, mtime)
+        written = tiles.export_day(ncfile, tiles_path, 'low', date, ['wind_speed'], index)
+        tile = tiles.read_tile(tile_file)
+        return written, tile['data'][:len(wind_speed)]
+
+    run.tile_file = tile_file
+    run.index = index
+    return run
+
+
+
+def test_new_profiles_are_added(export):
+    written, data = export([[10, 20]], mtime=1000)
+    assert written == 1
+    np.testing.assert_allclose(data, [[10, 20]], atol=0.2)
+
+    written, data = export([[10, 20], [30, 40]], mtime=2000)
+    assert written == 1
+    np.testing.assert_allclose(data, [[10, 20], [30, 40]], atol=0.2)
+    assert export.index['days']['20260601']['last_time'] == start + 900
+
+
+
+def test_unchanged_file_is_not_read(export):
+    export([[10, 20]], mtime=1000)
+    written, _ = export([[10, 20]], mtime=1000)
+    assert written == 0
+
+
+
+def test_reprocessed_file_is_rewritten(export):
+    export([[10, 20], [30, 40]], mtime=1000)
+    # same times, so the same last time, but different values
+    written, data = export([[11, 21], [31, 41]], mtime=2000)
+    assert written == 2
+    np.testing.assert_allclose(data, [[11, 21], [31, 41]], atol=0.2)
+
+
+
+def test_deleted_tile_is_rewritten(export):
+    export([[10, 20]], mtime=1000)
+    os.remove(export.tile_file)
+    written, data = export([[10, 20], [30, 40]], mtime=2000)
+    assert written == 2
+    np.testing.assert_allclose(data, [[10, 20], [30, 40]], atol=0.2)